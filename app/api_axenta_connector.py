@@ -1,10 +1,15 @@
 import json
 import os
+import threading
 import time
 from http.client import responses
 
 import requests
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Iterator
+
+from app.http_session import create_session, backoff_delay, HTTP_RETRIES, RETRY_STATUSES
+from app.json_stream import ClosingStream, iter_json_array
+from app.metrics import STAGE_SECONDS
 
 
 
@@ -23,9 +28,12 @@ class AxentaApi:
             self.login = token or os.getenv('AXENTA_USERNAME', 'default_login')
             self.password = token or os.getenv('AXENTA_PASSWORD', 'default_password')
             self.api_url = api_url or os.getenv('AXENTA_HOST', 'default_host')
+            self.session = create_session()
             self.token = None
             self.token_expiry = 0  # Время истечения SID
             self.token_lifetime = 600  # 10 минут в секундах
+            # Токен общий для потока получения данных и потоков обогащения
+            self._token_lock = threading.Lock()
             self._initialized = False
 
 
@@ -36,7 +44,8 @@ class AxentaApi:
             'password': self.password
         }
         try:
-            response = requests.post(self.api_url+'auth/login/', data=data)
+            with STAGE_SECONDS.time(stage='axenta_token'):
+                response = self.session.post(self.api_url+'auth/login/', data=data)
             result = response.json()
             if 'token' in result:
                 self.token = result['token']
@@ -54,37 +63,91 @@ class AxentaApi:
         return self.token is not None and time.time() < self.token_expiry
 
     def ensure_token (self) -> Optional[str]:
-        """Гарантирует наличие действительного SID."""
-        if not self.is_token_valid():
-            return self.get_axenta_token()
-        return self.token
-
-    def make_request(self, method: str, uri: str, data : dict, retries: int = 1) -> Optional[Dict]:
+        """Гарантирует наличие действительного SID; при истечении его получает только один поток."""
+        if self.is_token_valid():
+            return self.token
+        with self._token_lock:
+            if not self.is_token_valid():
+                return self.get_axenta_token()
+            return self.token
+
+    def invalidate_token(self, token: str):
+        """Помечает SID отозванным, если другой поток ещё не получил новый."""
+        with self._token_lock:
+            if self.token == token:
+                self.token_expiry = 0
+
+    def make_request(self, method: str, uri: str, data : dict, retries: int = HTTP_RETRIES) -> Optional[Dict]:
+        """Запрос к API; сетевые ошибки и ответы 429 / 5xx повторяются с паузой backoff_delay."""
         token = self.ensure_token()
         if not token:
             print('Failed to get token')
             return None
+        if method not in ('GET', 'POST'):
+            return None
 
-        for attempt in range(retries + 1):
+        refreshed = False
+        attempt = 0
+        while True:
             try:
-                if method == 'GET':
-                    response = requests.get(self.api_url + uri, data=data, headers={'Authorization': f'Token {token}'})
-                elif method == 'POST':
-                    response = requests.post(self.api_url + uri, data=data, headers={'Authorization': f'Token {token}'})
-                else:
-                    return None
-                result = response.json()
-                if response.status_code == 200:
-                    return result
-                else:
-                    f'Произошла ошибка в запросе axenta {result}'
+                response = self.session.request(method, self.api_url + uri, data=data,
+                                                headers={'Authorization': f'Token {token}'})
             except requests.RequestException as e:
                 print(f"Axenta error: {e}")
+                if attempt >= retries:
+                    return None
+            else:
+                if response.status_code == 401 and not refreshed:
+                    # Токен отозван раньше срока: получаем новый и повторяем запрос
+                    self.invalidate_token(token)
+                    refreshed = True
+                    token = self.ensure_token()
+                    if not token:
+                        return None
+                    continue
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    print(f'Произошла ошибка в запросе axenta {response.status_code}: {response.text[:200]}')
+                    return None
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
 
     def search_all_items(self) -> Optional[List[Dict]]:
-        result = self.make_request('GET', 'objects', None, retries=1)
+        result = self.make_request('GET', 'objects', None)
         return result
 
+    def iter_all_items(self, chunk_size: int = 65536) -> Optional[Iterator[Dict]]:
+        """Открывает потоковый запрос objects и возвращает итератор объектов без загрузки всего ответа."""
+        refreshed = False
+        attempt = 0
+        while True:
+            token = self.ensure_token()
+            if not token:
+                print('Failed to get token')
+                return None
+            try:
+                response = self.session.get(self.api_url + 'objects', headers={'Authorization': f'Token {token}'},
+                                            stream=True)
+            except requests.RequestException as e:
+                print(f"Axenta error: {e}")
+                if attempt >= HTTP_RETRIES:
+                    return None
+            else:
+                if response.status_code == 401 and not refreshed:
+                    response.close()
+                    self.invalidate_token(token)
+                    refreshed = True
+                    continue
+                if response.status_code == 200:
+                    return ClosingStream(iter_json_array(response.iter_content(chunk_size)), response)
+                response.close()
+                if response.status_code not in RETRY_STATUSES or attempt >= HTTP_RETRIES:
+                    print(f'Произошла ошибка в запросе axenta {response.status_code}')
+                    return None
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
     def exec_cmd(self, unit_id: str, cmd: dict ) -> bool:
         # todo
         result = self.make_request('POST', f'objects/{unit_id}/send_command', cmd)
@@ -1,8 +1,13 @@
 import os
+import threading
 from datetime import datetime, timedelta, timezone
 import time
+
 import requests
 
+from app.http_session import create_session, backoff_delay, HTTP_RETRIES, RETRY_STATUSES
+from app.metrics import STAGE_SECONDS
+
 
 token = ''
 
@@ -15,10 +20,24 @@ def to_moscow_time(z_time):
 
 
 class CesarApi:
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        """Реализация Singleton: токен и пул соединений переживают циклы."""
+        if cls._instance is None:
+            cls._instance = super(CesarApi, cls).__new__(cls)
+        return cls._instance
+
     def __init__(self):
-        self.api_url = 'https://apicsp.csat.ru/api/v1/'
-        self.token = ''
-        self.set_token()
+        # Инициализация вызывается только один раз
+        if not hasattr(self, '_initialized'):
+            self.api_url = os.getenv('CESAR_HOST', 'https://apicsp.csat.ru/api/v1/')
+            self.session = create_session()
+            self.token = ''
+            self.token_expiry = 0
+            self.token_lifetime = int(os.getenv('CESAR_TOKEN_LIFETIME', '3600'))
+            self._token_lock = threading.Lock()
+            self._initialized = False
 
     def set_token(self):
         headers = {
@@ -29,21 +48,65 @@ class CesarApi:
             'password': os.getenv('CESAR_PASSWORD', 'default_password'),
             'grant_type': 'password'
         }
-        request = requests.post(self.api_url+'token', headers=headers, data=data)
+        with STAGE_SECONDS.time(stage='cesar_token'):
+            request = self.session.post(self.api_url+'token', headers=headers, data=data)
+        request.raise_for_status()
         access_token = request.json()
+        # Обновляем токен заранее, за минуту до истечения
+        lifetime = int(access_token.get('expires_in') or self.token_lifetime)
+        self.token_expiry = time.time() + max(lifetime - 60, 0)
         access_token = access_token['access_token']
         self.token = access_token
 
+    def is_token_valid(self) -> bool:
+        """Проверяет, действителен ли текущий токен."""
+        return bool(self.token) and time.time() < self.token_expiry
+
+    def ensure_token(self) -> str:
+        """Гарантирует наличие действительного токена."""
+        with self._token_lock:
+            if not self.is_token_valid():
+                self.set_token()
+            return self.token
+
+    def invalidate_token(self):
+        self.token_expiry = 0
+
+    def post(self, uri, json=None, retries=HTTP_RETRIES):
+        """POST с Bearer-токеном.
+
+        При 401 токен обновляется и запрос повторяется один раз; сетевые ошибки и ответы
+        429 / 5xx повторяются до retries раз с паузой backoff_delay.
+        """
+        refreshed = False
+        attempt = 0
+        while True:
+            headers = {
+                'accept': '*/*',
+                'Authorization': 'Bearer ' + self.ensure_token(),
+                'Content-Type': 'application/json'
+            }
+            try:
+                request = self.session.post(self.api_url + uri, headers=headers, json=json)
+            except requests.RequestException:
+                if attempt >= retries:
+                    raise
+            else:
+                if request.status_code == 401 and not refreshed:
+                    self.invalidate_token()
+                    refreshed = True
+                    continue
+                if request.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return request
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
     def get_cars_info(self, unitID=[], toString=False, offline=False):
-        headers = {
-            'accept': '*/*',
-            'Authorization': 'Bearer ' + self.token,
-            'Content-Type': 'application/json'
-        }
         data = {
             'unit_ids': unitID
         }
-        request = requests.post(self.api_url + 'units/device-state', headers=headers, json=data)
+        request = self.post('units/device-state', json=data)
+        request.raise_for_status()
         result_items = request.json()
         result_items = result_items['devices']
         current_unix_time = int(time.time())
@@ -61,21 +124,12 @@ class CesarApi:
                 if lmsg is not None:
                     lmsg = to_moscow_time(lmsg)
 
-                if offline:
-                    if lmsg is None:
-                        final_str = f'{cesar_id};{object_name};{pin};{created_at};{lmsg}'
-                        res_list.append(final_str)
-                        continue
-                    dt = datetime.strptime(lmsg, "%Y-%m-%dT%H:%M:%SZ")
-                    unix_time = int(dt.timestamp())
-                    if unix_time < three_days_ago_unix:
-                        final_str = f'{cesar_id};{object_name};{pin};{created_at};{lmsg}'
-                        res_list.append(final_str)
-                        continue
+                # lmsg уже UNIX-время; в офлайн-отчёт попадают юниты без связи дольше трёх дней
+                if offline and lmsg is not None and lmsg >= three_days_ago_unix:
+                    continue
 
                 final_str = f'{cesar_id};{object_name};{pin};{created_at};{lmsg}'
                 res_list.append(final_str)
             return res_list
 
         return result_items
-
@@ -0,0 +1,152 @@
+import logging
+import math
+import sys
+from array import array
+
+logger = logging.getLogger(__name__)
+
+NAN = math.nan
+# Значение NULL в целочисленных столбцах (в данных такого значения не бывает)
+NULL_INT = -2 ** 63
+# Сколько строк копится перед раскладкой по столбцам (транспонирование блока дешевле поштучных append)
+STAGE_SIZE = 1024
+
+
+class UnitBatch:
+    """Колоночный пакет нормализованных строк источника.
+
+    Числовые столбцы хранятся в типизированных array ('q' — int64, 'd' — double), строковые —
+    в списках интернированных строк. NULL хранится как NaN в 'd'-столбцах и NULL_INT
+    в допускающих NULL 'q'-столбцах. Наследники задают SCHEMA, KEY и __slots__ по столбцам.
+
+    Строки добавляются кортежами и раскладываются по столбцам блоками по STAGE_SIZE;
+    методы чтения делают это сами, к атрибутам-столбцам напрямую можно обращаться после seal().
+    """
+
+    __slots__ = ('_staged',)
+
+    # ((столбец, typecode или None для списка), ...)
+    SCHEMA = ()
+    KEY = None
+    # Целочисленные столбцы, допускающие NULL
+    NULLABLE = ()
+    # Строковые столбцы, значения которых интернируются
+    INTERNED = ()
+
+    def __init__(self):
+        for name, typecode in self.SCHEMA:
+            setattr(self, name, array(typecode) if typecode else [])
+        self._staged = []
+
+    @property
+    def columns(self):
+        return tuple(name for name, _ in self.SCHEMA)
+
+    def append(self, values):
+        """Добавляет строку: values — кортеж в порядке SCHEMA."""
+        self._staged.append(values)
+        if len(self._staged) >= STAGE_SIZE:
+            self.seal()
+
+    def seal(self):
+        """Раскладывает накопленные строки по столбцам.
+
+        Блок со значением не того типа раскладывается построчно: такие строки пропускаются с предупреждением.
+        """
+        staged, self._staged = self._staged, []
+        if not staged:
+            return
+        try:
+            self._extend(staged)
+        except (TypeError, ValueError, OverflowError):
+            for values in staged:
+                try:
+                    self._extend((values,))
+                except (TypeError, ValueError, OverflowError) as e:
+                    logger.warning(f"Пропущена строка с некорректными значениями полей ({str(e)}): {values}")
+
+    def _extend(self, rows):
+        size = len(getattr(self, self.KEY))
+        try:
+            for (name, typecode), values in zip(self.SCHEMA, zip(*rows)):
+                if typecode == 'd':
+                    values = [NAN if value is None else value for value in values]
+                elif name in self.NULLABLE:
+                    values = [NULL_INT if value is None else value for value in values]
+                elif name in self.INTERNED:
+                    values = [sys.intern(value) if type(value) is str else value for value in values]
+                getattr(self, name).extend(values)
+        except Exception:
+            # Столбцы не должны разойтись: уже добавленные значения блока убираются
+            for name, _ in self.SCHEMA:
+                del getattr(self, name)[size:]
+            raise
+
+    def __len__(self):
+        """Число строк, включая ещё не разложенные по столбцам."""
+        return len(getattr(self, self.KEY)) + len(self._staged)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def keys(self):
+        self.seal()
+        return getattr(self, self.KEY)
+
+    def column(self, name):
+        """Столбец с восстановленными NULL (None)."""
+        self.seal()
+        values = getattr(self, name)
+        if isinstance(values, array):
+            if values.typecode == 'd':
+                return [None if value != value else value for value in values]
+            if name in self.NULLABLE:
+                return [None if value == NULL_INT else value for value in values]
+            return values.tolist()
+        return values
+
+    def rows(self, columns=None):
+        """Кортежи значений строк в порядке columns (по умолчанию — все столбцы SCHEMA)."""
+        return zip(*[self.column(name) for name in (columns or self.columns)])
+
+    def take(self, indices):
+        """Новый пакет из строк с указанными номерами."""
+        self.seal()
+        batch = type(self)()
+        for name, typecode in self.SCHEMA:
+            values = getattr(self, name)
+            selected = [values[i] for i in indices]
+            setattr(batch, name, array(typecode, selected) if typecode else selected)
+        return batch
+
+
+class CesarBatch(UnitBatch):
+    __slots__ = ('unit_id', 'object_name', 'pin', 'vin', 'last_time', 'pos_x', 'pos_y', 'created_at', 'device_type')
+
+    SCHEMA = (
+        ('unit_id', 'q'), ('object_name', None), ('pin', None), ('vin', None), ('last_time', 'q'),
+        ('pos_x', 'd'), ('pos_y', 'd'), ('created_at', 'q'), ('device_type', None),
+    )
+    KEY = 'unit_id'
+    INTERNED = ('object_name', 'device_type')
+
+
+class AxentaBatch(UnitBatch):
+    __slots__ = ('id', 'uid', 'nm', 'pos_x', 'pos_y', 'gps', 'last_time', 'last_pos_time',
+                 'connected_status', 'cmd', 'sens', 'valid_nav')
+
+    SCHEMA = (
+        ('id', 'q'), ('uid', 'q'), ('nm', None), ('pos_x', 'd'), ('pos_y', 'd'), ('gps', 'q'),
+        ('last_time', 'q'), ('last_pos_time', 'q'), ('connected_status', None), ('cmd', None), ('sens', None),
+        ('valid_nav', 'q'),
+    )
+    KEY = 'id'
+    NULLABLE = ('gps',)
+    INTERNED = ('nm',)
+
+
+def iter_columns(rows, columns):
+    """Кортежи значений columns для пакета UnitBatch или списка словарей."""
+    if isinstance(rows, UnitBatch):
+        return rows.rows(columns)
+    return (tuple(row.get(column) for column in columns) for row in rows)
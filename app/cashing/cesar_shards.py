@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.http_session import backoff_delay
+from app.metrics import STAGE_SECONDS, UPSTREAM_ERRORS
+from app.cashing.snapshot import MISSING_UNITS_POLICY
+
+logger = logging.getLogger(__name__)
+
+# Шардированный запрос Cesar: размер шарда в unit_id (0 — весь парк одним запросом)
+CESAR_SHARD_SIZE = int(os.getenv('CESAR_SHARD_SIZE', '0'))
+# Сколько шардов запрашивается одновременно
+CESAR_SHARD_WORKERS = int(os.getenv('CESAR_SHARD_WORKERS', '4'))
+# Повторы неудавшегося шарда (поверх повторов HTTP-запроса в CesarApi.post)
+CESAR_SHARD_RETRIES = int(os.getenv('CESAR_SHARD_RETRIES', '1'))
+# Раз в сколько секунд парк запрашивается целиком, чтобы подхватить новые юниты
+CESAR_FULL_SWEEP_INTERVAL = float(os.getenv('CESAR_FULL_SWEEP_INTERVAL', '600'))
+
+
+class ShardedCesarFetch:
+    """Запрос units/device-state шардами по известным unit_id.
+
+    Известные юниты берёт unit_ids() (ключи снимка cash_cesar: восстановленные при старте
+    или записанные в прошлых циклах). Пока их нет и раз в sweep_interval секунд парк
+    запрашивается одним запросом без фильтра — так появляются новые юниты.
+    """
+
+    def __init__(self, unit_ids, shard_size=CESAR_SHARD_SIZE, workers=CESAR_SHARD_WORKERS,
+                 retries=CESAR_SHARD_RETRIES, sweep_interval=CESAR_FULL_SWEEP_INTERVAL):
+        self.unit_ids = unit_ids
+        self.shard_size = shard_size
+        self.retries = retries
+        self.sweep_interval = sweep_interval
+        self.last_sweep = None
+        self.last_stats = {'mode': None, 'shards': 0, 'failed': 0, 'retried': 0}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cesar-shard')
+
+    def sweep_due(self):
+        return self.last_sweep is None or time.monotonic() - self.last_sweep >= self.sweep_interval
+
+    def shards(self, unit_ids):
+        ordered = sorted(unit_ids)
+        return [ordered[start:start + self.shard_size] for start in range(0, len(ordered), self.shard_size)]
+
+    def fetch(self, api):
+        """Возвращает устройства всего парка: полным запросом или объединением шардов."""
+        unit_ids = list(self.unit_ids())
+        if not unit_ids or self.sweep_due():
+            devices = api.get_cars_info()
+            self.last_sweep = time.monotonic()
+            self.last_stats = {'mode': 'sweep', 'shards': 1, 'failed': 0, 'retried': 0}
+            logger.info(f"Cesar: полный опрос парка, {len(devices)} устройств.")
+            return devices
+
+        shards = self.shards(unit_ids)
+        futures = [self._executor.submit(self._fetch_shard, api, shard) for shard in shards]
+        devices = []
+        errors = []
+        retried = 0
+        for future in futures:
+            try:
+                shard_devices, attempts = future.result()
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            devices.extend(shard_devices)
+            retried += attempts
+        self.last_stats = {'mode': 'shards', 'shards': len(shards), 'failed': len(errors), 'retried': retried}
+
+        if errors:
+            UPSTREAM_ERRORS.inc(len(errors), source='cesar_shard')
+            message = f"не получено {len(errors)} из {len(shards)} шардов Cesar: {errors[0]}"
+            # Без части шардов юниты выглядели бы пропавшими из API и были бы удалены
+            if len(errors) == len(shards) or MISSING_UNITS_POLICY == 'delete':
+                raise RuntimeError(message)
+            logger.error(f"{message}; их юниты остаются с данными прошлого цикла.")
+        logger.info(f"Cesar: {len(devices)} устройств из {len(shards) - len(errors)} шардов "
+                    f"по {self.shard_size}, повторов {retried}.")
+        return devices
+
+    def _fetch_shard(self, api, shard):
+        """Запрашивает один шард; неудавшийся шард повторяется сам по себе до retries раз."""
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                devices = api.get_cars_info(shard)
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage='cesar_shard')
+                return devices, attempt
+            except Exception as e:
+                if attempt >= self.retries:
+                    raise
+                logger.warning(f"Шард Cesar ({len(shard)} юнитов, с {shard[0]}) не получен: {str(e)}, повтор.")
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
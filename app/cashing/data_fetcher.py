@@ -1,31 +1,183 @@
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from app import api_cesar_connector as CesarConnector, api_axenta_connector as AxentaConnector
+from app.metrics import STAGE_SECONDS, UPSTREAM_ERRORS, mark_fetched
+from app.circuit_breaker import cesar_breaker, axenta_breaker
+from app.cashing import db_operations
+from app.cashing.cesar_shards import CESAR_SHARD_SIZE, ShardedCesarFetch
+from app.cashing.journal import payload_journal
+from app.cashing.source_status import source_status
+from app.json_stream import ClosingStream
 
 logger = logging.getLogger(__name__)
 
-def fetch_data():
-    """Получает данные из API."""
-    cesar_result = []
-    axenta_result = []
+# Дедлайны (в секундах от начала цикла), после которых источник считается не ответившим;
+# для потокового ответа — суммарное время чтения тела (без времени записи прочитанных объектов)
+CESAR_FETCH_DEADLINE = float(os.getenv('CESAR_FETCH_DEADLINE', '8'))
+AXENTA_FETCH_DEADLINE = float(os.getenv('AXENTA_FETCH_DEADLINE', '8'))
+
+# Потоковый режим Axenta: объекты разбираются и пишутся в БД по мере чтения тела ответа
+AXENTA_STREAMING = os.getenv('AXENTA_STREAMING', '0') == '1'
+
+# По одному потоку на источник: зависший запрос не порождает новых, пока не завершится
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='fetch')
+_in_flight = {}
+
+# Известные юниты Cesar — ключи снимка cash_cesar (см. db_operations.warm_start)
+cesar_sharded = ShardedCesarFetch(lambda: db_operations.cesar_snapshot.fingerprints.keys())
+
+
+def fetch_cesar():
+    """Получает данные из Cesar API."""
+    logger.info("Получение данных из Cesar API...")
+    cesar_connector = CesarConnector.CesarApi()
+    with STAGE_SECONDS.time(stage='cesar_fetch'):
+        if CESAR_SHARD_SIZE > 0:
+            return cesar_sharded.fetch(cesar_connector)
+        return cesar_connector.get_cars_info()
+
+
+def fetch_axenta():
+    """Получает данные из Axenta API."""
+    logger.info("Получение данных из Axenta API...")
+    axenta_connector = AxentaConnector.AxentaApi()
+    with STAGE_SECONDS.time(stage='axenta_fetch'):
+        if AXENTA_STREAMING:
+            result = axenta_connector.iter_all_items()
+        else:
+            result = axenta_connector.search_all_items()
+    if result is None:
+        raise RuntimeError('Axenta API не вернула данных')
+    return result
+
+
+def _submit(source, func):
+    future = _in_flight.get(source)
+    if future is not None and not future.done():
+        logger.warning(f"Запрос к {source} API из прошлого цикла ещё выполняется, ожидаем его.")
+        return future
+    future = _executor.submit(func)
+    _in_flight[source] = future
+    return future
+
+
+def _record_success(breaker):
+    breaker.record_success()
+    source_status.mark_fresh(breaker.name)
+
+
+def _record_failure(source, breaker, error):
+    UPSTREAM_ERRORS.inc(source=source.lower())
+    breaker.record_failure(error)
+    source_status.mark_stale(breaker.name, error)
+
+
+def _guard_stream(source, items, deadline, breaker):
+    """Оборачивает потоковый ответ проверкой дедлайна; close() закрывает ответ, даже если чтение не начиналось."""
+    return ClosingStream(_read_stream(source, items, deadline, breaker), items)
+
+
+def _read_stream(source, items, deadline, breaker):
+    """Читает потоковый ответ в пределах дедлайна.
+
+    Дедлайн считается только по времени чтения тела: часы запускаются на первом чтении и стоят,
+    пока прочитанные объекты пишутся в БД. Итог для предохранителя фиксируется, только когда тело
+    прочитано целиком; превышение дедлайна посреди тела поднимает TimeoutError, и транзакция
+    источника откатывается.
+    """
+    received = 0
+    reading = 0.0
+    iterator = iter(items)
     try:
-        logger.info("Получение данных из Cesar API...")
-        cesar_connector = CesarConnector.CesarApi()
-        cesar_result = cesar_connector.get_cars_info() or []
-        logger.info(f"Успешно получено {len(cesar_result)} записей из Cesar API.")
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            reading += time.monotonic() - started
+            if reading > deadline:
+                raise TimeoutError(f"{source} API не передал ответ за {deadline} с")
+            received += 1
+            yield item
     except Exception as e:
-        logger.error(f"Ошибка при получении данных из Cesar API: {str(e)}")
+        error = f"Ошибка при чтении потокового ответа {source} API: {str(e)}"
+        logger.error(error)
+        _record_failure(source, breaker, error)
+        raise
+    finally:
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
+    logger.info(f"Успешно получено {received} записей из {source} API (поток).")
+    _record_success(breaker)
+    if received:
+        mark_fetched()
+
 
+def _collect(source, future, started, deadline, breaker):
+    expires = started + deadline
     try:
-        logger.info("Получение данных из Axenta API...")
-        axenta_connector = AxentaConnector.AxentaApi()
-        axenta_result = axenta_connector.search_all_items() or []
-        logger.info(f"Успешно получено {len(axenta_result)} записей из Axenta API.")
+        result = future.result(timeout=max(0.0, expires - time.monotonic()))
+        if not isinstance(result, list):
+            logger.info(f"Открыт потоковый ответ {source} API.")
+            return _guard_stream(source, result, deadline, breaker)
+        logger.info(f"Успешно получено {len(result)} записей из {source} API.")
+        _record_success(breaker)
+        return result
+    except FutureTimeoutError:
+        error = f"{source} API не ответил за {deadline} с"
+        logger.error(f"{error}, данные источника пропущены в этом цикле.")
     except Exception as e:
-        logger.error(f"Ошибка при получении данных из Axenta API: {str(e)}")
+        error = f"Ошибка при получении данных из {source} API: {str(e)}"
+        logger.error(error)
+    _record_failure(source, breaker, error)
+    return []
+
+
+def _fetch(source, func, breaker):
+    """Запрашивает источник, если его цепь замкнута; иначе сразу возвращает пустой результат."""
+    if not breaker.allow():
+        logger.warning(f"Цепь {source} разомкнута: источник пропущен, данные в БД помечены устаревшими.")
+        source_status.mark_stale(breaker.name, breaker.last_error or 'цепь разомкнута')
+        return None
+    return _submit(source, func)
+
+
+def _journal(cycle, source, result):
+    """Отправляет ответ источника в журнал; потоковый ответ журналируется по мере чтения."""
+    if isinstance(result, list):
+        payload_journal.record(cycle, source, result)
+        return result
+    return payload_journal.wrap(cycle, source, result, time.time())
+
+
+def fetch_data():
+    """Получает данные из API параллельно, с отдельным дедлайном для каждого источника."""
+    cycle = time.time()
+    started = time.monotonic()
+    cesar_future = _fetch('Cesar', fetch_cesar, cesar_breaker)
+    axenta_future = _fetch('Axenta', fetch_axenta, axenta_breaker)
+
+    cesar_result = []
+    axenta_result = []
+    if cesar_future is not None:
+        cesar_result = _collect('Cesar', cesar_future, started, CESAR_FETCH_DEADLINE, cesar_breaker)
+    if axenta_future is not None:
+        axenta_result = _collect('Axenta', axenta_future, started, AXENTA_FETCH_DEADLINE, axenta_breaker)
+    logger.info(f"Получение данных заняло {time.monotonic() - started:.2f} с.")
+    # Возраст снимка сбрасывается, только если данные пришли; потоковый ответ — когда прочитан
+    if any(isinstance(result, list) and result for result in (cesar_result, axenta_result)):
+        mark_fetched()
+    if payload_journal.enabled:
+        cesar_result = _journal(cycle, 'cesar', cesar_result)
+        axenta_result = _journal(cycle, 'axenta', axenta_result)
 
     if not cesar_result:
         logger.warning("Cesar API не вернул данных.")
     if not axenta_result:
         logger.warning("Axenta API не вернула данных.")
 
-    return cesar_result, axenta_result
\ No newline at end of file
+    return cesar_result, axenta_result
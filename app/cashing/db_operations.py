@@ -1,43 +1,161 @@
 import os
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from http.cookiejar import uppercase_escaped_char
 
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, text
-from app.models import SystemSettings
+from sqlalchemy import text, bindparam, select, func
+from app.database import SessionLocal
+from app.models import CashCesar, CashAxenta, CashHistoryCesar, CashSourceStatus, FleetPosition
+from app import database, settings_cache
+from app.metrics import STAGE_SECONDS, ROWS, CYCLES, LAST_SUCCESS
 from app.cashing.utils import to_unix_time, z_to_unix_time
+from app.cashing.batch import CesarBatch, AxentaBatch
+from app.cashing.snapshot import SourceSnapshot
+from app.cashing.snapshot_store import read_snapshots, save_snapshots
+from app.cashing.source_status import source_status
+from app.cashing.upsert import bulk_upsert
+from app.cashing.history import history_backend, cesar_history, axenta_history
+from app.cashing.enrichment import AXENTA_ENRICH, axenta_enricher
+from app.cashing.linker import CASHING_LINK, transport_linker
+from app.cashing.spatial import CASHING_SPATIAL, spatial_index
+from app.cashing.fleet_position import CASHING_FLEET_POSITION, fleet_positions
+from app.cashing.fleet_store import CASHING_FLEET_STORE, fleet_store
+from app.cashing.lease import fence
 
 # Настройка логгера (совместимого с scheduler.py и data_fetcher.py)
 logger = logging.getLogger(__name__)
 
-# Конфигурация базы данных
-SQLALCHEMY_DATABASE_URL = os.getenv('SQLALCHEMY_DATABASE_URL', 'sqlite:///default.db')
-engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Столбцы, которыми владеет сервис кеширования (остальные, например cash_cesar.linked, не перезаписываются)
+CESAR_COLUMNS = (
+    'unit_id', 'object_name', 'pin', 'vin', 'last_time', 'pos_x', 'pos_y', 'created_at', 'device_type'
+)
+AXENTA_COLUMNS = (
+    'id', 'uid', 'nm', 'pos_x', 'pos_y', 'gps', 'last_time', 'last_pos_time',
+    'connected_status', 'cmd', 'sens', 'valid_nav'
+)
+# cmd и sens вставляются пустыми для новых юнитов, а обновляет их фоновое обогащение
+AXENTA_UPDATE_COLUMNS = tuple(column for column in AXENTA_COLUMNS if column not in ('id', 'cmd', 'sens'))
 
-def bulk_insert_or_replace(session, query, params):
-    """Выполняет REPLACE INTO в батчах для повышения производительности."""
+# Размер чанка, которым изменённые строки Axenta сбрасываются в БД
+AXENTA_CHUNK_SIZE = int(os.getenv('AXENTA_CHUNK_SIZE', '5000'))
+# Параллельная запись источников: 'auto' — кроме SQLite (у неё одна блокировка записи,
+# и параллельные писатели только ждут друг друга), '1' — всегда, '0' — по очереди
+CASHING_PARALLEL_WRITE = os.getenv('CASHING_PARALLEL_WRITE', 'auto').lower()
+
+# Снимки последних записанных строк: в БД уходят только новые и изменённые юниты
+cesar_snapshot = SourceSnapshot('cash_cesar', 'unit_id', CESAR_COLUMNS)
+# cmd и sens в нормализованных строках всегда пустые, а в БД их заполняет обогащение: в отпечаток не входят
+axenta_snapshot = SourceSnapshot('cash_axenta', 'id', ('id',) + AXENTA_UPDATE_COLUMNS)
+
+# Состояние в памяти, которое фиксируется или откатывается вместе с транзакцией источника
+SOURCE_STATES = {
+    'cesar': (cesar_snapshot, cesar_history),
+    'axenta': (axenta_snapshot, axenta_history, axenta_enricher),
+}
+# Состояние, собираемое из обоих источников: фиксируется после записи всех источников,
+# строки откатившегося источника отбрасываются через rollback(source)
+SHARED_STATES = ()
+if CASHING_LINK:
+    SHARED_STATES += (transport_linker,)
+if CASHING_SPATIAL:
+    SHARED_STATES += (spatial_index,)
+if CASHING_FLEET_POSITION:
+    SHARED_STATES += (fleet_positions,)
+if CASHING_FLEET_STORE:
+    SHARED_STATES += (fleet_store,)
+CYCLE_STATES = SOURCE_STATES['cesar'] + SOURCE_STATES['axenta'] + SHARED_STATES
+
+# Источники пишутся параллельно, каждый в своей транзакции на своём соединении пула
+_write_executor = ThreadPoolExecutor(max_workers=len(SOURCE_STATES), thread_name_prefix='cashing-write')
+
+def init_db(warm=True):
+    """Создаёт таблицы, которыми владеет сервис кеширования, если их ещё нет.
+
+    warm=False откладывает восстановление снимков (резервная реплика делает его в take_over).
+    """
+    try:
+        CashHistoryCesar.__table__.create(database.engine, checkfirst=True)
+        CashSourceStatus.__table__.create(database.engine, checkfirst=True)
+        FleetPosition.__table__.create(database.engine, checkfirst=True)
+    except Exception as e:
+        logger.error(f"Ошибка при создании таблиц: {str(e)}")
+    if warm:
+        warm_start()
+
+def take_over():
+    """Готовит реплику к роли писателя: пока она была в резерве, кеш-таблицы писал прежний писатель."""
+    warm_start()
+    # Значения linked, координаты transport, пространственный индекс, fleet_position и хранилище API
+    # перечитываются из БД при следующем commit
+    transport_linker.loaded_at = None
+    spatial_index.reset()
+    fleet_positions.reset()
+    fleet_store.reset()
+
+def warm_start():
+    """Восстанавливает снимки источников, чтобы первый цикл после перезапуска писал только изменения.
+
+    Снимок берётся из файла, если его максимальное время сообщения совпадает с кеш-таблицей;
+    иначе (файла нет, он устарел или таблицу писал кто-то ещё) строится одним чтением таблицы.
+    """
+    stored = read_snapshots() or {}
+    session = SessionLocal()
+    try:
+        for snapshot, model in ((cesar_snapshot, CashCesar), (axenta_snapshot, CashAxenta)):
+            table = model.__table__
+            db_max_time = session.execute(select(func.max(table.c.last_time))).scalar() or 0
+            saved = stored.get(snapshot.name)
+            if saved is not None and saved[2] == db_max_time:
+                snapshot.load(saved[0], saved[1])
+                logger.info(f"{snapshot.name}: снимок восстановлен из файла ({len(snapshot.fingerprints)} юнитов).")
+                continue
+            with STAGE_SECONDS.time(stage=f'{snapshot.name}_seed'):
+                rows = session.execute(select(*[table.c[column] for column in snapshot.columns]))
+                snapshot.seed(row._mapping for row in rows)
+            logger.info(f"{snapshot.name}: снимок построен по таблице ({len(snapshot.fingerprints)} юнитов).")
+    except Exception as e:
+        logger.error(f"Ошибка при восстановлении снимков, первый цикл перепишет все строки: {str(e)}")
+        cesar_snapshot.reset()
+        axenta_snapshot.reset()
+    finally:
+        session.close()
+
+def bulk_insert_or_replace(session, table, columns, key, params, update_columns=None):
+    """Выполняет upsert (INSERT ... ON DUPLICATE KEY / ON CONFLICT) в батчах."""
     try:
         logger.debug(f"Выполнение батч-операции с {len(params)} записями.")
-        session.execute(query, params)
+        bulk_upsert(session, table, columns, key, params, update_columns)
         logger.info(f"Успешно выполнена батч-операция с {len(params)} записями.")
     except Exception as e:
         logger.error(f"Ошибка при выполнении батч-операции: {str(e)}")
         session.rollback()
         raise
 
+def bulk_delete(session, table, key, keys):
+    """Удаляет строки пропавших из API юнитов."""
+    if not keys:
+        return
+    query = text(f"DELETE FROM {table} WHERE {key} IN :keys").bindparams(bindparam('keys', expanding=True))
+    session.execute(query, {'keys': list(keys)})
+    logger.info(f"Удалено {len(keys)} записей из {table}.")
+
+def get_cycle_stats():
+    """Возвращает счётчики изменённых/неизменённых/удалённых строк последнего цикла."""
+    return {
+        'cesar': dict(cesar_snapshot.last_stats),
+        'axenta': dict(axenta_snapshot.last_stats),
+    }
+
 def process_cesar_result(session, cesar_result):
-    """Обрабатывает данные из cesar_result и выполняет REPLACE INTO cash_cesar."""
+    """Обрабатывает данные из cesar_result и выполняет upsert в cash_cesar."""
     if not cesar_result:
         logger.warning("Нет данных из Cesar для обработки.")
         return
 
-    replace_query = text(
-        """REPLACE INTO cash_cesar (unit_id, object_name, pin, vin, last_time, pos_x, pos_y, created_at, device_type)
-           VALUES (:unit_id, :object_name, :pin, :vin, :last_time, :pos_x, :pos_y, :created_at, :device_type)"""
-    )
-
-    batch_data = []
+    started = time.perf_counter()
+    # Строки нормализуются сразу в столбцы пакета, без промежуточных словарей
+    batch = CesarBatch()
     for item in cesar_result:
         if item is None:
             logger.warning("Пропущен элемент None в cesar_result.")
@@ -48,116 +166,207 @@ def process_cesar_result(session, cesar_result):
             continue
 
         object_name = item.get('object_name', '').split('|')[0].strip() if '|' in item.get('object_name', '') else item.get('object_name', '')
-        object_name.upper()
-        batch_data.append({
-            'unit_id': item.get('unit_id'),
-            'object_name': object_name,
-            'pin': item.get('pin'),
-            'vin': item.get('vin'),
-            'last_time': to_unix_time(item.get('receive_time', None)),
-            'pos_x': item.get('lat', 0.0),
-            'pos_y': item.get('lon', 0.0),
-            'created_at': to_unix_time(item.get('created_at', None)),
-            'device_type': item.get('device_type', 'Unknown')
-        })
-
-    if batch_data:
-        logger.info(f"Подготовлено {len(batch_data)} записей для cash_cesar.")
-        bulk_insert_or_replace(session, replace_query, batch_data)
-    else:
+        object_name = object_name.upper()
+        batch.append((
+            item.get('unit_id'),
+            object_name,
+            item.get('pin'),
+            item.get('vin'),
+            to_unix_time(item.get('receive_time', None)),
+            item.get('lat', 0.0),
+            item.get('lon', 0.0),
+            to_unix_time(item.get('created_at', None)),
+            item.get('device_type', 'Unknown'),
+        ))
+    # Строки с некорректными типами значений отбрасываются при раскладке по столбцам
+    batch.seal()
+
+    ROWS.inc(len(cesar_result), source='cesar', state='received')
+    ROWS.inc(len(cesar_result) - len(batch), source='cesar', state='skipped')
+    if not batch:
         logger.warning("Нет валидных данных для вставки в cash_cesar.")
+        return
+
+    changed, deleted = cesar_snapshot.diff(batch)
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage='cesar_normalize')
+    logger.info(f"Подготовлено {len(changed)} из {len(batch)} записей для cash_cesar.")
+    if changed:
+        with STAGE_SECONDS.time(stage='cesar_write'):
+            bulk_insert_or_replace(session, 'cash_cesar', CESAR_COLUMNS, 'unit_id', changed)
+        if history_backend() == 'python':
+            with STAGE_SECONDS.time(stage='cesar_history'):
+                cesar_history.append(session, changed)
+    bulk_delete(session, 'cash_cesar', 'unit_id', deleted)
+    if CASHING_LINK:
+        transport_linker.observe_cesar(changed, deleted)
+    if CASHING_SPATIAL:
+        spatial_index.observe('cesar', changed, 'unit_id', deleted)
+    if CASHING_FLEET_POSITION:
+        fleet_positions.observe('cesar', changed, deleted)
+    if CASHING_FLEET_STORE:
+        fleet_store.observe('cesar', changed, deleted)
+    _count_rows('cesar', cesar_snapshot)
+
+def axenta_values(idx, item):
+    """Преобразует объект Axenta в кортеж значений AXENTA_COLUMNS или возвращает None, если объект пропущен."""
+    if item is None:
+        logger.warning(f"Пропущен элемент None на индексе {idx} в axenta_result.")
+        return None
+
+    try:
+        # logger.info(f'Парсим item {idx}: {item}')
+        # Проверка обязательных полей
+        if item.get('id') is None or item.get('name') is None:
+            logger.warning(f"Пропущен элемент на индексе {idx} из-за отсутствия обязательных полей: {item}")
+            return None
+
+        # Извлечение имени без суффиксов после '|'
+        nm = item.get('name', '').split('|')[0].strip() if '|' in item.get('name', '') else item.get('name', '')
+        nm = nm.upper()
+
+        # Извлечение уникального идентификатора и проверка, что это число
+        uid = item.get('uniqueId', '0')
+        uid = 0 if not str(uid).isdigit() else int(uid)
+
+        # Извлечение данных о последнем сообщении
+        pos_x = None
+        pos_y = None
+        gps = None
+        last_time = 0
+        last_pos_time = 0
+        valid_nav = 0
+        last_message = item.get('lastMessage', None)
+        if last_message is not None:
+            pos = last_message.get('pos', None)
+            last_time = z_to_unix_time(last_message.get('t', None))
+            last_pos_time = z_to_unix_time(last_message.get('tpos', None))
+            if pos is not None:
+                pos_x = pos.get('x', 0.0) if pos.get('x') is not None else 0.0
+                pos_y = pos.get('y', 0.0) if pos.get('y') is not None else 0.0
+                gps = pos.get('sc', 0) if pos.get('sc') is not None else 0
+                if gps is not None and gps > 4:
+                    valid_nav = 1
+
+        # Поля cmd и sens в объекте нет: их заполняет фоновое обогащение (enrichment.py)
+        cmd = ''
+        sens = ''
+
+        # pos_x / pos_y в cash_axenta — широта и долгота, в объекте Axenta — наоборот
+        return (item.get('id'), uid, nm, pos_y, pos_x, gps, last_time, last_pos_time,
+                item.get('connectedStatus', False), cmd, sens, valid_nav)
+
+    except Exception as e:
+        logger.error(f"Ошибка при обработке элемента на индексе {idx}: {str(e)}")
+        return None
+
+def normalize_axenta_item(idx, item):
+    """Преобразует объект Axenta в строку cash_axenta или возвращает None, если объект пропущен."""
+    values = axenta_values(idx, item)
+    return None if values is None else dict(zip(AXENTA_COLUMNS, values))
+
+def _count_rows(source, snapshot):
+    stats = snapshot.last_stats
+    ROWS.inc(stats['changed'], source=source, state='written')
+    ROWS.inc(stats['unchanged'], source=source, state='unchanged')
+    ROWS.inc(stats['deleted'], source=source, state='deleted')
+
+def flush_axenta_rows(session, rows, timings=None):
+    """Записывает чанк изменённых строк cash_axenta (UnitBatch или список словарей) и дописывает их в историю."""
+    started = time.perf_counter()
+    bulk_insert_or_replace(session, 'cash_axenta', AXENTA_COLUMNS, 'id', rows, AXENTA_UPDATE_COLUMNS)
+    written_at = time.perf_counter()
+    if history_backend() == 'python':
+        axenta_history.append(session, rows)
+    if CASHING_LINK:
+        transport_linker.observe_axenta(rows)
+    if CASHING_SPATIAL:
+        spatial_index.observe('axenta', rows, 'id')
+    if CASHING_FLEET_POSITION:
+        fleet_positions.observe('axenta', rows)
+    if CASHING_FLEET_STORE:
+        fleet_store.observe('axenta', rows)
+    if timings is not None:
+        timings['write'] += written_at - started
+        timings['history'] += time.perf_counter() - written_at
+    return len(rows)
+
+def flush_axenta_batch(session, batch, timings):
+    """Сравнивает чанк нормализованных строк со снимком и записывает изменённые."""
+    batch.seal()
+    if AXENTA_ENRICH:
+        for unit_id, last_time in zip(batch.id, batch.last_time):
+            axenta_enricher.consider(unit_id, last_time)
+    changed = batch.take(axenta_snapshot.observe_batch(batch))
+    if changed:
+        flush_axenta_rows(session, changed, timings)
+    return len(changed)
 
 def process_axenta_result(session, axenta_result):
-    """Обрабатывает данные из axenta_result и выполняет REPLACE INTO cash_axenta."""
+    """Обрабатывает данные из axenta_result и выполняет upsert в cash_axenta.
+
+    axenta_result может быть списком или потоковым итератором: объекты нормализуются по одному
+    в столбцы UnitBatch, а пакеты по AXENTA_CHUNK_SIZE строк сравниваются со снимком и сбрасываются в БД.
+    """
     if not axenta_result:
         logger.warning("Нет данных из Axenta для обработки.")
         return
 
-    replace_query = text(
-        """REPLACE INTO cash_axenta (
-            id, uid, nm, pos_x, pos_y, gps, last_time, last_pos_time, 
-            connected_status, cmd, sens, valid_nav
-        ) VALUES (
-            :id, :uid, :nm, :pos_x, :pos_y, :gps, :last_time, :last_pos_time, 
-            :connected_status, :cmd, :sens, :valid_nav
-        )"""
-    )
-
-    batch_data = []
+    started = time.perf_counter()
+    timings = {'write': 0.0, 'history': 0.0}
+    axenta_snapshot.begin()
+    batch = AxentaBatch()
+    received = 0
+    total = 0
+    written = 0
     for idx, item in enumerate(axenta_result):
-        if item is None:
-            logger.warning(f"Пропущен элемент None на индексе {idx} в axenta_result.")
+        received += 1
+        values = axenta_values(idx, item)
+        if values is None:
             continue
+        batch.append(values)
+        if len(batch) >= AXENTA_CHUNK_SIZE:
+            written += flush_axenta_batch(session, batch, timings)
+            total += len(batch)
+            batch = AxentaBatch()
 
-        try:
-            # logger.info(f'Парсим item {idx}: {item}')
-            # Проверка обязательных полей
-            if item.get('id') is None or item.get('name') is None:
-                logger.warning(f"Пропущен элемент на индексе {idx} из-за отсутствия обязательных полей: {item}")
-                continue
+    batch.seal()
+    total += len(batch)
+    ROWS.inc(received, source='axenta', state='received')
+    ROWS.inc(received - total, source='axenta', state='skipped')
+    if not total:
+        axenta_snapshot.rollback()
+        logger.warning("Нет валидных данных для вставки в cash_axenta.")
+        return
 
-            # Извлечение имени без суффиксов после '|'
-            nm = item.get('name', '').split('|')[0].strip() if '|' in item.get('name', '') else item.get('name', '')
-            nm = nm.upper()
-
-            # Извлечение уникального идентификатора и проверка, что это число
-            uid = item.get('uniqueId', '0')
-            uid = 0 if not str(uid).isdigit() else int(uid)
-
-            # Извлечение данных о последнем сообщении
-            pos_x = None
-            pos_y = None
-            gps = None
-            last_time = 0
-            last_pos_time = 0
-            valid_nav = 0
-            last_message = item.get('lastMessage', None)
-            if last_message is not None:
-                pos = last_message.get('pos', None)
-                last_time = z_to_unix_time(last_message.get('t', None))
-                last_pos_time = z_to_unix_time(last_message.get('tpos', None))
-                if pos is not None:
-                    pos_x = pos.get('x', 0.0) if pos.get('x') is not None else 0.0
-                    pos_y = pos.get('y', 0.0) if pos.get('y') is not None else 0.0
-                    gps = pos.get('sc', 0) if pos.get('sc') is not None else 0
-                    if gps is not None and gps > 4:
-                        valid_nav = 1
-
-            # Поля cmd и sens (пустые, так как в данных Axenta нет аналогов cml и sens из Wialon)
-            cmd = ''
-            sens = ''
-
-            batch_data.append({
-                'id': item.get('id'),
-                'uid': uid,
-                'nm': nm,
-                'pos_x': pos_y,
-                'pos_y': pos_x,
-                'gps': gps,
-                'last_time': last_time,
-                'last_pos_time': last_pos_time,
-                'connected_status': item.get('connectedStatus', False),
-                'cmd': cmd,
-                'sens': sens,
-                'valid_nav': valid_nav
-            })
-
-        except Exception as e:
-            logger.error(f"Ошибка при обработке элемента на индексе {idx}: {str(e)}")
-            continue
+    if batch:
+        written += flush_axenta_batch(session, batch, timings)
+    deleted = axenta_snapshot.finish()
+    logger.info(f"Записано {written} из {total} записей в cash_axenta.")
+    bulk_delete(session, 'cash_axenta', 'id', deleted)
+    if CASHING_SPATIAL:
+        spatial_index.observe('axenta', (), 'id', deleted)
+    if CASHING_FLEET_POSITION:
+        fleet_positions.observe('axenta', (), deleted)
+    if CASHING_FLEET_STORE:
+        fleet_store.observe('axenta', (), deleted)
+    if AXENTA_ENRICH:
+        axenta_enricher.forget(deleted)
+    _count_rows('axenta', axenta_snapshot)
 
-    if batch_data:
-        logger.info(f"Подготовлено {len(batch_data)} записей для cash_axenta.")
-        bulk_insert_or_replace(session, replace_query, batch_data)
-    else:
-        logger.warning("Нет валидных данных для вставки в cash_axenta.")
+    # В потоковом режиме нормализация включает и чтение тела ответа
+    elapsed = time.perf_counter() - started
+    STAGE_SECONDS.observe(elapsed - timings['write'] - timings['history'], stage='axenta_normalize')
+    STAGE_SECONDS.observe(timings['write'], stage='axenta_write')
+    if history_backend() == 'python':
+        STAGE_SECONDS.observe(timings['history'], stage='axenta_history')
 
 def update_cesar_history_via_sql():
     """Вызов SQL-функции для обновления CashHistoryCesar."""
     session = SessionLocal()
     try:
         logger.info("Вызов SQL-функции update_cash_history_cesar.")
-        session.execute(text("CALL update_cash_history_cesar"))
+        with STAGE_SECONDS.time(stage='cesar_history'):
+            session.execute(text("CALL update_cash_history_cesar"))
         session.commit()
         logger.info("Успешно обновлена история Cesar.")
     except Exception as e:
@@ -171,7 +380,8 @@ def update_axenta_history_via_sql():
     session = SessionLocal()
     try:
         logger.info("Вызов SQL-функции update_cash_history_axenta.")
-        session.execute(text("CALL update_cash_history_axenta"))
+        with STAGE_SECONDS.time(stage='axenta_history'):
+            session.execute(text("CALL update_cash_history_axenta"))
         session.commit()
         logger.info("Успешно обновлена история Axenta.")
     except Exception as e:
@@ -180,34 +390,92 @@ def update_axenta_history_via_sql():
     finally:
         session.close()
 
-def cash_db(cesar_result, axenta_result):
-    """Обновляет базу данных данными из cesar_result и axenta_result."""
+def write_source(source, process, result, update_history_via_sql):
+    """Пишет один источник в отдельной сессии и транзакции.
+
+    Возвращает словарь с итогом: source, committed, seconds, error.
+    """
+    started = time.perf_counter()
     session = SessionLocal()
     try:
-        logger.info("Начало обновления базы данных.")
-        process_cesar_result(session, cesar_result)
-        process_axenta_result(session, axenta_result)
-        session.commit()
-        logger.info("Успешно выполнен commit операций с базой данных.")
+        process(session, result)
+        # Писатель мог потерять аренду, пока писал: тогда транзакция откатывается
+        fence(session)
+        with STAGE_SECONDS.time(stage=f'{source}_commit'):
+            session.commit()
+        for state in SOURCE_STATES[source]:
+            state.commit()
+        outcome = {'source': source, 'committed': True, 'error': None}
     except Exception as e:
         session.rollback()
-        logger.error(f"Ошибка при выполнении операций с базой данных: {str(e)}")
-        raise
+        for state in SOURCE_STATES[source]:
+            state.rollback()
+        for state in SHARED_STATES:
+            state.rollback(source)
+        logger.error(f"Ошибка при записи {source}, транзакция источника откатена: {str(e)}")
+        outcome = {'source': source, 'committed': False, 'error': str(e)}
     finally:
         session.close()
-        logger.info("Обновление истории...")
-        update_cesar_history_via_sql()
-        update_axenta_history_via_sql()
+    # История по хранимой процедуре обновляется только для зафиксированного источника
+    if outcome['committed'] and history_backend() == 'sql':
+        update_history_via_sql()
+    outcome['seconds'] = time.perf_counter() - started
+    return outcome
+
+def parallel_write():
+    """True, если источники пишутся параллельно (см. CASHING_PARALLEL_WRITE)."""
+    if CASHING_PARALLEL_WRITE == 'auto':
+        return database.engine.dialect.name != 'sqlite'
+    return CASHING_PARALLEL_WRITE == '1'
+
+
+def cash_db(cesar_result, axenta_result):
+    """Обновляет базу данных данными из cesar_result и axenta_result.
+
+    Cesar и Axenta пишутся в независимых транзакциях: ошибка одного источника не откатывает
+    другой. На MySQL / PostgreSQL транзакции идут параллельно, на SQLite — по очереди
+    (см. CASHING_PARALLEL_WRITE).
+    Возвращает список итогов по источникам (см. write_source); исключение поднимается,
+    только если не удалось записать ни один источник.
+    """
+    logger.info("Начало обновления базы данных.")
+    jobs = [
+        ('cesar', process_cesar_result, cesar_result, update_cesar_history_via_sql),
+        ('axenta', process_axenta_result, axenta_result, update_axenta_history_via_sql),
+    ]
+    if parallel_write():
+        futures = [_write_executor.submit(write_source, *job) for job in jobs]
+        outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [write_source(*job) for job in jobs]
+    for state in SHARED_STATES:
+        state.commit()
+    if any(outcome['committed'] for outcome in outcomes):
+        with STAGE_SECONDS.time(stage='snapshot_save'):
+            save_snapshots((cesar_snapshot, axenta_snapshot))
+    for outcome in outcomes:
+        if outcome['committed']:
+            source_status.committed(outcome['source'])
+    source_status.persist()
+
+    failed = [outcome for outcome in outcomes if not outcome['committed']]
+    for outcome in outcomes:
+        STAGE_SECONDS.observe(outcome['seconds'], stage=f"{outcome['source']}_transaction")
+    if not failed:
+        CYCLES.inc(result='success')
+        LAST_SUCCESS.set_to_current_time()
+        logger.info("Успешно выполнен commit операций с базой данных.")
+    elif len(failed) < len(outcomes):
+        CYCLES.inc(result='partial')
+        logger.warning(f"Записаны не все источники: {', '.join(o['source'] for o in failed)} откатены.")
+    else:
+        CYCLES.inc(result='failure')
+        raise RuntimeError('; '.join(f"{o['source']}: {o['error']}" for o in failed))
+    return outcomes
 
 def check_status():
-    """Проверяет статус системы в базе данных."""
-    try:
-        session = SessionLocal()
-        result = session.query(SystemSettings).filter(SystemSettings.id == 0).first()
-        session.close()
-        status = result.enable_db_cashing if result else 0
-        logger.debug(f"Статус системы: {'включен' if status else 'выключен'}.")
-        return status
-    except Exception as e:
-        logger.error(f"Ошибка подключения к базе данных: {str(e)}")
-        return 0
\ No newline at end of file
+    """Проверяет статус системы (настройки кешируются на SETTINGS_CACHE_TTL секунд)."""
+    settings = settings_cache.system_settings.get()
+    status = settings['enable_db_cashing'] if settings else 0
+    logger.debug(f"Статус системы: {'включен' if status else 'выключен'}.")
+    return status
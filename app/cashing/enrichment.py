@@ -0,0 +1,218 @@
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+from app import api_axenta_connector as AxentaConnector
+from app.database import SessionLocal
+from app.metrics import STAGE_SECONDS, ROWS, UPSTREAM_ERRORS
+from app.circuit_breaker import axenta_breaker
+from app.cashing.lease import fence
+
+logger = logging.getLogger(__name__)
+
+# Дозагрузка датчиков и команд Axenta (cash_axenta.sens / cmd) в фоне
+AXENTA_ENRICH = os.getenv('AXENTA_ENRICH', '1') == '1'
+# Сколько юнитов отправляется на обогащение за цикл (0 — без ограничения). При первом запуске
+# и при массовом истечении MAX_AGE парк опрашивается постепенно, а не всплеском запросов
+AXENTA_ENRICH_PER_CYCLE = int(os.getenv('AXENTA_ENRICH_PER_CYCLE', '200'))
+# Сколько юнитов опрашивается одновременно
+AXENTA_ENRICH_CONCURRENCY = int(os.getenv('AXENTA_ENRICH_CONCURRENCY', '8'))
+# Даже без новых сообщений датчики юнита перечитываются не реже, чем раз в MAX_AGE секунд
+AXENTA_ENRICH_MAX_AGE = int(os.getenv('AXENTA_ENRICH_MAX_AGE', '3600'))
+# Как часто накопленные результаты пишутся в БД
+AXENTA_ENRICH_FLUSH_INTERVAL = float(os.getenv('AXENTA_ENRICH_FLUSH_INTERVAL', '2'))
+# Деление обогащения между репликами: 'i/n' — реплика опрашивает юниты с id % n == i
+AXENTA_ENRICH_SHARD = os.getenv('AXENTA_ENRICH_SHARD', '0/1')
+
+
+def parse_shard(value):
+    """Разбирает 'i/n' в (i, n)."""
+    index, count = (int(part) for part in value.split('/'))
+    if not 0 <= index < count:
+        raise ValueError(f"Некорректная доля обогащения: {value}")
+    return index, count
+
+
+class AxentaEnricher:
+    """Фоновое обогащение cash_axenta датчиками и командами юнитов.
+
+    Во время цикла юниты только помечаются кандидатами (consider); запросы к API
+    уходят после commit цикла в пул с ограниченной параллельностью, а результаты
+    пишутся отдельным потоком пакетными UPDATE, не задерживая основной цикл.
+
+    За цикл отправляется не больше per_cycle юнитов: первыми — давно не опрашивавшиеся,
+    остальные остаются кандидатами и уходят в следующих циклах.
+    """
+
+    def __init__(self, concurrency=AXENTA_ENRICH_CONCURRENCY, max_age=AXENTA_ENRICH_MAX_AGE,
+                 flush_interval=AXENTA_ENRICH_FLUSH_INTERVAL, shard=AXENTA_ENRICH_SHARD,
+                 per_cycle=AXENTA_ENRICH_PER_CYCLE):
+        self.concurrency = concurrency
+        self.per_cycle = per_cycle
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.shard_index, self.shard_count = parse_shard(shard)
+        # id юнита -> (last_time, время обогащения)
+        self.cache = {}
+        # id юнита -> время последней отправки на обогащение (очерёдность при ограничении per_cycle)
+        self.attempted = {}
+        self._candidates = {}
+        self._deleted = set()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._results = queue.Queue()
+        self._executor = None
+        self._flusher = None
+
+    def consider(self, unit_id, last_time):
+        """Помечает юнита кандидатом, если его lastMessage.t сменился или данные устарели."""
+        if self.shard_count > 1 and unit_id % self.shard_count != self.shard_index:
+            return
+        cached = self.cache.get(unit_id)
+        if cached is not None and cached[0] == last_time and time.monotonic() - cached[1] < self.max_age:
+            return
+        self._candidates[unit_id] = last_time
+
+    def forget(self, unit_ids):
+        """Запоминает юниты, удалённые из cash_axenta; их кеш очищается в commit."""
+        self._deleted.update(unit_ids)
+
+    def commit(self):
+        """Отправляет кандидатов зафиксированного цикла на обогащение."""
+        candidates, self._candidates = self._candidates, {}
+        deleted, self._deleted = self._deleted, set()
+        for unit_id in deleted:
+            self.cache.pop(unit_id, None)
+            self.attempted.pop(unit_id, None)
+            candidates.pop(unit_id, None)
+        if not candidates:
+            return
+        if axenta_breaker.is_open:
+            # Юниты не попали в кеш и будут снова кандидатами, когда Axenta восстановится
+            logger.warning("Цепь Axenta разомкнута, обогащение отложено.")
+            return
+        self._start()
+        submitted = 0
+        now = time.monotonic()
+        with self._lock:
+            ready = [unit_id for unit_id in candidates if unit_id not in self._in_flight]
+            if self.per_cycle and len(ready) > self.per_cycle:
+                ready = heapq.nsmallest(self.per_cycle, ready, key=lambda unit_id: self.attempted.get(unit_id, 0.0))
+            for unit_id in ready:
+                self._in_flight.add(unit_id)
+                self.attempted[unit_id] = now
+                self._executor.submit(self._enrich, unit_id, candidates[unit_id])
+                submitted += 1
+        logger.info(f"Axenta: на обогащение отправлено {submitted} из {len(candidates)} юнитов.")
+
+    def rollback(self):
+        self._candidates = {}
+        self._deleted = set()
+
+    @property
+    def sharded(self):
+        return self.shard_count > 1
+
+    def consider_from_db(self):
+        """Резервная реплика: берёт кандидатов своей доли из cash_axenta и отправляет их на обогащение.
+
+        Писатель опрашивает только свою долю, поэтому доли остальных реплик обогащаются ими самими.
+        """
+        session = SessionLocal()
+        try:
+            rows = session.execute(
+                text("SELECT id, last_time FROM cash_axenta WHERE id % :count = :index"),
+                {'count': self.shard_count, 'index': self.shard_index})
+            for unit_id, last_time in rows:
+                self.consider(unit_id, last_time)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении кандидатов на обогащение: {str(e)}")
+            self._candidates = {}
+            return
+        finally:
+            session.close()
+        self.commit()
+
+    def _start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='axenta-enrich')
+            self._flusher = threading.Thread(target=self._flush_loop, name='axenta-enrich-writer', daemon=True)
+            self._flusher.start()
+
+    def _enrich(self, unit_id, last_time):
+        try:
+            api = AxentaConnector.AxentaApi()
+            started = time.perf_counter()
+            sens = api.get_sensors(str(unit_id))
+            cmd = api.get_cmd(str(unit_id))
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='axenta_enrich_unit')
+            if sens is None or cmd is None:
+                UPSTREAM_ERRORS.inc(source='axenta_enrich')
+                return
+            self._results.put({
+                'id': unit_id,
+                'cmd': json.dumps(cmd, ensure_ascii=False),
+                'sens': json.dumps(sens, ensure_ascii=False),
+            })
+            self.cache[unit_id] = (last_time, time.monotonic())
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(source='axenta_enrich')
+            logger.error(f"Ошибка обогащения юнита Axenta {unit_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(unit_id)
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                rows.append(self._results.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def flush(self):
+        """Пишет накопленные датчики и команды одним пакетным UPDATE."""
+        rows = self._drain()
+        if not rows:
+            return 0
+        session = SessionLocal()
+        try:
+            with STAGE_SECONDS.time(stage='axenta_enrich_write'):
+                session.execute(text("UPDATE cash_axenta SET cmd = :cmd, sens = :sens WHERE id = :id"), rows)
+                # Без деления между репликами обогащает только писатель: потерявший аренду не пишет.
+                # При делении каждая реплика, и резервная тоже, пишет свою долю юнитов.
+                if not self.sharded:
+                    fence(session)
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка при записи датчиков Axenta: {str(e)}")
+            # Юниты будут опрошены заново в следующем цикле
+            for row in rows:
+                self.cache.pop(row['id'], None)
+            return 0
+        finally:
+            session.close()
+        ROWS.inc(len(rows), source='axenta', state='enriched')
+        logger.info(f"Axenta: обновлены датчики и команды {len(rows)} юнитов.")
+        return len(rows)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def pending(self):
+        """Количество юнитов, которые ещё опрашиваются."""
+        with self._lock:
+            return len(self._in_flight)
+
+
+axenta_enricher = AxentaEnricher()
@@ -0,0 +1,103 @@
+import csv
+import logging
+import os
+import sys
+import time
+
+from sqlalchemy import select, or_
+
+from app.database import SessionLocal
+from app.models import CashCesar, CashAxenta
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк читается из курсора за раз: память выгрузки не зависит от размера парка
+CASHING_EXPORT_BATCH = int(os.getenv('CASHING_EXPORT_BATCH', '1000'))
+# Юнит считается офлайн, если не выходил на связь дольше этого числа дней
+CASHING_OFFLINE_DAYS = float(os.getenv('CASHING_OFFLINE_DAYS', '3'))
+
+# Заголовки совпадают с отчётом CesarApi.get_cars_info(toString=True)
+EXPORTS = {
+    'cesar': (
+        CashCesar,
+        ('unit_id', 'object_name', 'pin', 'created_at', 'last_time'),
+        ('cesar_id', 'uNumber', 'PIN', 'created', 'last_online'),
+    ),
+    'axenta': (
+        CashAxenta,
+        ('id', 'nm', 'uid', 'last_time', 'last_pos_time', 'valid_nav'),
+        ('axenta_id', 'uNumber', 'uid', 'last_online', 'last_position', 'valid_nav'),
+    ),
+}
+# Поля времени: 0 в кеше означает, что время неизвестно, в отчёт пишется пустое значение
+_TIME_COLUMNS = ('created_at', 'last_time', 'last_pos_time')
+
+
+def offline_before(days=CASHING_OFFLINE_DAYS, now=None):
+    """UNIX-время, раньше которого последний выход на связь считается офлайном."""
+    return int((now if now is not None else time.time()) - days * 24 * 60 * 60)
+
+
+def iter_export(session, source, offline=None, device_type=None, linked=None, batch_size=CASHING_EXPORT_BATCH):
+    """Возвращает генератор строк кеш-таблицы источника, читаемых серверным курсором.
+
+    offline — UNIX-время: остаются юниты, последний раз выходившие на связь раньше него
+    или не выходившие ни разу. device_type и linked есть только у Cesar.
+    Фильтры проверяются и запрос выполняется сразу, строки читаются по мере обхода.
+    """
+    model, columns, _ = EXPORTS[source]
+    if source != 'cesar' and (device_type is not None or linked is not None):
+        raise ValueError(f"Фильтры device_type и linked недоступны для источника {source}")
+    table = model.__table__
+    query = select(*[table.c[column] for column in columns])
+    if offline is not None:
+        query = query.where(or_(table.c.last_time < offline, table.c.last_time.is_(None)))
+    if device_type is not None:
+        query = query.where(table.c.device_type == device_type)
+    if linked is not None:
+        query = query.where(table.c.linked.is_(True) if linked else or_(table.c.linked.is_(False),
+                                                                        table.c.linked.is_(None)))
+    # Первый столбец выгрузки — первичный ключ
+    query = query.order_by(table.c[columns[0]])
+    # yield_per включает stream_results: на MySQL строки читаются серверным курсором, а не целиком
+    result = session.execute(query.execution_options(yield_per=batch_size))
+    return _rows(result, [index for index, column in enumerate(columns) if column in _TIME_COLUMNS])
+
+
+def _rows(result, blank):
+    for row in result:
+        row = list(row)
+        for index in blank:
+            if not row[index]:
+                row[index] = ''
+        yield row
+
+
+def write_csv(rows, header, file):
+    """Пишет строки в CSV (разделитель ';') по мере чтения; возвращает число строк."""
+    writer = csv.writer(file, delimiter=';', lineterminator='\n')
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def export_csv(source, file, **filters):
+    """Выгружает кеш-таблицу источника в CSV-файл или поток; возвращает число строк."""
+    session = SessionLocal()
+    try:
+        count = write_csv(iter_export(session, source, **filters), EXPORTS[source][2], file)
+    finally:
+        session.close()
+    logger.info(f"Выгрузка {source}: {count} строк.")
+    return count
+
+
+def run_export(path, source, **filters):
+    """Выгрузка в файл path или в stdout при path = '-'."""
+    if path == '-':
+        return export_csv(source, sys.stdout, **filters)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        return export_csv(source, file, **filters)
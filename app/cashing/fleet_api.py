@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from app.cashing.fleet_store import fleet_store
+from app.cashing.spatial import CASHING_SPATIAL, spatial_index
+
+logger = logging.getLogger(__name__)
+
+# Локальный HTTP/JSON API чтения кеша юнитов; порт 0 отключает сервер
+FLEET_API_HOST = os.getenv('FLEET_API_HOST', '127.0.0.1')
+FLEET_API_PORT = int(os.getenv('FLEET_API_PORT', '9109'))
+
+
+def _handler(store, is_active, index=None):
+    class Handler(BaseHTTPRequestHandler):
+        """GET-эндпоинты:
+
+        /fleet                       — все юниты и версия хранилища
+        /fleet/version               — версия и число юнитов
+        /fleet/changes?since=N       — изменённые и удалённые юниты после версии N (410 — версия слишком старая)
+        /fleet/cesar/<unit_id>, /fleet/axenta/<id>, /fleet/name/<госномер>, /fleet/vin/<VIN>
+        /fleet/near?lat=&lon=&radius=  — юниты в радиусе (метры) с расстоянием, ближние первыми
+        /fleet/bbox?min_lat=&min_lon=&max_lat=&max_lon=  — юниты в прямоугольнике
+        /fleet/storage/<Storage.ID>?margin=  — юниты в зоне склада (CASHING_STORAGE_ZONES)
+
+        Пространственные запросы идут по индексу spatial (404, если он выключен CASHING_SPATIAL=0).
+
+        Ответы несут ETag с версией; запрос с совпадающим If-None-Match получает 304.
+        """
+
+        # keep-alive: частые опросы не открывают соединение на каждый запрос
+        protocol_version = 'HTTP/1.1'
+        # Заголовки и тело уходят отдельными записями: без TCP_NODELAY ответ ждёт отложенного ACK (~40 мс)
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            parts = [unquote(part) for part in url.path.strip('/').split('/')]
+            if not parts or parts[0] != 'fleet':
+                self.send_error(404)
+                return
+            if not store.loaded or (is_active is not None and not is_active()):
+                # Резервная реплика или хранилище ещё не загружено: данные не актуальны
+                self._json(503, {'error': 'хранилище не актуально на этой реплике'})
+                return
+            try:
+                self._route(parts[1:], parse_qs(url.query))
+            except (ValueError, KeyError):
+                self._json(400, {'error': 'некорректный запрос'})
+
+        def _route(self, parts, query):
+            if not parts:
+                version, body = store.snapshot()
+                self._send(200, body, version)
+            elif parts == ['version']:
+                self._json(200, {'version': store.version, 'floor': store.floor,
+                                 'units': {source: len(records) for source, records in store.records.items()}},
+                           store.version)
+            elif parts == ['changes']:
+                since = int(query['since'][0])
+                result = store.changes_since(since)
+                if result is None:
+                    self._json(410, {'error': 'версия вне журнала, перечитайте /fleet', 'version': store.version})
+                    return
+                version, changed, deleted = result
+                self._json(200, {'since': since, 'version': version, 'changed': changed, 'deleted': deleted},
+                           version)
+            elif len(parts) == 2 and parts[0] in store.records:
+                record = store.get(parts[0], int(parts[1]))
+                if record is None:
+                    self._json(404, {'error': 'юнит не найден'})
+                else:
+                    self._json(200, record, record['version'])
+            elif parts and parts[0] in ('near', 'bbox', 'storage'):
+                self._spatial(parts, query)
+            elif len(parts) == 2 and parts[0] in ('name', 'vin'):
+                version = store.version
+                lookup = store.by_plate if parts[0] == 'name' else store.by_vin_number
+                self._json(200, {'version': version, 'units': lookup(parts[1])}, version)
+            else:
+                self._json(404, {'error': 'неизвестный путь'})
+
+        def _spatial(self, parts, query):
+            if index is None:
+                self._json(404, {'error': 'пространственный индекс выключен'})
+                return
+            if not index.loaded:
+                self._json(503, {'error': 'пространственный индекс ещё не загружен'})
+                return
+            version = store.version
+            if parts == ['near']:
+                radius = float(query['radius'][0])
+                if radius < 0:
+                    raise ValueError(radius)
+                found = index.radius(float(query['lat'][0]), float(query['lon'][0]), radius)
+            elif parts == ['bbox']:
+                found = index.bbox(*(float(query[name][0]) for name in ('min_lat', 'min_lon', 'max_lat', 'max_lon')))
+            elif len(parts) == 2 and parts[0] == 'storage':
+                storage_id = int(parts[1])
+                if storage_id not in index.zones:
+                    self._json(404, {'error': 'зона склада не задана'})
+                    return
+                found = index.in_storage(storage_id, float(query.get('margin', ['0'])[0]))
+            else:
+                self._json(404, {'error': 'неизвестный путь'})
+                return
+            units = []
+            for source, unit_id, *rest in found:
+                record = store.get(source, unit_id)
+                if record is None:
+                    continue
+                # radius / in_storage отдают расстояние, bbox — координаты
+                units.append(dict(record, distance=round(rest[0], 1)) if len(rest) == 1 else record)
+            self._json(200, {'version': version, 'units': units}, version)
+
+        def _json(self, status, payload, version=None):
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), version)
+
+        def _send(self, status, body, version=None):
+            etag = None if version is None else f'"{version}"'
+            if status == 200 and etag is not None and self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+            self.send_response(status)
+            if etag is not None:
+                self.send_header('ETag', etag)
+            if status != 304:
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fleet_api(host=FLEET_API_HOST, port=FLEET_API_PORT, store=fleet_store, is_active=None,
+                    index=spatial_index if CASHING_SPATIAL else None):
+    """Запускает локальный API чтения кеша юнитов в фоновом потоке.
+
+    is_active — проверка роли писателя: на резервной реплике хранилище не обновляется, и API отвечает 503.
+    index — пространственный индекс для /fleet/near, /fleet/bbox и /fleet/storage.
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _handler(store, is_active, index))
+    except OSError as e:
+        logger.error(f"Не удалось запустить API кеша юнитов на {host}:{port}: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fleet-api', daemon=True).start()
+    logger.info(f"API кеша юнитов доступен на http://{host}:{port}/fleet")
+    return server
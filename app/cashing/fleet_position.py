@@ -0,0 +1,192 @@
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import select, text, bindparam
+
+from app.database import SessionLocal
+from app.models import CashCesar, CashAxenta, FleetPosition
+from app.metrics import STAGE_SECONDS, ROWS
+from app.cashing.batch import iter_columns
+from app.cashing.linker import normalize_name
+from app.cashing.upsert import bulk_upsert
+from app.cashing.lease import fence
+
+logger = logging.getLogger(__name__)
+
+# Материализованная таблица fleet_position: самая свежая валидная позиция по госномеру из обоих источников
+CASHING_FLEET_POSITION = os.getenv('CASHING_FLEET_POSITION', '1') == '1'
+
+COLUMNS = ('name', 'source', 'unit_id', 'pos_x', 'pos_y', 'valid_nav', 'pos_time', 'last_time', 'updated_at')
+# Длина fleet_position.name
+NAME_LENGTH = 255
+
+# Столбцы строк источников: id, имя, x, y, время сообщения, время фиксации, valid_nav
+_SOURCE_COLUMNS = {
+    'cesar': ('unit_id', 'object_name', 'pos_x', 'pos_y', 'last_time', 'last_time', None),
+    'axenta': ('id', 'nm', 'pos_x', 'pos_y', 'last_time', 'last_pos_time', 'valid_nav'),
+}
+
+
+def _fix(name, x, y, last_time, pos_time, valid_nav):
+    """Нормализованная точка юнита: (госномер, время фиксации, время сообщения, x, y, valid_nav)."""
+    return normalize_name(name)[:NAME_LENGTH], pos_time or last_time or 0, last_time or 0, x, y, valid_nav
+
+
+def is_valid(fix):
+    """Точка пригодна: координаты заданы и не нулевые, навигация не помечена невалидной (у Cesar её нет)."""
+    _, _, _, x, y, valid_nav = fix
+    return bool(x) and bool(y) and valid_nav != 0
+
+
+class FleetPositions:
+    """Победитель по каждому госномеру среди юнитов Cesar и Axenta с этим госномером.
+
+    Все точки юнитов держатся в памяти (при первом commit читаются из cash_cesar и cash_axenta,
+    дальше обновляются строками, изменившимися в цикле). В fleet_position пишутся только
+    госномера, у которых сменился победитель или его точка; победитель — валидная точка
+    с наибольшим временем фиксации.
+    """
+
+    def __init__(self):
+        # госномер -> {(источник, id): точка}
+        self.candidates = {}
+        # (источник, id) -> госномер
+        self.units = {}
+        # госномер -> строка fleet_position (кортеж COLUMNS без updated_at), как она записана в БД
+        self.winners = {}
+        self.loaded = False
+        self._dirty = set()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def observe(self, source, rows, deleted=()):
+        """Запоминает изменённые и удалённые строки источника; применяются они в commit."""
+        id_column, *columns = _SOURCE_COLUMNS[source]
+        selected = [id_column] + [column or id_column for column in columns]
+        with self._pending_lock:
+            pending = self._pending.setdefault(source, {})
+            for unit_id, name, x, y, last_time, pos_time, valid_nav in iter_columns(rows, selected):
+                pending[unit_id] = _fix(name, x, y, last_time, pos_time, valid_nav if columns[-1] else None)
+            for unit_id in deleted:
+                pending[unit_id] = None
+
+    def rollback(self, source=None):
+        with self._pending_lock:
+            if source is None:
+                self._pending = {}
+            else:
+                self._pending.pop(source, None)
+
+    def _move(self, source, unit_id, fix):
+        key = (source, unit_id)
+        old_name = self.units.pop(key, None)
+        if old_name is not None:
+            bucket = self.candidates.get(old_name)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self.candidates[old_name]
+            self._dirty.add(old_name)
+        if fix is not None and fix[0]:
+            self.candidates.setdefault(fix[0], {})[key] = fix
+            self.units[key] = fix[0]
+            self._dirty.add(fix[0])
+
+    def winner(self, name):
+        """Строка fleet_position для госномера или None, если валидных точек нет."""
+        best = None
+        for (source, unit_id), fix in self.candidates.get(name, {}).items():
+            if not is_valid(fix):
+                continue
+            _, pos_time, last_time, x, y, valid_nav = fix
+            row = (name, source, unit_id, x, y, valid_nav, pos_time, last_time)
+            # При равном времени фиксации победитель выбирается детерминированно
+            if best is None or (pos_time, source, unit_id) > (best[6], best[1], best[2]):
+                best = row
+        return best
+
+    def load(self, session):
+        """Читает точки всех юнитов из кеш-таблиц и записанных победителей из fleet_position."""
+        self.candidates = {}
+        self.units = {}
+        cesar = select(CashCesar.unit_id, CashCesar.object_name, CashCesar.pos_x, CashCesar.pos_y,
+                       CashCesar.last_time)
+        for unit_id, name, x, y, last_time in session.execute(cesar):
+            self._move('cesar', unit_id, _fix(name, x, y, last_time, last_time, None))
+        axenta = select(CashAxenta.id, CashAxenta.nm, CashAxenta.pos_x, CashAxenta.pos_y, CashAxenta.last_time,
+                        CashAxenta.last_pos_time, CashAxenta.valid_nav)
+        for unit_id, name, x, y, last_time, pos_time, valid_nav in session.execute(axenta):
+            self._move('axenta', unit_id, _fix(name, x, y, last_time, pos_time, valid_nav))
+        stored = select(*[FleetPosition.__table__.c[column] for column in COLUMNS[:-1]])
+        self.winners = {row[0]: tuple(row) for row in session.execute(stored)}
+        # Сверяются все госномера: и с точками, и оставшиеся в таблице без них
+        self._dirty = set(self.candidates) | set(self.winners)
+        self.loaded = True
+        logger.info(f"fleet_position: загружено {len(self.units)} юнитов, {len(self.winners)} записанных госномеров.")
+
+    def commit(self):
+        """Применяет строки зафиксированного цикла и пишет изменившихся победителей."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        session = SessionLocal()
+        try:
+            with STAGE_SECONDS.time(stage='fleet_position'):
+                if not self.loaded:
+                    # Кеш-таблицы уже содержат строки этого цикла
+                    self.load(session)
+                else:
+                    for source, fixes in pending.items():
+                        for unit_id, fix in fixes.items():
+                            self._move(source, unit_id, fix)
+                changed, removed = self._changes()
+                now = int(time.time())
+                bulk_upsert(session, 'fleet_position', COLUMNS, 'name',
+                            [dict(zip(COLUMNS, row + (now,))) for row in changed])
+                if removed:
+                    query = text("DELETE FROM fleet_position WHERE name IN :names").bindparams(
+                        bindparam('names', expanding=True))
+                    session.execute(query, {'names': removed})
+                fence(session)
+                session.commit()
+        except Exception as e:
+            session.rollback()
+            # Госномера остаются «грязными» и будут записаны в следующем цикле
+            logger.error(f"Ошибка при обновлении fleet_position: {str(e)}")
+            return
+        finally:
+            session.close()
+
+        for row in changed:
+            self.winners[row[0]] = row
+        for name in removed:
+            self.winners.pop(name, None)
+        self._dirty = set()
+        ROWS.inc(len(changed), source='fleet_position', state='written')
+        ROWS.inc(len(removed), source='fleet_position', state='deleted')
+        if changed or removed:
+            logger.info(f"fleet_position: обновлено {len(changed)}, удалено {len(removed)} госномеров.")
+
+    def _changes(self):
+        changed = []
+        removed = []
+        for name in self._dirty:
+            row = self.winner(name)
+            if row is None:
+                if name in self.winners:
+                    removed.append(name)
+            elif row != self.winners.get(name):
+                changed.append(row)
+        return changed, removed
+
+    def reset(self):
+        """Перечитать всё при следующем commit (например, после смены писателя)."""
+        self.loaded = False
+
+    def position(self, name):
+        """Текущая позиция госномера из памяти (та же строка, что в fleet_position)."""
+        return self.winners.get(normalize_name(name))
+
+
+fleet_positions = FleetPositions()
@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import CashCesar, CashAxenta
+from app.metrics import STAGE_SECONDS, Gauge
+from app.cashing.batch import iter_columns
+from app.cashing.linker import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# Последние записанные строки cash_cesar / cash_axenta в памяти процесса для локального API чтения
+CASHING_FLEET_STORE = os.getenv('CASHING_FLEET_STORE', '1') == '1'
+# Сколько последних версий хранится для запросов изменений; более старые клиенты перечитывают всё
+FLEET_STORE_HISTORY = int(os.getenv('CASHING_FLEET_STORE_HISTORY', '1000'))
+
+# Столбцы, которые пишет демон. cash_cesar.linked и cash_axenta.cmd / sens заполняются
+# связыванием и обогащением прямо в БД, в нормализованных строках их нет — в хранилище тоже.
+STORE_COLUMNS = {
+    'cesar': ('unit_id', 'object_name', 'pin', 'vin', 'last_time', 'pos_x', 'pos_y', 'created_at', 'device_type'),
+    'axenta': ('id', 'uid', 'nm', 'pos_x', 'pos_y', 'gps', 'last_time', 'last_pos_time', 'connected_status',
+               'valid_nav'),
+}
+_MODELS = {'cesar': CashCesar, 'axenta': CashAxenta}
+_NAME_COLUMNS = {'cesar': 'object_name', 'axenta': 'nm'}
+
+STORE_UNITS = Gauge('cashing_fleet_store_units', 'Юниты в хранилище локального API.', ('source',))
+STORE_VERSION = Gauge('cashing_fleet_store_version', 'Текущая версия хранилища локального API.')
+
+
+def normalize_vin(value):
+    return (value or '').strip().upper()
+
+
+class FleetStore:
+    """Последние строки юнитов обоих источников с индексами по id, госномеру и VIN.
+
+    Строки цикла накапливаются в observe и применяются в commit; каждый commit с изменениями
+    получает новую версию, и каждая запись помнит версию, в которой изменилась. Журнал
+    последних FLEET_STORE_HISTORY версий отвечает на «что изменилось после версии N».
+    Записи — неизменяемые словари: читатели получают их без копирования.
+    """
+
+    def __init__(self, history=FLEET_STORE_HISTORY):
+        # источник -> {id: запись}
+        self.records = {source: {} for source in STORE_COLUMNS}
+        # нормализованный госномер / VIN -> {(источник, id)}
+        self.by_name = {}
+        self.by_vin = {}
+        self.version = 0
+        # Версии не больше floor в журнале уже нет
+        self.floor = 0
+        # (версия, [(источник, id)])
+        self.changes = deque(maxlen=history)
+        self.loaded = False
+        self._snapshot = None
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._lock = threading.RLock()
+
+    def observe(self, source, rows, deleted=()):
+        """Запоминает изменённые и удалённые строки источника; применяются они в commit."""
+        columns = STORE_COLUMNS[source]
+        with self._pending_lock:
+            pending = self._pending.setdefault(source, {})
+            for values in iter_columns(rows, columns):
+                pending[values[0]] = values
+            for unit_id in deleted:
+                pending[unit_id] = None
+
+    def rollback(self, source=None):
+        with self._pending_lock:
+            if source is None:
+                self._pending = {}
+            else:
+                self._pending.pop(source, None)
+
+    @staticmethod
+    def _index_add(index, value, key):
+        if value:
+            index.setdefault(value, set()).add(key)
+
+    @staticmethod
+    def _index_remove(index, value, key):
+        bucket = index.get(value)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del index[value]
+
+    def _put(self, source, unit_id, values, version):
+        key = (source, unit_id)
+        old = self.records[source].pop(unit_id, None)
+        if old is not None:
+            self._index_remove(self.by_name, normalize_name(old[_NAME_COLUMNS[source]]), key)
+            self._index_remove(self.by_vin, normalize_vin(old.get('vin')), key)
+        if values is None:
+            return
+        record = dict(zip(STORE_COLUMNS[source], values))
+        record['source'] = source
+        record['version'] = version
+        self.records[source][unit_id] = record
+        self._index_add(self.by_name, normalize_name(record[_NAME_COLUMNS[source]]), key)
+        self._index_add(self.by_vin, normalize_vin(record.get('vin')), key)
+
+    def load(self, session):
+        """Читает все строки из кеш-таблиц; клиенты со старыми версиями перечитают хранилище целиком."""
+        # Версии продолжаются от времени загрузки в мс: после перезапуска они не повторяют прежние
+        version = max(self.version + 1, int(time.time() * 1000))
+        with self._lock:
+            self.records = {source: {} for source in STORE_COLUMNS}
+            self.by_name = {}
+            self.by_vin = {}
+            for source, columns in STORE_COLUMNS.items():
+                table = _MODELS[source].__table__
+                for values in session.execute(select(*[table.c[column] for column in columns])):
+                    self._put(source, values[0], tuple(values), version)
+            self.version = self.floor = version
+            self.changes.clear()
+            self._snapshot = None
+            self.loaded = True
+        logger.info(f"Хранилище API: загружено {len(self.records['cesar'])} юнитов Cesar, "
+                    f"{len(self.records['axenta'])} Axenta (версия {version}).")
+
+    def commit(self):
+        """Применяет строки зафиксированного цикла одной новой версией."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        with STAGE_SECONDS.time(stage='fleet_store'):
+            if not self.loaded:
+                # Кеш-таблицы уже содержат строки этого цикла
+                session = SessionLocal()
+                try:
+                    self.load(session)
+                except Exception as e:
+                    logger.error(f"Ошибка при загрузке хранилища API: {str(e)}")
+                    return
+                finally:
+                    session.close()
+            elif any(pending.values()):
+                with self._lock:
+                    version = self.version + 1
+                    keys = []
+                    for source, rows in pending.items():
+                        for unit_id, values in rows.items():
+                            self._put(source, unit_id, values, version)
+                            keys.append((source, unit_id))
+                    if len(self.changes) == self.changes.maxlen:
+                        self.floor = self.changes[0][0]
+                    self.changes.append((version, keys))
+                    self.version = version
+                    self._snapshot = None
+        for source, records in self.records.items():
+            STORE_UNITS.set(len(records), source=source)
+        STORE_VERSION.set(self.version)
+
+    def reset(self):
+        """Перечитать всё при следующем commit (например, после смены писателя)."""
+        self.loaded = False
+
+    def get(self, source, unit_id):
+        return self.records[source].get(unit_id)
+
+    def _lookup(self, index, value):
+        with self._lock:
+            return [self.records[source][unit_id] for source, unit_id in sorted(index.get(value, ()))]
+
+    def by_plate(self, name):
+        """Записи обоих источников с этим госномером (сравнение как в linker: normalize_name)."""
+        return self._lookup(self.by_name, normalize_name(name))
+
+    def by_vin_number(self, vin):
+        return self._lookup(self.by_vin, normalize_vin(vin))
+
+    def changes_since(self, version):
+        """Изменения после версии: (текущая версия, {источник: [записи]}, {источник: [id]}).
+
+        Возвращает None, если версия старше журнала — тогда нужен полный снимок.
+        """
+        with self._lock:
+            if version < self.floor or version > self.version:
+                return None
+            touched = set()
+            for change_version, keys in reversed(self.changes):
+                if change_version <= version:
+                    break
+                touched.update(keys)
+            changed = {source: [] for source in STORE_COLUMNS}
+            deleted = {source: [] for source in STORE_COLUMNS}
+            for source, unit_id in sorted(touched):
+                record = self.records[source].get(unit_id)
+                if record is None:
+                    deleted[source].append(unit_id)
+                else:
+                    changed[source].append(record)
+            return self.version, changed, deleted
+
+    def snapshot(self):
+        """Полный снимок хранилища в JSON (bytes) и его версия; кешируется до следующей версии."""
+        with self._lock:
+            cached = self._snapshot
+            if cached is not None:
+                return cached
+            version = self.version
+            units = {source: list(records.values()) for source, records in self.records.items()}
+        body = json.dumps({'version': version, 'units': units}, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            if self.version == version:
+                self._snapshot = (version, body)
+        return version, body
+
+
+fleet_store = FleetStore()
@@ -0,0 +1,135 @@
+import logging
+import math
+import os
+import threading
+
+from sqlalchemy import text, bindparam
+
+from app import database
+from app.models import CashHistoryAxenta, CashHistoryCesar
+from app.cashing.batch import iter_columns
+from app.cashing.upsert import insert_rows
+
+logger = logging.getLogger(__name__)
+
+# Откуда пишется история: 'python' — HistoryWriter в транзакции записи, 'sql' — хранимые процедуры MySQL,
+# 'auto' (по умолчанию) — 'sql', если процедуры HISTORY_PROCEDURES есть в БД, иначе 'python'
+HISTORY_BACKEND = os.getenv('CASHING_HISTORY_BACKEND', 'auto').lower()
+HISTORY_PROCEDURES = ('update_cash_history_cesar', 'update_cash_history_axenta')
+# Фильтр GPS-дрожания: точка пишется, если юнит сместился хотя бы на MIN_DISTANCE метров
+# или с прошлой точки истории прошло не меньше MIN_INTERVAL секунд
+HISTORY_MIN_DISTANCE = float(os.getenv('CASHING_HISTORY_MIN_DISTANCE', '15'))
+HISTORY_MIN_INTERVAL = int(os.getenv('CASHING_HISTORY_MIN_INTERVAL', '300'))
+
+EARTH_RADIUS = 6371000.0
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Расстояние в метрах (равнопромежуточная аппроксимация, точна на малых расстояниях)."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS * math.hypot(x, y)
+
+
+_backend = {'value': None}
+_backend_lock = threading.Lock()
+
+
+def history_backend():
+    """Выбранный способ записи истории: 'python' или 'sql'.
+
+    В режиме 'auto' выбор делается при первом вызове по диалекту и наличию хранимых процедур
+    и запоминается; ошибка проверки пробрасывается, и проверка повторится в следующем цикле.
+    """
+    if _backend['value'] is not None:
+        return _backend['value']
+    with _backend_lock:
+        if _backend['value'] is None:
+            _backend['value'] = _detect_backend()
+            logger.info(f"История пишется через {_backend['value']}.")
+    return _backend['value']
+
+
+def _detect_backend():
+    if HISTORY_BACKEND in ('python', 'sql'):
+        return HISTORY_BACKEND
+    engine = database.engine
+    if engine.dialect.name != 'mysql':
+        return 'python'
+    query = text(
+        "SELECT COUNT(*) FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA = DATABASE() "
+        "AND ROUTINE_TYPE = 'PROCEDURE' AND ROUTINE_NAME IN :names"
+    ).bindparams(bindparam('names', expanding=True))
+    with engine.connect() as conn:
+        found = conn.execute(query, {'names': list(HISTORY_PROCEDURES)}).scalar()
+    return 'sql' if found == len(HISTORY_PROCEDURES) else 'python'
+
+
+class HistoryWriter:
+    """Дописывает точки истории только для юнитов, изменившихся в текущем цикле.
+
+    columns — столбцы таблицы истории; в строках кеша они называются так же.
+    """
+
+    def __init__(self, name, table, key, columns, min_distance=None, min_interval=None):
+        self.name = name
+        self.table = table
+        self.key = key
+        self.columns = tuple(columns)
+        self.min_distance = HISTORY_MIN_DISTANCE if min_distance is None else min_distance
+        self.min_interval = HISTORY_MIN_INTERVAL if min_interval is None else min_interval
+        # Последняя записанная точка юнита: key -> (last_time, pos_x, pos_y)
+        self.last_points = {}
+        self._pending = {}
+        self.last_written = 0
+
+    def select(self, rows):
+        """Отбирает строки (список словарей или UnitBatch), которые нужно дописать в историю.
+
+        Возвращает кортежи значений self.columns с учётом фильтра дрожания.
+        """
+        selected = []
+        for values in iter_columns(rows, (self.key, 'last_time', 'pos_x', 'pos_y') + self.columns):
+            key, last_time, pos_x, pos_y = values[:4]
+            last_time = last_time or 0
+            if not last_time or pos_x is None or pos_y is None:
+                continue
+            previous = self._pending.get(key) or self.last_points.get(key)
+            if previous is not None:
+                prev_time, prev_x, prev_y = previous
+                if last_time <= prev_time:
+                    continue
+                moved = distance_m(prev_x, prev_y, pos_x, pos_y) >= self.min_distance
+                if not moved and last_time - prev_time < self.min_interval:
+                    continue
+            self._pending[key] = (last_time, pos_x, pos_y)
+            selected.append(values[4:])
+        return selected
+
+    def append(self, session, rows):
+        """Пакетно вставляет точки истории для изменённых строк в текущей транзакции."""
+        selected = self.select(rows)
+        if selected:
+            insert_rows(session, self.table.__tablename__, self.columns, selected)
+            self.last_written += len(selected)
+        return len(selected)
+
+    def commit(self):
+        if self._pending:
+            self.last_points.update(self._pending)
+        # При записи историей хранимыми процедурами HistoryWriter не участвует в цикле
+        if _backend['value'] == 'python':
+            logger.info(f"{self.name}: в историю добавлено {self.last_written} точек.")
+        self._pending = {}
+        self.last_written = 0
+
+    def rollback(self):
+        self._pending = {}
+        self.last_written = 0
+
+
+cesar_history = HistoryWriter('cash_history_cesar', CashHistoryCesar, 'unit_id',
+                              ('unit_id', 'object_name', 'pos_x', 'pos_y', 'last_time'))
+
+axenta_history = HistoryWriter('cash_history_axenta', CashHistoryAxenta, 'id',
+                               ('uid', 'nm', 'pos_x', 'pos_y', 'last_time', 'valid_nav'))
@@ -0,0 +1,428 @@
+"""Обслуживание таблиц истории: срок хранения, партиции по периодам и прореживание старых треков.
+
+По умолчанию ничего не удаляется: срок хранения и прореживание включаются HISTORY_RETENTION_DAYS
+и HISTORY_FULL_RESOLUTION_DAYS, а фоновый поток в демоне — ими же или HISTORY_MAINTENANCE=1.
+Перед первым проходом в лог пишется, сколько строк он затронет.
+
+Все удаления идут короткими транзакциями по HISTORY_MAINTENANCE_BATCH строк с паузой между ними,
+чтобы не держать блокировки против записи текущего цикла.
+
+Партиции MySQL управляются, только если таблица уже разбита по RANGE (last_time), например:
+
+    ALTER TABLE cash_history_axenta DROP PRIMARY KEY, ADD PRIMARY KEY (id, last_time)
+    PARTITION BY RANGE (last_time) (PARTITION pmax VALUES LESS THAN MAXVALUE);
+
+На SQLite вместо партиций можно включить таблицы по месяцам (HISTORY_SQLITE_PERIOD_TABLES=1):
+строки прошлых месяцев переносятся в <таблица>_pYYYYMM, а устаревшие месяцы удаляются целиком.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text, bindparam, inspect
+
+from app.models import CashHistoryAxenta, CashHistoryCesar, CashHistoryMaintenance
+from app import database
+
+logger = logging.getLogger(__name__)
+
+# Срок хранения истории в сутках; 0 — история не удаляется
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '0'))
+# Треки младше этого возраста хранятся в полном разрешении; 0 — треки не прореживаются
+HISTORY_FULL_RESOLUTION_DAYS = int(os.getenv('HISTORY_FULL_RESOLUTION_DAYS', '0'))
+# Допуск упрощения трека (Рамер — Дуглас — Пекер), метры
+HISTORY_SIMPLIFY_TOLERANCE = float(os.getenv('HISTORY_SIMPLIFY_TOLERANCE', '25'))
+# Сколько суток старых треков прореживается за один запуск
+HISTORY_DOWNSAMPLE_DAYS_PER_RUN = int(os.getenv('HISTORY_DOWNSAMPLE_DAYS_PER_RUN', '3'))
+HISTORY_MAINTENANCE_BATCH = int(os.getenv('HISTORY_MAINTENANCE_BATCH', '5000'))
+HISTORY_MAINTENANCE_PAUSE = float(os.getenv('HISTORY_MAINTENANCE_PAUSE', '0.05'))
+HISTORY_MAINTENANCE_INTERVAL = int(os.getenv('HISTORY_MAINTENANCE_INTERVAL', '3600'))
+HISTORY_SQLITE_PERIOD_TABLES = os.getenv('HISTORY_SQLITE_PERIOD_TABLES', '0') == '1'
+# Фоновое обслуживание в демоне: включается явно или заданием срока хранения / прореживания
+HISTORY_MAINTENANCE = (os.getenv('HISTORY_MAINTENANCE', '0') == '1'
+                       or HISTORY_RETENTION_DAYS > 0 or HISTORY_FULL_RESOLUTION_DAYS > 0)
+
+DAY = 24 * 60 * 60
+EARTH_RADIUS = 6371000.0
+
+# Таблица истории и столбец идентификатора юнита
+HISTORY_TABLES = (
+    (CashHistoryAxenta.__table__, 'uid'),
+    (CashHistoryCesar.__table__, 'unit_id'),
+)
+
+
+def _month_start(ts, shift=0):
+    """Начало месяца (UTC) для метки времени, со сдвигом на shift месяцев."""
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    month = dt.year * 12 + dt.month - 1 + shift
+    return int(datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+def _period_name(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y%m')
+
+
+def _format_day(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def simplify_track(points, tolerance):
+    """Возвращает индексы точек трека, оставшихся после упрощения Рамера — Дугласа — Пекера.
+
+    points — список (lat, lon) в порядке времени; tolerance — в метрах.
+    """
+    count = len(points)
+    if count < 3:
+        return list(range(count))
+
+    lat0 = math.radians(points[0][0])
+    scale = math.cos(lat0)
+    xy = [(math.radians(lon) * scale * EARTH_RADIUS, math.radians(lat) * EARTH_RADIUS) for lat, lon in points]
+
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xy[first]
+        bx, by = xy[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        max_distance = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            if length_sq:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+                ex, ey = ax + t * dx - px, ay + t * dy - py
+            else:
+                ex, ey = px - ax, py - ay
+            distance = ex * ex + ey * ey
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+        if max_distance > tolerance * tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [i for i in range(count) if keep[i]]
+
+
+class HistoryMaintenance:
+    """Один проход обслуживания всех таблиц истории."""
+
+    def __init__(self, bind=None, retention_days=HISTORY_RETENTION_DAYS,
+                 full_resolution_days=HISTORY_FULL_RESOLUTION_DAYS):
+        self.bind = bind
+        self.retention_days = retention_days
+        self.full_resolution_days = full_resolution_days
+        # Таблицы, для которых уже записано в лог, что будет удалено первым проходом
+        self.previewed = set()
+        # До какого момента старые треки уже прорежены; хранится в cash_history_maintenance,
+        # чтобы после перезапуска или смены писателя не проходить сутки заново
+        self.downsampled_until = {}
+
+    @property
+    def engine(self):
+        # Движок берётся при каждом обращении: database.configure() может его заменить
+        return self.bind or database.engine
+
+    @property
+    def dialect(self):
+        return self.engine.dialect.name
+
+    def _pause(self):
+        if HISTORY_MAINTENANCE_PAUSE:
+            time.sleep(HISTORY_MAINTENANCE_PAUSE)
+
+    def ensure_indexes(self):
+        """Создаёт индексы (юнит, last_time) и таблицу состояния обслуживания, если их ещё нет."""
+        CashHistoryMaintenance.__table__.create(self.engine, checkfirst=True)
+        for table, _ in HISTORY_TABLES:
+            if not inspect(self.engine).has_table(table.name):
+                continue
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def used_bytes(self):
+        """Занятое место в БД без свободных страниц; None, если его нельзя измерить точно.
+
+        Считается только для SQLite. В MySQL DATA_LENGTH из information_schema — кешируемая
+        оценка, а InnoDB не уменьшает её после DELETE до OPTIMIZE TABLE, поэтому освобождённое
+        место по ней не определить.
+        """
+        if self.dialect != 'sqlite':
+            return None
+        with self.engine.connect() as conn:
+            page_size = conn.exec_driver_sql('PRAGMA page_size').scalar()
+            page_count = conn.exec_driver_sql('PRAGMA page_count').scalar()
+            freelist = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+            return (page_count - freelist) * page_size
+
+    def load_downsampled_until(self, table_name):
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT downsampled_until FROM cash_history_maintenance WHERE table_name = :name"),
+                {'name': table_name}).scalar()
+
+    def save_downsampled_until(self, table_name, day):
+        params = {'name': table_name, 'day': day, 'now': int(time.time())}
+        with self.engine.begin() as conn:
+            updated = conn.execute(text(
+                "UPDATE cash_history_maintenance SET downsampled_until = :day, updated_at = :now "
+                "WHERE table_name = :name"), params).rowcount
+            if not updated:
+                conn.execute(text(
+                    "INSERT INTO cash_history_maintenance (table_name, downsampled_until, updated_at) "
+                    "VALUES (:name, :day, :now)"), params)
+        self.downsampled_until[table_name] = day
+
+    def delete_ids(self, table_name, ids):
+        query = text(f"DELETE FROM {table_name} WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+        with self.engine.begin() as conn:
+            conn.execute(query, {'ids': ids})
+
+    def delete_older_than(self, table_name, cutoff):
+        """Удаляет строки старше cutoff батчами; строки истории идут по id примерно по времени."""
+        removed = 0
+        select = text(f"SELECT id FROM {table_name} WHERE last_time < :cutoff ORDER BY id LIMIT :limit")
+        while True:
+            with self.engine.connect() as conn:
+                ids = conn.execute(select, {'cutoff': cutoff, 'limit': HISTORY_MAINTENANCE_BATCH}).scalars().all()
+            if not ids:
+                return removed
+            self.delete_ids(table_name, ids)
+            removed += len(ids)
+            self._pause()
+
+    def mysql_partitions(self, table_name):
+        query = text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name AND PARTITION_NAME IS NOT NULL"
+        )
+        with self.engine.connect() as conn:
+            return conn.execute(query, {'name': table_name}).fetchall()
+
+    def manage_mysql_partitions(self, table_name, cutoff, now):
+        """Добавляет партиции на текущий и следующий месяц и удаляет целиком устаревшие (если задан cutoff)."""
+        partitions = self.mysql_partitions(table_name)
+        if not partitions:
+            return 0
+        names = {name for name, _, _ in partitions}
+        removed = 0
+        with self.engine.begin() as conn:
+            if 'pmax' in names:
+                for shift in (0, 1):
+                    start = _month_start(now, shift)
+                    name = f"p{_period_name(start)}"
+                    if name not in names:
+                        conn.exec_driver_sql(
+                            f"ALTER TABLE {table_name} REORGANIZE PARTITION pmax INTO ("
+                            f"PARTITION {name} VALUES LESS THAN ({_month_start(now, shift + 1)}), "
+                            f"PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                        )
+                        names.add(name)
+                        logger.info(f"{table_name}: добавлена партиция {name}.")
+            for name, upper_bound, rows in partitions:
+                if cutoff is None or name == 'pmax' or not str(upper_bound).isdigit() or int(upper_bound) > cutoff:
+                    continue
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} DROP PARTITION {name}")
+                removed += rows or 0
+                logger.info(f"{table_name}: удалена партиция {name} (~{rows} строк).")
+        return removed
+
+    def period_tables(self, table_name):
+        prefix = f"{table_name}_p"
+        return sorted(name for name in inspect(self.engine).get_table_names()
+                      if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+    def archive_sqlite_periods(self, table, unit_column, now):
+        """Переносит строки прошлых месяцев в таблицы <таблица>_pYYYYMM."""
+        current_start = _month_start(now)
+        select = text(f"SELECT id, last_time FROM {table.name} WHERE last_time < :start ORDER BY id LIMIT :limit")
+        moved = 0
+        created = set(self.period_tables(table.name))
+        while True:
+            with self.engine.connect() as conn:
+                rows = conn.execute(select, {'start': current_start, 'limit': HISTORY_MAINTENANCE_BATCH}).fetchall()
+            if not rows:
+                return moved
+            by_period = {}
+            for row_id, last_time in rows:
+                by_period.setdefault(f"{table.name}_p{_period_name(last_time)}", []).append(row_id)
+            with self.engine.begin() as conn:
+                for period_table, ids in by_period.items():
+                    if period_table not in created:
+                        conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {period_table} AS SELECT * FROM {table.name} WHERE 0")
+                        conn.exec_driver_sql(
+                            f"CREATE INDEX IF NOT EXISTS idx_{period_table}_unit_time ON {period_table} ({unit_column}, last_time)"
+                        )
+                        created.add(period_table)
+                    move = text(f"INSERT INTO {period_table} SELECT * FROM {table.name} WHERE id IN :ids")
+                    conn.execute(move.bindparams(bindparam('ids', expanding=True)), {'ids': ids})
+                delete = text(f"DELETE FROM {table.name} WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+                conn.execute(delete, {'ids': [row_id for row_id, _ in rows]})
+            moved += len(rows)
+            self._pause()
+
+    def drop_sqlite_periods(self, table_name, cutoff):
+        """Удаляет таблицы месяцев, целиком вышедших за срок хранения."""
+        removed = 0
+        for period_table in self.period_tables(table_name):
+            period = period_table.rsplit('_p', 1)[1]
+            start = int(datetime(int(period[:4]), int(period[4:]), 1, tzinfo=timezone.utc).timestamp())
+            if _month_start(start, 1) > cutoff:
+                continue
+            with self.engine.begin() as conn:
+                removed += conn.exec_driver_sql(f"SELECT COUNT(*) FROM {period_table}").scalar()
+                conn.exec_driver_sql(f"DROP TABLE {period_table}")
+            logger.info(f"{table_name}: удалена таблица периода {period_table}.")
+        return removed
+
+    def first_day(self, table_name, unit_column):
+        """Начало суток самой старой точки с известным юнитом; None, если таких точек нет."""
+        with self.engine.connect() as conn:
+            first = conn.execute(text(
+                f"SELECT MIN(last_time) FROM {table_name} WHERE {unit_column} <> 0")).scalar()
+        return None if first is None else first // DAY * DAY
+
+    def downsample(self, table_name, unit_column, horizon, cutoff):
+        """Прореживает треки до horizon (начала суток) по суткам и юнитам.
+
+        Строки с нулевым идентификатором юнита пропускаются: в cash_history_axenta uid = 0 у всех
+        юнитов с нечисловым uniqueId, и их точки не образуют один трек.
+        """
+        if table_name not in self.downsampled_until:
+            self.downsampled_until[table_name] = self.load_downsampled_until(table_name) or 0
+        day = self.downsampled_until[table_name] or self.first_day(table_name, unit_column)
+        if day is None:
+            return 0
+        if cutoff is not None:
+            # Сутки за сроком хранения удаляются целиком, прореживать их незачем
+            day = max(day, cutoff // DAY * DAY)
+        removed = 0
+        units_query = text(
+            f"SELECT DISTINCT {unit_column} FROM {table_name} "
+            f"WHERE {unit_column} <> 0 AND last_time >= :start AND last_time < :end"
+        )
+        points_query = text(
+            f"SELECT id, pos_x, pos_y FROM {table_name} "
+            f"WHERE {unit_column} = :unit AND last_time >= :start AND last_time < :end ORDER BY last_time, id"
+        )
+        for _ in range(HISTORY_DOWNSAMPLE_DAYS_PER_RUN):
+            if day >= horizon:
+                break
+            bounds = {'start': day, 'end': day + DAY}
+            with self.engine.connect() as conn:
+                units = conn.execute(units_query, bounds).scalars().all()
+            to_delete = []
+            for unit in units:
+                with self.engine.connect() as conn:
+                    points = conn.execute(points_query, dict(bounds, unit=unit)).fetchall()
+                points = [point for point in points if point.pos_x is not None and point.pos_y is not None]
+                kept = set(simplify_track([(point.pos_x, point.pos_y) for point in points], HISTORY_SIMPLIFY_TOLERANCE))
+                to_delete.extend(point.id for i, point in enumerate(points) if i not in kept)
+                while len(to_delete) >= HISTORY_MAINTENANCE_BATCH:
+                    self.delete_ids(table_name, to_delete[:HISTORY_MAINTENANCE_BATCH])
+                    removed += HISTORY_MAINTENANCE_BATCH
+                    to_delete = to_delete[HISTORY_MAINTENANCE_BATCH:]
+                    self._pause()
+            if to_delete:
+                self.delete_ids(table_name, to_delete)
+                removed += len(to_delete)
+            day += DAY
+            self.save_downsampled_until(table_name, day)
+        return removed
+
+    def preview(self, table_name, names, unit_column, cutoff, horizon):
+        """Пишет в лог, сколько строк затронет первый проход, до того как что-либо удалено."""
+        if table_name in self.previewed:
+            return
+        self.previewed.add(table_name)
+        parts = []
+        with self.engine.connect() as conn:
+            if cutoff is not None:
+                expired = sum(conn.execute(text(f"SELECT COUNT(*) FROM {name} WHERE last_time < :cutoff"),
+                                           {'cutoff': cutoff}).scalar() for name in names)
+                parts.append(f"удалит до {expired} строк старше {_format_day(cutoff)} (срок хранения "
+                             f"{self.retention_days} сут.)")
+            if horizon is not None:
+                pending = 0
+                for name in names:
+                    lower = max(cutoff or 0, self.load_downsampled_until(name) or 0)
+                    pending += conn.execute(text(
+                        f"SELECT COUNT(*) FROM {name} "
+                        f"WHERE {unit_column} <> 0 AND last_time >= :lower AND last_time < :horizon"),
+                        {'lower': lower, 'horizon': horizon}).scalar()
+                parts.append(f"проредит треки старше {_format_day(horizon)} ({pending} строк ещё не прорежено, "
+                             f"не больше {HISTORY_DOWNSAMPLE_DAYS_PER_RUN} сут. за проход)")
+        if parts:
+            logger.warning(f"Обслуживание {table_name}: " + '; '.join(parts) + '.')
+
+    def run(self):
+        """Выполняет один проход обслуживания и возвращает отчёт по таблицам."""
+        now = int(time.time())
+        cutoff = now - self.retention_days * DAY if self.retention_days > 0 else None
+        horizon = (now - self.full_resolution_days * DAY) // DAY * DAY if self.full_resolution_days > 0 else None
+        report = {}
+        self.ensure_indexes()
+        inspector = inspect(self.engine)
+        for table, unit_column in HISTORY_TABLES:
+            if not inspector.has_table(table.name):
+                continue
+            started = time.monotonic()
+            names = [table.name] + (self.period_tables(table.name) if self.dialect == 'sqlite' else [])
+            self.preview(table.name, names, unit_column, cutoff, horizon)
+            bytes_before = self.used_bytes()
+            stats = {'expired': 0, 'downsampled': 0, 'archived': 0}
+
+            if self.dialect == 'mysql':
+                stats['expired'] += self.manage_mysql_partitions(table.name, cutoff, now)
+            if cutoff is not None:
+                if self.dialect == 'sqlite' and HISTORY_SQLITE_PERIOD_TABLES:
+                    stats['expired'] += self.drop_sqlite_periods(table.name, cutoff)
+                stats['expired'] += self.delete_older_than(table.name, cutoff)
+
+            if horizon is not None:
+                for physical in [table.name] + (self.period_tables(table.name) if self.dialect == 'sqlite' else []):
+                    stats['downsampled'] += self.downsample(physical, unit_column, horizon, cutoff)
+
+            if self.dialect == 'sqlite' and HISTORY_SQLITE_PERIOD_TABLES:
+                stats['archived'] = self.archive_sqlite_periods(table, unit_column, now)
+
+            reclaimed = ''
+            if bytes_before is not None:
+                stats['bytes_reclaimed'] = max(bytes_before - self.used_bytes(), 0)
+                reclaimed = f", освобождено {stats['bytes_reclaimed']} байт"
+            stats['seconds'] = round(time.monotonic() - started, 3)
+            report[table.name] = stats
+            logger.info(
+                f"Обслуживание {table.name}: удалено по сроку {stats['expired']}, прорежено {stats['downsampled']}, "
+                f"перенесено в периоды {stats['archived']}{reclaimed} за {stats['seconds']} с."
+            )
+        return report
+
+
+class MaintenanceThread(threading.Thread):
+    """Фоновый поток, запускающий обслуживание истории раз в HISTORY_MAINTENANCE_INTERVAL секунд."""
+
+    def __init__(self, interval=HISTORY_MAINTENANCE_INTERVAL, is_active=None):
+        super().__init__(name='history-maintenance', daemon=True)
+        self.interval = interval
+        # Обслуживание выполняет только писатель (при нескольких репликах)
+        self.is_active = is_active
+        self.maintenance = HistoryMaintenance()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            if self.is_active is not None and not self.is_active():
+                continue
+            try:
+                self.maintenance.run()
+            except Exception as e:
+                logger.error(f"Ошибка при обслуживании истории: {str(e)}")
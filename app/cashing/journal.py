@@ -0,0 +1,181 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from app.metrics import STAGE_SECONDS
+from app.json_stream import ClosingStream
+
+logger = logging.getLogger(__name__)
+
+# Журнал сырых ответов API для воспроизведения циклов (пусто — журнал выключен)
+JOURNAL_DIR = os.getenv('CASHING_JOURNAL_DIR', '')
+# Размер файла журнала, после которого начинается новый файл
+JOURNAL_MAX_BYTES = int(os.getenv('CASHING_JOURNAL_MAX_BYTES', str(256 * 1024 * 1024)))
+# Сколько последних файлов журнала хранить
+JOURNAL_KEEP_FILES = int(os.getenv('CASHING_JOURNAL_KEEP_FILES', '24'))
+# Сколько ответов может ждать записи; при переполнении новые ответы не журналируются
+JOURNAL_QUEUE_SIZE = int(os.getenv('CASHING_JOURNAL_QUEUE_SIZE', '8'))
+
+FILE_PATTERN = 'journal-*.jsonl.gz'
+# Потоковый ответ, ещё не прочитанный целиком: несжатая строка записи во временном файле
+PART_SUFFIX = '.jsonl.part'
+
+
+class PayloadJournal:
+    """Журнал ответов Cesar и Axenta: gzip JSONL с ротацией по размеру.
+
+    Каждая строка — один ответ источника: {"cycle", "source", "fetched_at", "items"}, где cycle —
+    время начала цикла получения данных. Каждая запись дописывается отдельным gzip-членом,
+    поэтому файл остаётся читаемым после аварийной остановки. Сжатие и запись в файл журнала
+    идут в фоновом потоке и не задерживают цикл.
+    """
+
+    def __init__(self, directory=JOURNAL_DIR, max_bytes=JOURNAL_MAX_BYTES, keep_files=JOURNAL_KEEP_FILES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.path = None
+        self._queue = queue.Queue(maxsize=JOURNAL_QUEUE_SIZE)
+        self._writer = None
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _start(self):
+        if self._writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._writer = threading.Thread(target=self._write_loop, name='cashing-journal', daemon=True)
+            self._writer.start()
+
+    def _enqueue(self, source, entry):
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            logger.warning(f"Журнал не успевает: ответ {source} не записан.")
+            return False
+
+    def record(self, cycle, source, items, fetched_at=None):
+        """Ставит ответ источника в очередь на запись."""
+        if not self.enabled:
+            return
+        self._start()
+        self._enqueue(source, {'cycle': cycle, 'source': source, 'fetched_at': fetched_at or time.time(),
+                               'items': items})
+
+    def wrap(self, cycle, source, items, fetched_at=None):
+        """Пропускает потоковый ответ через журнал: он записывается, только если прочитан целиком.
+
+        Объекты по мере чтения дописываются во временный файл рядом с журналом, а не копятся
+        в памяти; прочитанный целиком ответ фоновый поток сжимает и дописывает в файл журнала.
+        """
+        return ClosingStream(self._wrap(cycle, source, items, fetched_at), items)
+
+    def _wrap(self, cycle, source, items, fetched_at):
+        self._start()
+        head = {'cycle': cycle, 'source': source, 'fetched_at': fetched_at or time.time()}
+        fd, path = tempfile.mkstemp(suffix=PART_SUFFIX, dir=self.directory)
+        complete = False
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(head, ensure_ascii=False, separators=(',', ':'))[:-1] + ',"items":[')
+                separator = ''
+                for item in items:
+                    f.write(separator)
+                    f.write(json.dumps(item, ensure_ascii=False, separators=(',', ':')))
+                    separator = ','
+                    yield item
+                f.write(']}\n')
+            complete = self._enqueue(source, {'part': path})
+        finally:
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+            if not complete:
+                os.remove(path)
+
+    def _write_loop(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                with STAGE_SECONDS.time(stage='journal_write'):
+                    self._write(entry)
+            except Exception as e:
+                logger.error(f"Ошибка при записи журнала: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, entry):
+        if self.path is None or not os.path.exists(self.path) or os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        part = entry.get('part')
+        if part is not None:
+            try:
+                with open(part, 'rb') as src, gzip.open(self.path, 'ab', compresslevel=6) as f:
+                    shutil.copyfileobj(src, f, 1024 * 1024)
+            finally:
+                os.remove(part)
+            return
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with gzip.open(self.path, 'ab', compresslevel=6) as f:
+            f.write(line)
+
+    def _rotate(self):
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.gmtime())
+        self.path = os.path.join(self.directory, f'journal-{stamp}-{os.getpid()}.jsonl.gz')
+        files = journal_files(self.directory)
+        for path in files[:max(len(files) - self.keep_files + 1, 0)]:
+            os.remove(path)
+            logger.info(f"Удалён старый файл журнала {path}.")
+
+    def flush(self, timeout=30):
+        """Ждёт, пока все ответы из очереди будут записаны (для тестовых прогонов и остановки)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+def journal_files(path):
+    """Файлы журнала по возрастанию времени; path — каталог, файл или glob-шаблон."""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, FILE_PATTERN)))
+    return sorted(glob.glob(path))
+
+
+def read_journal(paths):
+    """Читает записи журнала из файлов по порядку."""
+    for path in paths:
+        with gzip.open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def iter_cycles(paths, sources=('cesar', 'axenta')):
+    """Группирует записи журнала по циклам: (cycle, {источник: запись}).
+
+    Потоковый ответ Axenta журналируется после записи в БД, поэтому записи соседних циклов
+    могут перемежаться. Цикл отдаётся, как только собраны все источники; неполные циклы
+    отдаются, когда за ними уже завершился более поздний цикл, или в конце журнала.
+    """
+    pending = {}
+    for entry in read_journal(paths):
+        pending.setdefault(entry['cycle'], {})[entry['source']] = entry
+        complete = [cycle for cycle, entries in pending.items() if all(s in entries for s in sources)]
+        if complete:
+            newest = max(complete)
+            for cycle in sorted(cycle for cycle in pending if cycle <= newest):
+                yield cycle, pending.pop(cycle)
+    for cycle in sorted(pending):
+        yield cycle, pending.pop(cycle)
+
+
+payload_journal = PayloadJournal()
@@ -0,0 +1,193 @@
+import logging
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import inspect, select, func, text
+
+from app import database
+from app.database import SessionLocal
+from app.metrics import Gauge, Counter
+from app.system_status_manager import SystemStatus
+
+logger = logging.getLogger(__name__)
+
+# Несколько реплик run.py: писать в БД может только держатель аренды в строке system_status
+CASHING_LEASE = os.getenv('CASHING_LEASE', '0') == '1'
+# Срок аренды (секунды): писатель продлевает её каждый цикл, резерв забирает просроченную
+CASHING_LEASE_TTL = float(os.getenv('CASHING_LEASE_TTL', '30'))
+# Как часто резервная реплика проверяет аренду
+CASHING_LEASE_POLL = float(os.getenv('CASHING_LEASE_POLL', '2'))
+# Идентификатор реплики (по умолчанию хост, pid и случайный суффикс)
+CASHING_REPLICA_ID = os.getenv('CASHING_REPLICA_ID') or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# Столбцы аренды в system_status; добавляются при первом запуске, модель SystemStatus их не знает
+LEASE_COLUMNS = (
+    ('writer_id', 'VARCHAR(128)'),
+    ('writer_lease_until', 'BIGINT'),  # UNIX-время в миллисекундах
+    ('writer_epoch', 'INTEGER'),
+)
+
+LEASE_HELD = Gauge('cashing_writer_lease_held', 'Реплика держит роль писателя (1) или находится в резерве (0).')
+LEASE_EVENTS = Counter('cashing_writer_lease_events_total', 'Получение и потеря роли писателя.', ('event',))
+
+# Эпоха увеличивается при смене держателя. В MySQL присваивания SET выполняются слева направо,
+# поэтому writer_epoch вычисляется до перезаписи writer_id.
+_ACQUIRE_SQL = text(
+    "UPDATE system_status SET "
+    "writer_epoch = CASE WHEN writer_id = :owner THEN COALESCE(writer_epoch, 0) ELSE COALESCE(writer_epoch, 0) + 1 END, "
+    "writer_lease_until = :until, "
+    "writer_id = :owner "
+    "WHERE id = :id AND (writer_id IS NULL OR writer_id = :owner "
+    "OR writer_lease_until IS NULL OR writer_lease_until < :now)"
+)
+# Ограждение записи: строка совпадает, только пока аренда у этой реплики в той же эпохе.
+# UPDATE блокирует строку system_status до конца транзакции, поэтому резерв не заберёт аренду
+# между проверкой и commit.
+_FENCE_SQL = text(
+    "UPDATE system_status SET writer_epoch = writer_epoch "
+    "WHERE id = :id AND writer_id = :owner AND writer_epoch = :epoch"
+)
+_RELEASE_SQL = text(
+    "UPDATE system_status SET writer_id = NULL, writer_lease_until = NULL WHERE id = :id AND writer_id = :owner"
+)
+
+
+class LeaseLost(RuntimeError):
+    """Реплика перестала быть писателем до фиксации транзакции."""
+
+
+def _millis(seconds):
+    return int(seconds * 1000)
+
+
+class WriterLease:
+    """Аренда роли писателя на строке system_status.
+
+    Аренда захватывается условным UPDATE: строку получает реплика, если аренда свободна,
+    уже её или просрочена. Держатель продлевает аренду каждый цикл; если он упал,
+    резерв забирает аренду не позже чем через ttl + poll_interval секунд.
+    Срок сравнивается по часам реплик, поэтому они должны быть синхронизированы (NTP)
+    с точностью много меньше ttl.
+    """
+
+    def __init__(self, owner=CASHING_REPLICA_ID, ttl=CASHING_LEASE_TTL, poll_interval=CASHING_LEASE_POLL):
+        self.owner = owner
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.epoch = None
+        self.valid_until = 0.0
+        self._row_id = None
+        LEASE_HELD.set(0)
+
+    def ensure_schema(self):
+        """Создаёт system_status и добавляет столбцы аренды, если их ещё нет."""
+        engine = database.engine
+        # Реплики стартуют одновременно: ошибка DDL не страшна, если таблицу или столбец создала другая
+        try:
+            SystemStatus.__table__.create(engine, checkfirst=True)
+        except Exception:
+            if not inspect(engine).has_table('system_status'):
+                raise
+        existing = {column['name'] for column in inspect(engine).get_columns('system_status')}
+        for name, ddl in LEASE_COLUMNS:
+            if name in existing:
+                continue
+            try:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(f"ALTER TABLE system_status ADD COLUMN {name} {ddl}")
+                logger.info(f"В system_status добавлен столбец {name}.")
+            except Exception:
+                if name not in {column['name'] for column in inspect(engine).get_columns('system_status')}:
+                    raise
+
+    def _row(self, session):
+        # Все реплики используют строку с минимальным id, даже если две из них создали её одновременно
+        row_id = session.execute(select(func.min(SystemStatus.id))).scalar()
+        if row_id is None:
+            session.add(SystemStatus())
+            session.commit()
+            row_id = session.execute(select(func.min(SystemStatus.id))).scalar()
+        return row_id
+
+    def held(self):
+        """Держит ли реплика аренду (по локальным монотонным часам, без запроса к БД)."""
+        return self.epoch is not None and time.monotonic() < self.valid_until
+
+    def acquire(self):
+        """Захватывает или продлевает аренду; возвращает True, если реплика — писатель."""
+        started = time.monotonic()
+        now = time.time()
+        session = SessionLocal()
+        try:
+            if self._row_id is None:
+                self._row_id = self._row(session)
+            params = {'id': self._row_id, 'owner': self.owner, 'now': _millis(now), 'until': _millis(now + self.ttl)}
+            acquired = session.execute(_ACQUIRE_SQL, params).rowcount == 1
+            epoch = None
+            if acquired:
+                epoch = session.execute(
+                    text("SELECT writer_epoch FROM system_status WHERE id = :id"), {'id': self._row_id}).scalar()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка при продлении аренды писателя: {str(e)}")
+            # Аренда в БД остаётся за нами до истечения, локально тоже
+            return self.held()
+        finally:
+            session.close()
+
+        if acquired:
+            if epoch != self.epoch:
+                LEASE_EVENTS.inc(event='acquired')
+                logger.warning(f"Реплика {self.owner} получила роль писателя (эпоха {epoch}).")
+            self.epoch = epoch
+            self.valid_until = started + self.ttl
+        elif self.epoch is not None:
+            LEASE_EVENTS.inc(event='lost')
+            logger.warning(f"Реплика {self.owner} потеряла роль писателя, переход в резерв.")
+            self.epoch = None
+        LEASE_HELD.set(1 if acquired else 0)
+        return acquired
+
+    def fence(self, session):
+        """Проверяет в транзакции session, что реплика всё ещё писатель той же эпохи.
+
+        Вызывается непосредственно перед session.commit(); при несовпадении поднимает LeaseLost,
+        и транзакцию нужно откатить. Писатель, приостановленный посреди записи дольше ttl,
+        так не зафиксирует её поверх записей нового писателя.
+        """
+        epoch = self.epoch
+        if epoch is None or self._row_id is None:
+            raise LeaseLost(f"Реплика {self.owner} не держит роль писателя")
+        params = {'id': self._row_id, 'owner': self.owner, 'epoch': epoch}
+        if session.execute(_FENCE_SQL, params).rowcount != 1:
+            LEASE_EVENTS.inc(event='fenced')
+            raise LeaseLost(f"Роль писателя эпохи {epoch} перешла к другой реплике, транзакция не фиксируется")
+
+    def release(self):
+        """Освобождает аренду при штатной остановке, чтобы резерв не ждал её истечения."""
+        if self.epoch is None or self._row_id is None:
+            return
+        session = SessionLocal()
+        try:
+            session.execute(_RELEASE_SQL, {'id': self._row_id, 'owner': self.owner})
+            session.commit()
+            logger.info(f"Реплика {self.owner} освободила роль писателя.")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка при освобождении аренды писателя: {str(e)}")
+        finally:
+            session.close()
+        self.epoch = None
+        LEASE_HELD.set(0)
+
+
+writer_lease = WriterLease()
+
+
+def fence(session):
+    """Ограждение записи демона: при CASHING_LEASE проверяет аренду writer_lease в транзакции session."""
+    if CASHING_LEASE:
+        writer_lease.fence(session)
@@ -0,0 +1,193 @@
+import logging
+import os
+import time
+
+from sqlalchemy import select, text
+
+from app.database import SessionLocal
+from app.models import CashCesar, Transport
+from app.metrics import STAGE_SECONDS, ROWS
+from app.cashing.batch import iter_columns
+from app.cashing.lease import fence
+
+logger = logging.getLogger(__name__)
+
+# Связывание телеметрии с transport: cash_cesar.linked и transport.x / y
+CASHING_LINK = os.getenv('CASHING_LINK', '1') == '1'
+# Как часто индекс transport перечитывается целиком (между полными чтениями подгружаются только новые id)
+LINK_INDEX_REFRESH = int(os.getenv('CASHING_LINK_INDEX_REFRESH', '600'))
+# Размер пакета UPDATE
+LINK_BATCH_SIZE = int(os.getenv('CASHING_LINK_BATCH_SIZE', '1000'))
+
+
+def normalize_name(value):
+    """Приводит госномер к виду cash_axenta.nm: часть до '|', без пробелов по краям, в верхнем регистре."""
+    if not value:
+        return ''
+    return str(value).split('|')[0].strip().upper()
+
+
+class TransportLinker:
+    """Хеш-соединение свежих строк Cesar и Axenta с transport.uNumber в памяти.
+
+    Индекс transport (госномер -> id) и известные значения linked / x / y держатся в памяти,
+    поэтому после каждого цикла в БД уходят только строки, у которых значение изменилось.
+    """
+
+    def __init__(self, refresh=LINK_INDEX_REFRESH, batch_size=LINK_BATCH_SIZE):
+        self.refresh = refresh
+        self.batch_size = batch_size
+        # госномер -> {id transport}
+        self.index = {}
+        # id transport -> (госномер, x, y)
+        self.transports = {}
+        self.max_transport_id = 0
+        self.loaded_at = None
+        # unit_id Cesar -> (госномер, linked)
+        self.cesar = {}
+        # госномер -> (время фиксации, x, y): самая свежая точка из обоих источников
+        self.fixes = {}
+        # unit_id / id -> (госномер, время фиксации, x, y) строк текущего цикла
+        self._cesar_batch = {}
+        self._axenta_batch = {}
+        self._cesar_deleted = set()
+
+    def observe_cesar(self, rows, deleted=()):
+        columns = ('unit_id', 'object_name', 'last_time', 'pos_x', 'pos_y')
+        for unit_id, name, last_time, x, y in iter_columns(rows, columns):
+            self._cesar_batch[unit_id] = (normalize_name(name), last_time or 0, x, y)
+        self._cesar_deleted.update(deleted)
+
+    def observe_axenta(self, rows):
+        columns = ('id', 'nm', 'last_pos_time', 'last_time', 'pos_x', 'pos_y')
+        for unit_id, name, last_pos_time, last_time, x, y in iter_columns(rows, columns):
+            self._axenta_batch[unit_id] = (name, last_pos_time or last_time or 0, x, y)
+
+    def rollback(self, source=None):
+        """Отбрасывает строки неудавшегося цикла (или только одного источника)."""
+        if source in (None, 'cesar'):
+            self._cesar_batch = {}
+            self._cesar_deleted = set()
+        if source in (None, 'axenta'):
+            self._axenta_batch = {}
+
+    def commit(self):
+        """Связывает строки зафиксированного цикла; ошибка не откатывает уже записанный цикл."""
+        session = SessionLocal()
+        try:
+            with STAGE_SECONDS.time(stage='link'):
+                self.link(session)
+                fence(session)
+                session.commit()
+            self.rollback()
+        except Exception as e:
+            session.rollback()
+            # Пакеты остаются и будут связаны в следующем цикле, индекс перечитается целиком
+            self.loaded_at = None
+            logger.error(f"Ошибка при связывании с transport: {str(e)}")
+        finally:
+            session.close()
+
+    def _add_transport(self, transport_id, number, x, y):
+        old = self.transports.get(transport_id)
+        if old is not None:
+            self.index.get(old[0], set()).discard(transport_id)
+        self.transports[transport_id] = (number, x, y)
+        if number:
+            self.index.setdefault(number, set()).add(transport_id)
+        self.max_transport_id = max(self.max_transport_id, transport_id)
+
+    def refresh_index(self, session):
+        """Подгружает новые строки transport; раз в refresh секунд перечитывает индекс целиком.
+
+        Возвращает True, если индекс мог измениться и соединение нужно пересчитать полностью.
+        """
+        full = self.loaded_at is None or time.monotonic() - self.loaded_at >= self.refresh
+        query = select(Transport.id, Transport.uNumber, Transport.x, Transport.y)
+        if full:
+            self.index = {}
+            self.transports = {}
+            self.max_transport_id = 0
+        else:
+            query = query.where(Transport.id > self.max_transport_id)
+        result = session.execute(query)
+        added = 0
+        for transport_id, number, x, y in result:
+            self._add_transport(transport_id, normalize_name(number), x, y)
+            added += 1
+        if full:
+            # Фактические значения linked берём из БД, чтобы не переписывать совпадающие
+            self.cesar = {
+                unit_id: (normalize_name(name), bool(linked))
+                for unit_id, name, linked in session.execute(
+                    select(CashCesar.unit_id, CashCesar.object_name, CashCesar.linked))
+            }
+            self.loaded_at = time.monotonic()
+            logger.info(f"Индекс transport перечитан: {len(self.transports)} записей.")
+        return full or added > 0
+
+    def _collect_fixes(self):
+        fixes = {}
+        for batch in (self._cesar_batch, self._axenta_batch):
+            for number, fix_time, x, y in batch.values():
+                if x and y and fix_time > fixes.get(number, (-1,))[0]:
+                    fixes[number] = (fix_time, x, y)
+        return fixes
+
+    def link(self, session):
+        """Пересчитывает linked и координаты transport и пишет только изменившиеся значения."""
+        rejoin = self.refresh_index(session)
+
+        cesar = dict(self.cesar)
+        for unit_id in self._cesar_deleted:
+            cesar.pop(unit_id, None)
+        for unit_id, (number, _, _, _) in self._cesar_batch.items():
+            previous = cesar.get(unit_id)
+            # Новые строки вставлены с linked = False (значение по умолчанию)
+            cesar[unit_id] = (number, previous[1] if previous else False)
+
+        # При изменении индекса пересчитываются все юниты, иначе только пришедшие в цикле
+        units = cesar.keys() if rejoin else self._cesar_batch.keys()
+        linked_updates = []
+        for unit_id in units:
+            number, linked = cesar[unit_id]
+            is_linked = number in self.index
+            if linked != is_linked:
+                linked_updates.append({'unit_id': unit_id, 'linked': is_linked})
+                cesar[unit_id] = (number, is_linked)
+
+        fresh = self._collect_fixes()
+        fixes = dict(self.fixes)
+        for number, fix in fresh.items():
+            if fix[0] >= fixes.get(number, (-1,))[0]:
+                fixes[number] = fix
+        numbers = fixes.keys() if rejoin else fresh.keys()
+        coords_updates = []
+        transports = dict(self.transports)
+        for number in numbers:
+            fix = fixes.get(number)
+            for transport_id in self.index.get(number, ()):
+                _, x, y = transports[transport_id]
+                if fix is not None and (x, y) != (fix[1], fix[2]):
+                    coords_updates.append({'id': transport_id, 'x': fix[1], 'y': fix[2]})
+                    transports[transport_id] = (number, fix[1], fix[2])
+
+        self._execute(session, 'UPDATE cash_cesar SET linked = :linked WHERE unit_id = :unit_id', linked_updates)
+        self._execute(session, 'UPDATE transport SET x = :x, y = :y WHERE id = :id', coords_updates)
+
+        # Состояние меняется только после успешного выполнения запросов
+        self.cesar = cesar
+        self.fixes = fixes
+        self.transports = transports
+        ROWS.inc(len(linked_updates), source='cesar', state='linked')
+        ROWS.inc(len(coords_updates), source='transport', state='moved')
+        logger.info(f"Связывание: linked изменён у {len(linked_updates)} юнитов, "
+                    f"координаты обновлены у {len(coords_updates)} единиц транспорта.")
+
+    def _execute(self, session, sql, rows):
+        statement = text(sql)
+        for start in range(0, len(rows), self.batch_size):
+            session.execute(statement, rows[start:start + self.batch_size])
+
+
+transport_linker = TransportLinker()
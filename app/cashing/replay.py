@@ -0,0 +1,75 @@
+import logging
+import statistics
+import time
+
+from app import database
+from app.models import Base
+from app.cashing import db_operations, snapshot_store
+from app.cashing.journal import journal_files, iter_cycles
+
+logger = logging.getLogger(__name__)
+
+REPLAY_DATABASE_URL = 'sqlite:///replay.db'
+
+
+def _isolate(db_url):
+    """Отключает всё, что при воспроизведении ушло бы в сеть или в файлы рабочего демона."""
+    database.configure(db_url)
+    Base.metadata.create_all(database.engine)
+    snapshot_store.SNAPSHOT_FILE = ''
+    db_operations.AXENTA_ENRICH = False
+
+
+def replay(path, db_url=REPLAY_DATABASE_URL, speed=0.0, limit=None):
+    """Прогоняет записанные циклы через cash_db на отдельной БД.
+
+    path — каталог журнала, файл или glob-шаблон; speed = 0 — максимально быстро,
+    1 — с записанными интервалами между циклами, 2 — вдвое быстрее записанного и т. д.
+    Возвращает отчёт со временем циклов.
+    """
+    files = journal_files(path)
+    if not files:
+        logger.error(f"Файлы журнала не найдены: {path}")
+        return None
+
+    _isolate(db_url)
+    db_operations.init_db()
+    logger.info(f"Воспроизведение {len(files)} файлов журнала в {db_url}.")
+
+    durations = []
+    failures = 0
+    started = time.monotonic()
+    first_cycle = None
+    for cycle, entries in iter_cycles(files):
+        if limit is not None and len(durations) >= limit:
+            break
+        if first_cycle is None:
+            first_cycle = cycle
+        if speed > 0:
+            delay = started + (cycle - first_cycle) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        cesar_items = entries.get('cesar', {}).get('items', [])
+        axenta_items = entries.get('axenta', {}).get('items', [])
+        cycle_started = time.perf_counter()
+        try:
+            db_operations.cash_db(cesar_items, axenta_items)
+        except Exception as e:
+            failures += 1
+            logger.error(f"Цикл {cycle} завершился ошибкой: {str(e)}")
+        durations.append(time.perf_counter() - cycle_started)
+
+    report = {
+        'cycles': len(durations),
+        'failures': failures,
+        'seconds': time.monotonic() - started,
+    }
+    if durations:
+        ordered = sorted(durations)
+        report.update({
+            'cycle_mean': statistics.mean(durations),
+            'cycle_p95': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+            'cycle_max': ordered[-1],
+        })
+    return report
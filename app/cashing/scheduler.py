@@ -0,0 +1,171 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from app.cashing.data_fetcher import fetch_data
+from app.cashing.db_operations import cash_db, check_status, init_db, take_over
+from app.cashing.enrichment import AXENTA_ENRICH, axenta_enricher
+from app.cashing.lease import CASHING_LEASE, writer_lease
+
+logger = logging.getLogger(__name__)
+
+# Период запуска циклов (фиксированная частота, а не пауза после цикла)
+CYCLE_PERIOD = float(os.getenv('CASHING_CYCLE_PERIOD', '10'))
+# Снимок старше этого возраста не пишется в БД, а отбрасывается
+SNAPSHOT_MAX_AGE = float(os.getenv('CASHING_SNAPSHOT_MAX_AGE', str(CYCLE_PERIOD * 3)))
+# Пауза, пока модуль отключен в system_settings
+DISABLED_SLEEP = 100
+# Пауза после ошибки стадии
+ERROR_SLEEP = 60
+
+_STOP = object()
+
+
+def _discard(snapshot):
+    """Закрывает потоковые ответы отброшенного снимка."""
+    for result in snapshot:
+        close = getattr(result, 'close', None)
+        if close is not None:
+            close()
+
+
+class PipelinedScheduler:
+    """Конвейер: стадия получения данных и стадия записи, связанные очередью на один снимок.
+
+    Пока пишется текущий снимок, уже запрашивается следующий. Если запись отстаёт,
+    снимок в очереди заменяется более свежим.
+
+    С арендой (lease) циклы выполняет только писатель: аренда продлевается на каждом тике,
+    резервная реплика раз в lease.poll_interval пытается её забрать, а между попытками
+    раз в период выполняет standby (например, обогащение своей доли юнитов).
+    """
+
+    def __init__(self, fetch=fetch_data, write=cash_db, is_enabled=check_status,
+                 period=CYCLE_PERIOD, max_age=SNAPSHOT_MAX_AGE, lease=None, on_acquire=take_over, standby=None):
+        self.fetch = fetch
+        self.write = write
+        self.is_enabled = is_enabled
+        self.period = period
+        self.max_age = max_age
+        if lease is None and CASHING_LEASE:
+            lease = writer_lease
+            if standby is None and AXENTA_ENRICH and axenta_enricher.sharded:
+                standby = axenta_enricher.consider_from_db
+        self.lease = lease
+        self.on_acquire = on_acquire
+        self.standby = standby
+        self._epoch = None
+        self._standby_at = 0.0
+        self.queue = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        self.consumer = threading.Thread(target=self._consume, name='cashing-writer', daemon=True)
+
+    def _offer(self, item):
+        """Кладёт снимок в очередь, вытесняя ещё не записанный устаревший."""
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    stale = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if stale is not _STOP:
+                    logger.warning("Запись в БД не успевает: устаревший снимок заменён новым.")
+                    _discard(stale[1])
+
+    def _hold_lease(self):
+        """Продлевает аренду писателя; в резерве выполняет standby не чаще раза в период."""
+        if self.lease.acquire():
+            if self.lease.epoch != self._epoch:
+                self._epoch = self.lease.epoch
+                if self.on_acquire is not None:
+                    self.on_acquire()
+            return True
+        self._epoch = None
+        if self.standby is not None and time.monotonic() - self._standby_at >= self.period:
+            self._standby_at = time.monotonic()
+            try:
+                self.standby()
+            except Exception as e:
+                logger.error(f"Ошибка фоновой работы резервной реплики: {str(e)}")
+        return False
+
+    def _produce(self):
+        next_tick = time.monotonic()
+        while not self.stop_event.is_set():
+            if self.is_enabled() == 0:
+                logger.warning(f"Модуль отключен. Ожидание {DISABLED_SLEEP} секунд.")
+                self.stop_event.wait(DISABLED_SLEEP)
+                next_tick = time.monotonic()
+                continue
+
+            if self.lease is not None and not self._hold_lease():
+                self.stop_event.wait(self.lease.poll_interval)
+                next_tick = time.monotonic()
+                continue
+
+            try:
+                snapshot = self.fetch()
+                self._offer((time.monotonic(), snapshot))
+            except Exception as e:
+                logger.error(f"Ошибка при получении данных: {str(e)}")
+                logger.info(f"Ожидание {ERROR_SLEEP} секунд перед повторной попыткой.")
+                self.stop_event.wait(ERROR_SLEEP)
+                next_tick = time.monotonic()
+                continue
+
+            next_tick += self.period
+            now = time.monotonic()
+            if next_tick < now:
+                logger.warning(f"Получение данных заняло больше периода {self.period} с, тик пропущен.")
+                next_tick = now
+            self.stop_event.wait(next_tick - now)
+
+    def _consume(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            fetched_at, snapshot = item
+            age = time.monotonic() - fetched_at
+            if age > self.max_age:
+                logger.warning(f"Снимок устарел ({age:.1f} с), пропускаем запись.")
+                _discard(snapshot)
+                continue
+            if self.is_enabled() == 0:
+                logger.warning("Модуль отключен, снимок не записан.")
+                _discard(snapshot)
+                continue
+            if self.lease is not None and not self.lease.held():
+                logger.warning("Аренда писателя истекла, снимок не записан.")
+                _discard(snapshot)
+                continue
+            try:
+                started = time.monotonic()
+                self.write(*snapshot)
+                logger.info(f"Обновление базы данных завершено за {time.monotonic() - started:.2f} с.")
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении базы данных: {str(e)}")
+
+    def run(self):
+        """Запускает конвейер и блокирует поток до остановки."""
+        if self.lease is not None:
+            self.lease.ensure_schema()
+        init_db(warm=self.lease is None)
+        self.consumer.start()
+        try:
+            self._produce()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.consumer.is_alive():
+            self._offer(_STOP)
+            self.consumer.join()
+        if self.lease is not None:
+            self.lease.release()
@@ -0,0 +1,152 @@
+import logging
+import os
+from hashlib import blake2b
+
+from app.cashing.batch import UnitBatch
+
+logger = logging.getLogger(__name__)
+
+# Что делать с юнитами, пропавшими из ответа API: 'keep' — оставить строку, 'delete' — удалить
+MISSING_UNITS_POLICY = os.getenv('CASHING_MISSING_UNITS', 'keep').lower()
+
+
+def fingerprint(values):
+    """Возвращает стабильный 64-битный отпечаток набора значений строки."""
+    digest = blake2b(repr(values).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+class SourceSnapshot:
+    """Отпечатки строк, записанных в БД в предыдущем цикле, для одного источника."""
+
+    def __init__(self, name, key, columns, time_column='last_time'):
+        self.name = name
+        self.key = key
+        self.columns = tuple(columns)
+        self.time_column = time_column
+        self.fingerprints = {}
+        # Время последнего сообщения юнита (для проверки свежести сохранённого снимка)
+        self.times = {}
+        self.last_stats = {'changed': 0, 'unchanged': 0, 'deleted': 0}
+        self._pending = None
+        self._pending_times = {}
+        self._changed = set()
+
+    def row_fingerprint(self, row):
+        return fingerprint(tuple(row.get(column) for column in self.columns))
+
+    def begin(self):
+        """Начинает новый цикл сравнения."""
+        self._pending = {}
+        self._pending_times = {}
+        self._changed = set()
+
+    def observe(self, row):
+        """Учитывает строку текущего цикла; возвращает True, если её нужно записать в БД."""
+        return self._observe(row[self.key], self.row_fingerprint(row), row.get(self.time_column))
+
+    def _observe(self, key, fp, last_time):
+        previous = self._pending[key] if key in self._pending else self.fingerprints.get(key)
+        self._pending[key] = fp
+        if previous != fp:
+            self._changed.add(key)
+            self._pending_times[key] = last_time or 0
+            return True
+        return False
+
+    def observe_batch(self, batch):
+        """Учитывает строки пакета UnitBatch; возвращает номера строк, которые нужно записать.
+
+        Отпечатки считаются по кортежам столбцов и совпадают с отпечатками словарей из observe().
+        Для повторяющегося ключа берётся последняя изменённая строка (её отпечаток и попадёт в снимок).
+        """
+        changed = {}
+        rows = zip(batch.keys(), batch.rows(self.columns), batch.column(self.time_column))
+        for index, (key, values, last_time) in enumerate(rows):
+            if self._observe(key, fingerprint(values), last_time):
+                changed[key] = index
+        return list(changed.values())
+
+    def finish(self):
+        """Завершает цикл сравнения и возвращает ключи юнитов, которые нужно удалить."""
+        pending = self._pending
+        seen = len(pending)
+        missing = [key for key in self.fingerprints if key not in pending]
+        deleted = missing if MISSING_UNITS_POLICY == 'delete' else []
+        if MISSING_UNITS_POLICY != 'delete':
+            # Пропавшие юниты остаются в БД, а значит и в снимке
+            for key in missing:
+                pending[key] = self.fingerprints[key]
+
+        self.last_stats = {
+            'changed': len(self._changed),
+            'unchanged': seen - len(self._changed),
+            'deleted': len(deleted),
+        }
+        self._changed = set()
+        logger.info(
+            f"{self.name}: изменено {self.last_stats['changed']}, без изменений {self.last_stats['unchanged']}, "
+            f"удалено {self.last_stats['deleted']} (пропало из API: {len(missing)})."
+        )
+        return deleted
+
+    def diff(self, rows):
+        """Сравнивает строки с прошлым циклом.
+
+        Возвращает (изменённые строки, ключи пропавших юнитов); для UnitBatch изменённые
+        строки — тоже пакет. Новые отпечатки
+        применяются только после commit(), чтобы откат транзакции не рассинхронизировал снимок.
+        """
+        self.begin()
+        if isinstance(rows, UnitBatch):
+            changed = rows.take(self.observe_batch(rows))
+            return changed, self.finish()
+        changed = {}
+        for row in rows:
+            if self.observe(row):
+                changed[row[self.key]] = row
+        deleted = self.finish()
+        return list(changed.values()), deleted
+
+    def commit(self):
+        """Фиксирует отпечатки после успешного commit транзакции."""
+        if self._pending is not None:
+            times = self.times
+            times.update(self._pending_times)
+            if len(times) > len(self._pending):
+                times = {key: times.get(key, 0) for key in self._pending}
+            self.fingerprints = self._pending
+            self.times = times
+            self._pending = None
+            self._pending_times = {}
+
+    def rollback(self):
+        """Отбрасывает отпечатки неудачного цикла."""
+        self._pending = None
+        self._pending_times = {}
+
+    def reset(self):
+        self.fingerprints = {}
+        self.times = {}
+        self._pending = None
+        self._pending_times = {}
+
+    def load(self, fingerprints, times):
+        """Восстанавливает снимок, сохранённый до перезапуска."""
+        self.fingerprints = fingerprints
+        self.times = times
+        self._pending = None
+        self._pending_times = {}
+
+    def seed(self, rows):
+        """Строит снимок по строкам, уже записанным в кеш-таблицу."""
+        fingerprints = {}
+        times = {}
+        for row in rows:
+            key = row[self.key]
+            fingerprints[key] = self.row_fingerprint(row)
+            times[key] = row.get(self.time_column) or 0
+        self.load(fingerprints, times)
+
+    def max_time(self):
+        return max(self.times.values(), default=0)
@@ -0,0 +1,93 @@
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Каталог данных модуля; по умолчанию — корень приложения (рядом с run.py), а не текущий каталог
+DATA_DIR = os.getenv('CASHING_DATA_DIR', os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# Файл со снимками источников для тёплого старта после перезапуска контейнера (пусто — не сохранять);
+# относительный путь считается от DATA_DIR
+SNAPSHOT_FILE = os.getenv('CASHING_SNAPSHOT_FILE', 'cashing_snapshot.bin')
+if SNAPSHOT_FILE:
+    SNAPSHOT_FILE = os.path.join(DATA_DIR, SNAPSHOT_FILE)
+# Файл старше этого возраста (секунды) не используется: снимок строится по кеш-таблицам
+SNAPSHOT_FILE_MAX_AGE = int(os.getenv('CASHING_SNAPSHOT_FILE_MAX_AGE', '86400'))
+
+MAGIC = b'CSNP'
+VERSION = 1
+# magic, версия, число секций, время сохранения
+HEADER = struct.Struct('<4sHHd')
+# имя источника, число юнитов, максимальное время сообщения
+SECTION = struct.Struct('<16sQq')
+
+
+def save_snapshots(snapshots, path=None):
+    """Сохраняет отпечатки источников в бинарный файл.
+
+    Секция источника — заголовок и три столбца int64 одинаковой длины (ключи по возрастанию,
+    отпечатки, время сообщения), поэтому файл читается через mmap без разбора записей.
+    Запись идёт во временный файл с атомарной заменой.
+    """
+    path = SNAPSHOT_FILE if path is None else path
+    if not path or sys.byteorder != 'little':
+        return False
+    tmp_path = f'{path}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(snapshots), time.time()))
+            for snapshot in snapshots:
+                keys = array('q', sorted(snapshot.fingerprints))
+                fingerprints = array('q', (snapshot.fingerprints[key] for key in keys))
+                times = array('q', (snapshot.times.get(key, 0) for key in keys))
+                f.write(SECTION.pack(snapshot.name.encode('utf-8'), len(keys), snapshot.max_time()))
+                keys.tofile(f)
+                fingerprints.tofile(f)
+                times.tofile(f)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении снимка в {path}: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def read_snapshots(path=None, max_age=SNAPSHOT_FILE_MAX_AGE):
+    """Читает сохранённые снимки: {имя: (fingerprints, times, max_time)}.
+
+    Возвращает None, если файла нет, он повреждён или старше max_age.
+    """
+    path = SNAPSHOT_FILE if path is None else path
+    if not path or sys.byteorder != 'little' or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, count, saved_at = HEADER.unpack_from(data, 0)
+            if magic != MAGIC or version != VERSION:
+                logger.warning(f"Файл снимка {path} другого формата, пропускаем.")
+                return None
+            age = time.time() - saved_at
+            if age > max_age:
+                logger.warning(f"Файл снимка {path} устарел ({age:.0f} с), пропускаем.")
+                return None
+            result = {}
+            offset = HEADER.size
+            for _ in range(count):
+                name, units, max_time = SECTION.unpack_from(data, offset)
+                offset += SECTION.size
+                size = units * 8
+                with memoryview(data)[offset:offset + size * 3] as raw, raw.cast('q') as columns:
+                    keys = columns[:units].tolist()
+                    fingerprints = dict(zip(keys, columns[units:units * 2].tolist()))
+                    times = dict(zip(keys, columns[units * 2:].tolist()))
+                offset += size * 3
+                result[name.rstrip(b'\0').decode('utf-8')] = (fingerprints, times, max_time)
+            return result
+    except Exception as e:
+        logger.error(f"Ошибка при чтении снимка из {path}: {str(e)}")
+        return None
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+
+from app.database import SessionLocal
+from app.metrics import Gauge
+from app.cashing.upsert import bulk_upsert
+from app.cashing.lease import fence
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('source', 'stale', 'stale_since', 'last_success', 'last_error', 'updated_at')
+
+SOURCE_STALE = Gauge(
+    'cashing_source_stale', 'Данные источника в кеш-таблицах устарели (1), актуальны (0).', ('source',))
+
+
+class SourceStatus:
+    """Свежесть данных источников для UI: строки cash_source_status.
+
+    Источник помечается устаревшим, когда его пропускает разомкнутая цепь или запрос к нему
+    не удался; last_success — время последнего зафиксированного цикла со свежими данными.
+    """
+
+    def __init__(self, sources=('cesar', 'axenta')):
+        self.rows = {
+            source: {'source': source, 'stale': False, 'stale_since': None, 'last_success': None, 'last_error': None}
+            for source in sources
+        }
+        self._lock = threading.Lock()
+        for source in sources:
+            SOURCE_STALE.set(0, source=source)
+
+    def mark_stale(self, source, reason):
+        with self._lock:
+            row = self.rows[source]
+            if not row['stale']:
+                row['stale'] = True
+                row['stale_since'] = int(time.time())
+            row['last_error'] = reason
+        SOURCE_STALE.set(1, source=source)
+
+    def mark_fresh(self, source):
+        with self._lock:
+            row = self.rows[source]
+            row['stale'] = False
+            row['stale_since'] = None
+            row['last_error'] = None
+        SOURCE_STALE.set(0, source=source)
+
+    def committed(self, source):
+        """Отмечает успешную запись источника; для устаревшего источника время не сдвигается."""
+        with self._lock:
+            row = self.rows[source]
+            if not row['stale']:
+                row['last_success'] = int(time.time())
+
+    def persist(self):
+        """Записывает состояние источников в cash_source_status."""
+        now = int(time.time())
+        with self._lock:
+            rows = [dict(row, updated_at=now) for row in self.rows.values()]
+        session = SessionLocal()
+        try:
+            bulk_upsert(session, 'cash_source_status', COLUMNS, 'source', rows)
+            fence(session)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка при записи состояния источников: {str(e)}")
+        finally:
+            session.close()
+
+
+source_status = SourceStatus()
@@ -0,0 +1,243 @@
+import json
+import logging
+import math
+import os
+import threading
+
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models import CashCesar, CashAxenta
+from app.cashing.batch import iter_columns
+from app.cashing.history import EARTH_RADIUS, distance_m
+
+logger = logging.getLogger(__name__)
+
+# Пространственный индекс последних позиций юнитов (равномерная сетка в градусах)
+CASHING_SPATIAL = os.getenv('CASHING_SPATIAL', '1') == '1'
+# Размер ячейки сетки в градусах (0.01° ≈ 1.1 км по широте)
+SPATIAL_CELL_SIZE = float(os.getenv('CASHING_SPATIAL_CELL_SIZE', '0.01'))
+# JSON-файл с зонами складов: {"<Storage.ID>": {"lat": .., "lon": .., "radius": метры}}
+STORAGE_ZONES_FILE = os.getenv('CASHING_STORAGE_ZONES', '')
+
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def has_position(lat, lon):
+    """Нулевые и пустые координаты означают, что у юнита нет навигации."""
+    return bool(lat) and bool(lon)
+
+
+def load_zones(path=STORAGE_ZONES_FILE):
+    """Читает зоны складов из JSON-файла; в модели Storage координат нет."""
+    if not path:
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            raw = json.load(f)
+        return {int(storage_id): (float(zone['lat']), float(zone['lon']), float(zone['radius']))
+                for storage_id, zone in raw.items()}
+    except Exception as e:
+        logger.error(f"Ошибка при чтении зон складов из {path}: {str(e)}")
+        return {}
+
+
+class SpatialIndex:
+    """Сетка ячеек с позициями юнитов Cesar и Axenta.
+
+    Ключ юнита — (источник, id). Позиции из цикла накапливаются в observe и применяются
+    в commit вместе с расчётом входов и выходов из зон складов; запросы radius / bbox
+    просматривают только ячейки, пересекающие область поиска. После перезапуска в цикл
+    попадают только изменённые юниты, поэтому при первом commit индекс читается из кеш-таблиц.
+    """
+
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE, zones=None):
+        self.cell_size = cell_size
+        # (источник, id) -> (lat, lon, ячейка)
+        self.positions = {}
+        # ячейка -> {(источник, id)}
+        self.cells = {}
+        # Storage.ID -> (lat, lon, радиус); ячейка -> {Storage.ID}
+        self.zones = {}
+        self.zone_cells = {}
+        # (источник, id) -> {Storage.ID}
+        self.membership = {}
+        self.last_diff = {'entered': [], 'left': []}
+        self.loaded = False
+        # источник -> {id: (lat, lon)}; источники пишутся в БД параллельно
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self.set_zones(load_zones() if zones is None else zones)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def _cells_in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        lat_from, lon_from = self._cell(min_lat, min_lon)
+        lat_to, lon_to = self._cell(max_lat, max_lon)
+        for i in range(lat_from, lat_to + 1):
+            for j in range(lon_from, lon_to + 1):
+                yield i, j
+
+    @staticmethod
+    def _radius_bbox(lat, lon, radius):
+        dlat = radius / METERS_PER_DEGREE
+        dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+    def set_zones(self, zones):
+        """Задаёт зоны складов {Storage.ID: (lat, lon, радиус в метрах)} и пересчитывает принадлежность."""
+        with self._lock:
+            self.zones = dict(zones)
+            self.zone_cells = {}
+            for storage_id, (lat, lon, radius) in self.zones.items():
+                for cell in self._cells_in_bbox(*self._radius_bbox(lat, lon, radius)):
+                    self.zone_cells.setdefault(cell, set()).add(storage_id)
+            self.membership = {}
+            for key, (lat, lon, cell) in self.positions.items():
+                inside = self._zones_at(lat, lon, cell)
+                if inside:
+                    self.membership[key] = inside
+
+    def _zones_at(self, lat, lon, cell):
+        inside = set()
+        for storage_id in self.zone_cells.get(cell, ()):
+            zone_lat, zone_lon, radius = self.zones[storage_id]
+            if distance_m(lat, lon, zone_lat, zone_lon) <= radius:
+                inside.add(storage_id)
+        return inside
+
+    def observe(self, source, rows, id_key, deleted=()):
+        """Запоминает позиции строк цикла; применяются они в commit."""
+        with self._pending_lock:
+            pending = self._pending.setdefault(source, {})
+            for unit_id, lat, lon in iter_columns(rows, (id_key, 'pos_x', 'pos_y')):
+                pending[unit_id] = (lat, lon)
+            for unit_id in deleted:
+                pending[unit_id] = (None, None)
+
+    def rollback(self, source=None):
+        """Отбрасывает позиции неудавшегося цикла (или только одного источника)."""
+        with self._pending_lock:
+            if source is None:
+                self._pending = {}
+            else:
+                self._pending.pop(source, None)
+
+    def load(self, session):
+        """Строит индекс по позициям из cash_cesar и cash_axenta (без входов и выходов из зон)."""
+        positions = {
+            'cesar': {unit_id: (lat, lon) for unit_id, lat, lon in session.execute(
+                select(CashCesar.unit_id, CashCesar.pos_x, CashCesar.pos_y))},
+            'axenta': {unit_id: (lat, lon) for unit_id, lat, lon in session.execute(
+                select(CashAxenta.id, CashAxenta.pos_x, CashAxenta.pos_y))},
+        }
+        with self._lock:
+            self.positions = {}
+            self.cells = {}
+            self.membership = {}
+            self._apply(positions)
+            self.last_diff = {'entered': [], 'left': []}
+            self.loaded = True
+        logger.info(f"Пространственный индекс: загружено {len(self.positions)} позиций.")
+
+    def reset(self):
+        """Перечитать индекс при следующем commit (например, после смены писателя)."""
+        self.loaded = False
+
+    def commit(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not self.loaded:
+            # Кеш-таблицы уже содержат строки этого цикла
+            session = SessionLocal()
+            try:
+                self.load(session)
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке пространственного индекса: {str(e)}")
+            finally:
+                session.close()
+            return
+        self._commit_pending(pending)
+
+    def _commit_pending(self, pending):
+        with self._lock:
+            self.last_diff = self._apply(pending)
+        if self.last_diff['entered'] or self.last_diff['left']:
+            logger.info(f"Зоны складов: вошло {len(self.last_diff['entered'])}, "
+                        f"вышло {len(self.last_diff['left'])} юнитов.")
+
+    def _apply(self, pending):
+        entered = []
+        left = []
+        for source, positions in pending.items():
+            for unit_id, (lat, lon) in positions.items():
+                key = (source, unit_id)
+                old = self.positions.pop(key, None)
+                if old is not None:
+                    bucket = self.cells.get(old[2])
+                    if bucket is not None:
+                        bucket.discard(key)
+                        if not bucket:
+                            del self.cells[old[2]]
+                before = self.membership.pop(key, set())
+                after = set()
+                if has_position(lat, lon):
+                    cell = self._cell(lat, lon)
+                    self.positions[key] = (lat, lon, cell)
+                    self.cells.setdefault(cell, set()).add(key)
+                    after = self._zones_at(lat, lon, cell)
+                    if after:
+                        self.membership[key] = after
+                entered.extend((storage_id, source, unit_id) for storage_id in after - before)
+                left.extend((storage_id, source, unit_id) for storage_id in before - after)
+        return {'entered': entered, 'left': left}
+
+    def update(self, source, rows, id_key, deleted=()):
+        """Сразу применяет позиции в памяти (без цикла записи и загрузки из БД) и возвращает изменения по зонам."""
+        self.observe(source, rows, id_key, deleted)
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        self._commit_pending(pending)
+        return self.last_diff
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Юниты внутри прямоугольника: список (источник, id, lat, lon)."""
+        result = []
+        lat_from, lon_from = self._cell(min_lat, min_lon)
+        lat_to, lon_to = self._cell(max_lat, max_lon)
+        with self._lock:
+            # Для больших областей дешевле пройти по непустым ячейкам, чем по всем ячейкам области
+            if (lat_to - lat_from + 1) * (lon_to - lon_from + 1) > len(self.cells):
+                cells = [cell for cell in self.cells
+                         if lat_from <= cell[0] <= lat_to and lon_from <= cell[1] <= lon_to]
+            else:
+                cells = self._cells_in_bbox(min_lat, min_lon, max_lat, max_lon)
+            for cell in cells:
+                for key in self.cells.get(cell, ()):
+                    lat, lon, _ = self.positions[key]
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        result.append((key[0], key[1], lat, lon))
+        return result
+
+    def radius(self, lat, lon, radius):
+        """Юниты не дальше radius метров от точки: список (источник, id, расстояние), ближние первыми."""
+        result = []
+        for source, unit_id, unit_lat, unit_lon in self.bbox(*self._radius_bbox(lat, lon, radius)):
+            distance = distance_m(lat, lon, unit_lat, unit_lon)
+            if distance <= radius:
+                result.append((source, unit_id, distance))
+        result.sort(key=lambda item: item[2])
+        return result
+
+    def in_storage(self, storage_id, margin=0.0):
+        """Юниты внутри зоны склада (margin расширяет зону, чтобы найти юниты «рядом»)."""
+        zone = self.zones.get(storage_id)
+        if zone is None:
+            return []
+        lat, lon, radius = zone
+        return self.radius(lat, lon, radius + margin)
+
+
+spatial_index = SpatialIndex()
@@ -0,0 +1,115 @@
+import logging
+import os
+import sqlite3
+from itertools import chain
+
+from app.cashing.batch import UnitBatch
+
+logger = logging.getLogger(__name__)
+
+# Количество строк в одном многострочном INSERT
+UPSERT_CHUNK_SIZE = int(os.getenv('CASHING_UPSERT_CHUNK_SIZE', '500'))
+
+# Лимит связанных параметров в одном запросе SQLite (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+# Псевдоним вставляемой строки (INSERT ... AS new) есть в MySQL с 8.0.19; VALUES(col) в
+# ON DUPLICATE KEY UPDATE устарел с 8.0.20. MariaDB псевдоним не поддерживает.
+MYSQL_ROW_ALIAS_VERSION = (8, 0, 19)
+
+_statement_cache = {}
+
+
+def _placeholder(dialect):
+    return '?' if dialect.paramstyle == 'qmark' else '%s'
+
+
+def _mysql_row_alias(dialect):
+    """True, если сервер MySQL понимает INSERT ... AS new ON DUPLICATE KEY UPDATE col = new.col."""
+    if getattr(dialect, 'is_mariadb', False):
+        return False
+    return tuple(dialect.server_version_info or ()) >= MYSQL_ROW_ALIAS_VERSION
+
+
+def build_upsert_sql(dialect, table, columns, key, update_columns, rows_count):
+    """Строит многострочный INSERT с обновлением при конфликте ключа для диалекта БД."""
+    row_alias = dialect.name == 'mysql' and _mysql_row_alias(dialect)
+    cache_key = (dialect.name, dialect.paramstyle, row_alias, table, tuple(columns), key, tuple(update_columns),
+                 rows_count)
+    sql = _statement_cache.get(cache_key)
+    if sql is not None:
+        return sql
+
+    mark = _placeholder(dialect)
+    row_sql = '(' + ', '.join([mark] * len(columns)) + ')'
+    values_sql = ', '.join([row_sql] * rows_count)
+    insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values_sql}"
+
+    if dialect.name == 'mysql':
+        if update_columns and row_alias:
+            insert_sql += ' AS new'
+            assignments = ', '.join(f"{column} = new.{column}" for column in update_columns)
+        elif update_columns:
+            assignments = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+        else:
+            assignments = f"{key} = {key}"
+        sql = f"{insert_sql} ON DUPLICATE KEY UPDATE {assignments}"
+    elif dialect.name in ('sqlite', 'postgresql'):
+        if update_columns:
+            assignments = ', '.join(f"{column} = excluded.{column}" for column in update_columns)
+            sql = f"{insert_sql} ON CONFLICT ({key}) DO UPDATE SET {assignments}"
+        else:
+            sql = f"{insert_sql} ON CONFLICT ({key}) DO NOTHING"
+    else:
+        raise NotImplementedError(f"Upsert не поддерживается для диалекта {dialect.name}")
+
+    _statement_cache[cache_key] = sql
+    return sql
+
+
+def chunk_size_for(dialect, columns_count, chunk_size=None):
+    """Размер чанка с учётом лимита параметров диалекта."""
+    size = chunk_size or UPSERT_CHUNK_SIZE
+    if dialect.name == 'sqlite':
+        size = min(size, SQLITE_MAX_VARIABLES // columns_count)
+    return max(size, 1)
+
+
+def bulk_upsert(session, table, columns, key, rows, update_columns=None, chunk_size=None):
+    """Вставляет или обновляет строки чанками многострочных INSERT.
+
+    rows — список словарей или пакет UnitBatch (значения берутся из столбцов пакета).
+    При конфликте по ключу обновляются только update_columns (по умолчанию все, кроме ключа),
+    остальные столбцы строки в БД не трогаются.
+    """
+    if not rows:
+        return 0
+    columns = tuple(columns)
+    if update_columns is None:
+        update_columns = tuple(column for column in columns if column != key)
+    if isinstance(rows, UnitBatch):
+        rows = list(rows.rows(columns))
+    else:
+        rows = [tuple(row[column] for column in columns) for row in rows]
+
+    connection = session.connection()
+    dialect = connection.dialect
+    size = chunk_size_for(dialect, len(columns), chunk_size)
+
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        sql = build_upsert_sql(dialect, table, columns, key, update_columns, len(chunk))
+        connection.exec_driver_sql(sql, tuple(chain.from_iterable(chunk)))
+
+    logger.debug(f"{table}: upsert {len(rows)} строк чанками по {size}.")
+    return len(rows)
+
+
+def insert_rows(session, table, columns, rows):
+    """Вставляет кортежи значений одним executemany драйвера."""
+    if not rows:
+        return 0
+    mark = _placeholder(session.connection().dialect)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([mark] * len(columns))})"
+    session.connection().exec_driver_sql(sql, rows)
+    return len(rows)
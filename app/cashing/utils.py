@@ -1,7 +1,30 @@
 # cashing/utils.py
 
-import time
-from datetime import datetime
+import os
+from datetime import date, datetime, timezone
+from functools import lru_cache
+
+# Размер LRU-кеша разобранных меток времени (значения повторяются между циклами)
+TIME_CACHE_SIZE = int(os.getenv('CASHING_TIME_CACHE_SIZE', '200000'))
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def parse_utc(value):
+    """Разбирает ISO-8601 строку в UNIX-время (UTC).
+
+    Для формата 'YYYY-MM-DDTHH:MM:SSZ' время считается без tzinfo и mktime, остальные
+    (дробные секунды, смещения) разбираются через datetime.fromisoformat. Наивное время считается UTC.
+    """
+    if len(value) == 20 and value[19] == 'Z' and value[10] == 'T':
+        dt = datetime.fromisoformat(value[:19])
+        return (dt.toordinal() - _EPOCH_ORDINAL) * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
 
 
 def to_unix_time(dt_str):
@@ -9,9 +32,8 @@ def to_unix_time(dt_str):
     if dt_str is None:
         return 0
     try:
-        dt = datetime.strptime(dt_str, "%Y-%m-%dT%H:%M:%SZ")
-        return int(time.mktime(dt.timetuple()))
-    except ValueError:
+        return parse_utc(dt_str)
+    except (ValueError, TypeError):
         print(f"Error parsing date: {dt_str}")
         return 0
 
@@ -19,9 +41,20 @@ def z_to_unix_time(timestamp_str):
     """Преобразует строку времени z в Unix timestamp."""
     try:
         if timestamp_str:
-            dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            return int(dt.timestamp())
+            return parse_utc(timestamp_str)
         return 0
     except Exception as e:
         print(f"Error parsing date: {timestamp_str}")
-        return 0
\ No newline at end of file
+        return 0
+
+def to_unix_times(values):
+    """Преобразует столбец строк дат в список UNIX-времён; повторы внутри столбца разбираются один раз."""
+    seen = {}
+    result = []
+    append = result.append
+    for value in values:
+        converted = seen.get(value)
+        if converted is None:
+            converted = seen[value] = to_unix_time(value)
+        append(converted)
+    return result
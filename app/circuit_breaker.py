@@ -0,0 +1,82 @@
+import logging
+import os
+import threading
+import time
+
+from app.metrics import Gauge, Counter
+
+logger = logging.getLogger(__name__)
+
+# Сколько неудач подряд размыкают цепь источника
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+# Через сколько секунд разомкнутая цепь пропускает пробный запрос
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '60'))
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    'cashing_circuit_state', 'Состояние цепи источника: 0 — замкнута, 1 — пробный запрос, 2 — разомкнута.',
+    ('source',))
+CIRCUIT_SKIPS = Counter(
+    'cashing_circuit_skipped_total', 'Запросы, пропущенные из-за разомкнутой цепи.', ('source',))
+
+
+class CircuitBreaker:
+    """Предохранитель источника: после failure_threshold неудач подряд запросы не выполняются.
+
+    Через reset_timeout секунд пропускается один пробный запрос (half-open): успех замыкает
+    цепь, неудача снова размыкает её на reset_timeout.
+    """
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, source=name)
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"Цепь {self.name}: {self.state} -> {state}.")
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], source=self.name)
+
+    def allow(self):
+        """Можно ли сейчас обращаться к источнику."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+                return True
+            CIRCUIT_SKIPS.inc(source=self.name)
+            return False
+
+    @property
+    def is_open(self):
+        return self.state == OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.last_error = None
+            self._set_state(CLOSED)
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+
+cesar_breaker = CircuitBreaker('cesar')
+axenta_breaker = CircuitBreaker('axenta')
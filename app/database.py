@@ -0,0 +1,31 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Конфигурация базы данных: один движок и пул соединений на весь процесс
+SQLALCHEMY_DATABASE_URL = os.getenv('SQLALCHEMY_DATABASE_URL', 'sqlite:///default.db')
+# SQLite: источники пишутся параллельно, второй писатель ждёт блокировку, а не падает сразу
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+
+
+def _create_engine(url):
+    connect_args = {'timeout': SQLITE_BUSY_TIMEOUT} if url.startswith('sqlite') else {}
+    return create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def configure(url):
+    """Переключает процесс на другую БД (например, локальную SQLite для воспроизведения журнала).
+
+    Сессии SessionLocal после вызова открываются на новом движке; модули, которым нужен
+    сам движок, берут его как database.engine.
+    """
+    global engine
+    engine.dispose()
+    engine = _create_engine(url)
+    SessionLocal.configure(bind=engine)
+    return engine
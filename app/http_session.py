@@ -0,0 +1,44 @@
+import os
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Размер пула keep-alive соединений на хост
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+# Таймауты установки соединения и чтения ответа (секунды): зависший API не блокирует цикл
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+# Повторы при сетевых ошибках и ответах 429 / 5xx с экспоненциальной паузой со случайным разбросом
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+HTTP_BACKOFF_BASE = float(os.getenv('HTTP_BACKOFF_BASE', '0.5'))
+HTTP_BACKOFF_MAX = float(os.getenv('HTTP_BACKOFF_MAX', '8'))
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """Адаптер, подставляющий таймаут в запросы, где он не указан явно."""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=self.timeout if timeout is None else timeout, **kwargs)
+
+
+def create_session(pool_size: int = None, timeout=None) -> requests.Session:
+    """Создаёт requests.Session с пулом постоянных соединений и таймаутами по умолчанию."""
+    size = pool_size or HTTP_POOL_SIZE
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(pool_connections=size, pool_maxsize=size,
+                                 timeout=timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def backoff_delay(attempt: int) -> float:
+    """Пауза перед повтором attempt (с нуля): случайная в [0, base * 2^attempt], не больше HTTP_BACKOFF_MAX."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
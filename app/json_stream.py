@@ -0,0 +1,87 @@
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Инкрементально разбирает JSON-массив верхнего уровня, отдавая элементы по одному.
+
+    В памяти держится только текущий недочитанный кусок тела ответа, а не весь массив.
+    Элементами должны быть объекты, массивы или строки (числа на границе чанка неоднозначны).
+    """
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+
+    while True:
+        # Пропускаем пробелы и разделители между элементами
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or (started and buffer[pos] == ',')):
+            pos += 1
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"Ожидался JSON-массив, получено: {buffer[pos:pos + 50]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                pos = end
+                yield item
+                continue
+        elif eof:
+            raise ValueError("Неожиданный конец JSON-массива")
+
+        # Нужны ещё данные: отбрасываем разобранную часть буфера и дочитываем чанк
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer = buffer[pos:] + utf8.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+
+
+class ClosingStream:
+    """Итератор поверх ресурса (ответа HTTP, вложенного потока), который закрывает ресурс явно.
+
+    close() у генератора, чтение которого не начиналось, не выполняет его finally, поэтому
+    ресурс закрывается здесь: по close(), по окончании итерации и при ошибке чтения.
+    """
+
+    def __init__(self, iterator: Iterator[Any], resource: Any):
+        self.iterator = iterator
+        self.resource = resource
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        close = getattr(self.iterator, 'close', None)
+        try:
+            if close is not None:
+                close()
+        finally:
+            close = getattr(self.resource, 'close', None)
+            if close is not None:
+                close()
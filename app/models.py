@@ -104,6 +104,53 @@ class CashHistoryAxenta(Base):
 
     valid_nav = Column(Integer, nullable=True, default=0)
 
+    __table_args__ = (
+        Index('idx_cash_history_axenta_uid_time', 'uid', 'last_time'),
+    )
+
+class CashHistoryCesar(Base):
+    __tablename__ = 'cash_history_cesar'
+    id = Column(Integer, primary_key=True)
+    unit_id = Column(Integer, nullable=False, default=0)
+    object_name = Column(Text, nullable=False)
+    pos_x = Column(Float, default=0.0)
+    pos_y = Column(Float, default=0.0)
+    last_time = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index('idx_cash_history_cesar_unit_time', 'unit_id', 'last_time'),
+    )
+
+class CashSourceStatus(Base):
+    __tablename__ = 'cash_source_status'
+    source = Column(String(32), primary_key=True)
+    stale = Column(Boolean, nullable=False, default=False)
+    stale_since = Column(Integer, nullable=True)
+    last_success = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(Integer, default=0)
+
+class FleetPosition(Base):
+    __tablename__ = 'fleet_position'
+    # Госномер в виде normalize_name: часть до '|', без пробелов по краям, в верхнем регистре
+    name = Column(String(255), primary_key=True)
+    source = Column(String(16), nullable=False)
+    unit_id = Column(Integer, nullable=False)
+    pos_x = Column(Float, nullable=False)
+    pos_y = Column(Float, nullable=False)
+    valid_nav = Column(Integer, nullable=True)
+    pos_time = Column(Integer, default=0)
+    last_time = Column(Integer, default=0)
+    updated_at = Column(Integer, default=0)
+
+class CashHistoryMaintenance(Base):
+    __tablename__ = 'cash_history_maintenance'
+    # Физическая таблица истории (включая таблицы периодов SQLite)
+    table_name = Column(String(64), primary_key=True)
+    # До какого момента (начало суток, UTC) старые треки уже прорежены
+    downsampled_until = Column(Integer, nullable=False, default=0)
+    updated_at = Column(Integer, default=0)
+
 class SystemSettings(Base):
     __tablename__ = 'system_settings'
     id = Column(Integer, primary_key=True)
@@ -0,0 +1,88 @@
+import logging
+import os
+import threading
+import time
+
+from app.database import SessionLocal
+from app.models import SystemSettings
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд настройки и статусы считаются свежими
+SETTINGS_CACHE_TTL = float(os.getenv('SETTINGS_CACHE_TTL', '30'))
+
+_caches = {}
+
+
+class TTLCache:
+    """Значение из БД, перечитываемое не чаще раза в ttl секунд.
+
+    При ошибке БД отдаётся последнее успешно прочитанное значение (или default, если его ещё нет).
+    """
+
+    def __init__(self, name, loader, ttl=None, default=None):
+        self.name = name
+        self.loader = loader
+        self.ttl = SETTINGS_CACHE_TTL if ttl is None else ttl
+        self.default = default
+        self.value = None
+        self.loaded = False
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if time.monotonic() < self.expires_at:
+            return self.value if self.loaded else self.default
+        with self._lock:
+            if time.monotonic() < self.expires_at:
+                return self.value if self.loaded else self.default
+            try:
+                self.value = self.loader()
+                self.loaded = True
+            except Exception as e:
+                logger.error(f"Ошибка чтения {self.name} из БД, используется последнее известное значение: {str(e)}")
+            # После ошибки повторяем чтение тоже не раньше, чем через ttl
+            self.expires_at = time.monotonic() + self.ttl
+            return self.value if self.loaded else self.default
+
+    def set(self, value):
+        """Сквозная запись: значение уже сохранено в БД, обновляем кеш без повторного чтения."""
+        with self._lock:
+            self.value = value
+            self.loaded = True
+            self.expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self.expires_at = 0.0
+
+
+def register(name, loader, ttl=None, default=None):
+    """Регистрирует кешируемое значение; повторная регистрация возвращает существующий кеш."""
+    if name not in _caches:
+        _caches[name] = TTLCache(name, loader, ttl, default)
+    return _caches[name]
+
+
+def invalidate(name=None):
+    """Сбрасывает один кеш по имени или все сразу."""
+    for cache_name, cache in _caches.items():
+        if name is None or cache_name == name:
+            cache.invalidate()
+
+
+def _load_settings():
+    session = SessionLocal()
+    try:
+        result = session.query(SystemSettings).filter(SystemSettings.id == 0).first()
+        if result is None:
+            return None
+        return {
+            'enable_voperator': result.enable_voperator,
+            'enable_xml_parser': result.enable_xml_parser,
+            'enable_db_cashing': result.enable_db_cashing,
+        }
+    finally:
+        session.close()
+
+
+system_settings = register('system_settings', _load_settings)
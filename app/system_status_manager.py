@@ -1,6 +1,8 @@
-import os
-from sqlalchemy import create_engine, Column, Integer, Boolean
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import Column, Integer, Boolean
+from sqlalchemy.orm import declarative_base
+
+from app import settings_cache
+from app.database import SessionLocal
 
 # Создаем базовый класс
 Base = declarative_base()
@@ -15,16 +17,19 @@ class SystemStatus(Base):
     tech_update = Column(Boolean, nullable=False, default=False)
 
 
-# Получаем URL подключения из переменной окружения или используем SQLite по умолчанию
-DATABASE_URL = os.getenv('SQLALCHEMY_DATABASE_URL', 'sqlite:///default.db')
+# Общий с db_operations движок и пул соединений
+Session = SessionLocal
 
-# Создаем движок и сессию
-engine = create_engine(DATABASE_URL)
-Session = sessionmaker(bind=engine)
 
+def _status_dict(status_record):
+    return {
+        'db_update': status_record.db_update,
+        'transport_update': status_record.transport_update,
+        'tech_update': status_record.tech_update,
+    }
 
-def get_status(name=None):
-    """Получает статус обновления для db, transport или всех."""
+
+def _load_status():
     session = Session()
     try:
         status_record = session.query(SystemStatus).first()
@@ -33,23 +38,34 @@ def get_status(name=None):
             status_record = SystemStatus()
             session.add(status_record)
             session.commit()
-
-        if name == 'db':
-            result = status_record.db_update or status_record.tech_update
-        elif name == 'transport':
-            result = status_record.transport_update or status_record.tech_update
-        elif name is None:
-            result = status_record.db_update or status_record.transport_update or status_record.tech_update
-        else:
-            return False
-
-        return result
+        return _status_dict(status_record)
     finally:
         session.close()
 
 
+status_cache = settings_cache.register('system_status', _load_status)
+
+
+def get_status(name=None):
+    """Получает статус обновления для db, transport или всех (из кеша с TTL)."""
+    status_record = status_cache.get()
+    if not status_record:
+        return False
+
+    if name == 'db':
+        result = status_record['db_update'] or status_record['tech_update']
+    elif name == 'transport':
+        result = status_record['transport_update'] or status_record['tech_update']
+    elif name is None:
+        result = status_record['db_update'] or status_record['transport_update'] or status_record['tech_update']
+    else:
+        return False
+
+    return result
+
+
 def set_status(name, status):
-    """Устанавливает статус обновления для db или transport."""
+    """Устанавливает статус обновления для db или transport (со сквозной записью в кеш)."""
     if name not in ['db', 'transport']:
         return False
 
@@ -67,9 +83,11 @@ def set_status(name, status):
             status_record.transport_update = status
 
         session.commit()
+        status_cache.set(_status_dict(status_record))
         return True
     except Exception as e:
         print(f"Error occurred: {e}")
+        status_cache.invalidate()
         return False
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
@@ -0,0 +1,145 @@
+"""Пиковая память загрузки objects Axenta: response.json() + список против потокового разбора.
+
+Затем проверяется дедлайн потокового режима: тело, не переданное целиком за AXENTA_FETCH_DEADLINE,
+откатывает транзакцию источника, а предохранитель узнаёт об итоге только после чтения тела;
+время записи прочитанных объектов в дедлайн не входит. Отброшенный непрочитанным поток
+закрывает ответ HTTP.
+
+Запуск: python benchmarks/bench_axenta_stream.py [--objects 200000] [--chunk 5000]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_servers import axenta_stub
+
+
+def objects_payload(count):
+    return json.dumps([{
+        'id': unit_id, 'name': f'A{unit_id:06d}|Склад', 'uniqueId': str(100000000 + unit_id), 'connectedStatus': True,
+        'lastMessage': {'t': '2024-01-01T00:00:00Z', 'tpos': '2024-01-01T00:00:00Z',
+                        'pos': {'x': 37.0 + unit_id * 1e-6, 'y': 55.0, 'sc': 9, 's': 0, 'c': 0, 'z': 150}},
+        'deviceType': 'Тестовый трекер', 'phone': '+70000000000', 'customFields': [],
+    } for unit_id in range(1, count + 1)]).encode('utf-8')
+
+
+def measure(label, load, db_operations):
+    db_operations.axenta_snapshot.reset()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    session = db_operations.SessionLocal()
+    try:
+        db_operations.process_axenta_result(session, load())
+        session.commit()
+        db_operations.axenta_snapshot.commit()
+    finally:
+        session.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<24} пик памяти {peak / 2 ** 20:8.1f} МиБ, время {elapsed:6.2f} с")
+
+
+def slow_write(pause):
+    """Обработка, которая после первого объекта пишет в БД дольше дедлайна."""
+    def process(session, items, process_axenta_result):
+        def items_with_pause():
+            for index, item in enumerate(items):
+                if index == 1:
+                    time.sleep(pause)
+                yield item
+        return process_axenta_result(session, items_with_pause())
+    return process
+
+
+def check_deadline(axenta, db_operations, body_delay, deadline, write_pause=0.0):
+    """Читает поток через data_fetcher так же, как цикл; возвращает итог записи и прирост неудач цепи."""
+    from app.cashing import data_fetcher
+    breaker = data_fetcher.axenta_breaker
+    data_fetcher.AXENTA_STREAMING = True
+    axenta.state.body_delay = body_delay
+    breaker.record_failure('неудача до проверки')
+    failures = breaker.failures
+    started = time.monotonic()
+    stream = data_fetcher._collect('Axenta', data_fetcher._submit('Axenta', data_fetcher.fetch_axenta),
+                                   started, deadline, breaker)
+    assert breaker.failures == failures, 'итог записан в предохранитель до чтения тела'
+    process = db_operations.process_axenta_result
+    if write_pause:
+        pause = slow_write(write_pause)
+        process = lambda session, items: pause(session, items, db_operations.process_axenta_result)
+    outcome = db_operations.write_source('axenta', process, stream, lambda: None)
+    print(f"тело за {body_delay} с (запись +{write_pause} с) при дедлайне {deadline} с: "
+          f"записано {outcome['committed']}, "
+          f"{time.monotonic() - started:.2f} с, неудач цепи {breaker.failures}")
+    return outcome['committed'], breaker.failures - failures, breaker.failures
+
+
+def check_discard(axenta):
+    """Поток, отброшенный планировщиком до начала чтения, закрывает ответ HTTP."""
+    from app.cashing import data_fetcher
+    from app.cashing.scheduler import _discard
+    axenta.state.body_delay = 3.0
+    stream = data_fetcher._collect('Axenta', data_fetcher._submit('Axenta', data_fetcher.fetch_axenta),
+                                   time.monotonic(), 60, data_fetcher.axenta_breaker)
+    response = stream.resource.resource
+    assert not response.raw.closed
+    _discard([stream])
+    assert response.raw.closed, 'ответ HTTP непрочитанного потока не закрыт'
+    print("отброшенный непрочитанным поток закрыл ответ HTTP")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--objects', type=int, default=200000)
+    parser.add_argument('--chunk', type=int, default=5000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['CASHING_SNAPSHOT_FILE'] = path + '.snapshot'
+    os.environ['AXENTA_ENRICH'] = '0'
+    from app import database
+    from app.models import Base
+    from app.cashing import db_operations
+    from app.api_axenta_connector import AxentaApi
+    Base.metadata.create_all(database.engine)
+    db_operations.AXENTA_CHUNK_SIZE = args.chunk
+
+    payload = objects_payload(args.objects)
+    print(f"тело ответа: {len(payload) / 2 ** 20:.1f} МиБ, объектов: {args.objects}")
+    try:
+        with axenta_stub(payload) as axenta:
+            api = AxentaApi(api_url=axenta.url)
+            api.ensure_token()
+            measure('response.json() + список', api.search_all_items, db_operations)
+            measure(f'поток, чанк {args.chunk}', api.iter_all_items, db_operations)
+
+            committed, added, _ = check_deadline(axenta, db_operations, body_delay=3.0, deadline=0.5)
+            assert not committed and added == 1, 'поток после дедлайна записан или не учтён как неудача'
+            committed, _, failures = check_deadline(axenta, db_operations, body_delay=0.5, deadline=60)
+            assert committed and failures == 0, 'прочитанный целиком поток не замкнул цепь'
+            committed, _, failures = check_deadline(axenta, db_operations, body_delay=0.5, deadline=2.0,
+                                                    write_pause=3.0)
+            assert committed and failures == 0, 'время записи объектов засчитано в дедлайн чтения'
+            check_discard(axenta)
+            print("проверки пройдены")
+    finally:
+        database.engine.dispose()
+        os.remove(path)
+        if os.path.exists(path + '.snapshot'):
+            os.remove(path + '.snapshot')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Один запрос units/device-state на весь парк против шардов по unit_id.
+
+Заглушка Cesar тратит device_cost секунд на каждое отдаваемое устройство, имитируя
+сервер, время ответа которого растёт с размером парка. Затем один запрос данных получает 503:
+полный опрос теряет цикл, а шардированный повторяет только свой шард. Повторы
+на уровне HTTP отключены (HTTP_RETRIES=0), чтобы был виден именно повтор шарда.
+
+Запуск: python benchmarks/bench_cesar_shards.py [--units 40000] [--shard-size 4000] [--workers 4]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+from stub_servers import cesar_stub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=40000)
+    parser.add_argument('--shard-size', type=int, default=4000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--device-cost', type=float, default=0.000025)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+    os.environ['HTTP_RETRIES'] = '0'
+
+    fleet = FleetGenerator(args.units)
+    unit_ids = [device['unit_id'] for device in fleet.cesar]
+    with cesar_stub(fleet.cesar) as stub:
+        os.environ['CESAR_HOST'] = stub.url
+        from app.api_cesar_connector import CesarApi
+        from app.cashing.cesar_shards import ShardedCesarFetch
+
+        api = CesarApi()
+        api.ensure_token()
+        stub.state.device_cost = args.device_cost
+        sharded = ShardedCesarFetch(lambda: unit_ids, shard_size=args.shard_size, workers=args.workers,
+                                    sweep_interval=3600)
+        sharded.last_sweep = time.monotonic()
+
+        started = time.perf_counter()
+        full = api.get_cars_info()
+        full_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        devices = sharded.fetch(api)
+        shard_seconds = time.perf_counter() - started
+        assert sorted(d['unit_id'] for d in devices) == sorted(d['unit_id'] for d in full)
+        print(f"{args.units} устройств: один запрос {full_seconds * 1000:.0f} мс, "
+              f"{sharded.last_stats['shards']} шардов по {args.shard_size} в {args.workers} потока "
+              f"{shard_seconds * 1000:.0f} мс (x{full_seconds / shard_seconds:.1f})")
+
+        stub.state.fail_next = 1
+        try:
+            api.get_cars_info()
+            print("сбой одного запроса: полный опрос неожиданно успешен")
+        except Exception as e:
+            print(f"сбой одного запроса: полный опрос потерян ({type(e).__name__})")
+        stub.state.fail_next = 1
+        started = time.perf_counter()
+        devices = sharded.fetch(api)
+        print(f"сбой одного запроса: шарды получили {len(devices)} устройств за "
+              f"{(time.perf_counter() - started) * 1000:.0f} мс, повторено шардов {sharded.last_stats['retried']}")
+
+
+if __name__ == '__main__':
+    main()
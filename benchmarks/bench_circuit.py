@@ -0,0 +1,80 @@
+"""Разомкнутая цепь источника не тормозит цикл: Cesar зависает, затем отвечает 503, затем восстанавливается.
+
+Каждый цикл — fetch_data + cash_db на временной SQLite. Печатается время получения данных,
+состояние цепей и строки cash_source_status.
+
+Запуск: python benchmarks/bench_circuit.py [--units 2000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+from stub_servers import cesar_stub, axenta_stub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=2000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ.update({
+        'SQLALCHEMY_DATABASE_URL': f'sqlite:///{path}',
+        'CASHING_SNAPSHOT_FILE': '',
+        'AXENTA_ENRICH': '0',
+        'HTTP_READ_TIMEOUT': '1',
+        'HTTP_BACKOFF_BASE': '0.1',
+        'CESAR_FETCH_DEADLINE': '3',
+        'AXENTA_FETCH_DEADLINE': '3',
+        'CIRCUIT_FAILURE_THRESHOLD': '2',
+        'CIRCUIT_RESET_TIMEOUT': '2',
+    })
+    fleet = FleetGenerator(args.units, churn=0.1)
+    try:
+        with cesar_stub() as cesar, axenta_stub() as axenta:
+            os.environ['CESAR_HOST'] = cesar.url
+            os.environ['AXENTA_HOST'] = axenta.url
+            from sqlalchemy import text
+            from app import database
+            from app.models import Base
+            from app.circuit_breaker import cesar_breaker, axenta_breaker
+            from app.cashing import data_fetcher, db_operations
+
+            Base.metadata.create_all(database.engine)
+            db_operations.init_db()
+            plan = ['ok', 'hang', 'hang', 'hang', '503', '503', 'ok', 'ok', 'ok']
+            for cycle, mode in enumerate(plan):
+                if cycle:
+                    fleet.next_cycle()
+                cesar.state.delay = 5 if mode == 'hang' else 0
+                cesar.state.status = 503 if mode == '503' else None
+                cesar.state.payload = fleet.cesar_body()
+                axenta.state.payload = fleet.axenta_body()
+                # Пауза между циклами: по истечении CIRCUIT_RESET_TIMEOUT цепь пропускает пробный запрос
+                time.sleep(1)
+                started = time.perf_counter()
+                cesar_result, axenta_result = data_fetcher.fetch_data()
+                fetched = time.perf_counter() - started
+                db_operations.cash_db(cesar_result, axenta_result)
+                with database.engine.connect() as conn:
+                    rows = conn.execute(text("SELECT source, stale, last_success FROM cash_source_status "
+                                             "ORDER BY source")).fetchall()
+                status = ', '.join(f"{source}: {'stale' if stale else 'fresh'}" for source, stale, _ in rows)
+                print(f"цикл {cycle} ({mode:>4}): получение {fetched:5.2f} с, cesar {len(cesar_result):5} строк, "
+                      f"axenta {len(axenta_result):5} строк, цепи {cesar_breaker.state}/{axenta_breaker.state}; "
+                      f"{status}")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
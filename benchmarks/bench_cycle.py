@@ -0,0 +1,172 @@
+"""Нагрузочный прогон полного цикла fetch → normalize → write → history на синтетическом парке.
+
+Реальные коннекторы ходят в локальные заглушки API, запись идёт во временную SQLite.
+Время каждой стадии пишется в JSON, чтобы сравнивать результаты между коммитами:
+
+    python benchmarks/bench_cycle.py --units 10000 --cycles 5 --churn 0.1 --output before.json
+    python benchmarks/bench_cycle.py --units 10000 --cycles 5 --churn 0.1 --output after.json --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from payloads import FleetGenerator
+from stub_servers import cesar_stub, axenta_stub
+
+
+class StageTimer:
+    """Оборачивает метод объекта и суммирует время его вызовов."""
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.original = getattr(owner, name)
+        self.seconds = 0.0
+        setattr(owner, name, self)
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.original(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def take(self):
+        seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def run_cycles(args, fleet, cesar, axenta):
+    from app import database
+    from app.models import Base
+    from app.cashing import data_fetcher, db_operations
+    from app.cashing.history import cesar_history, axenta_history
+
+    Base.metadata.create_all(database.engine)
+    db_operations.init_db()
+    history_timers = [StageTimer(cesar_history, 'append'), StageTimer(axenta_history, 'append')]
+
+    cycles = []
+    for cycle in range(args.cycles):
+        if cycle:
+            fleet.next_cycle()
+        cesar.state.payload = fleet.cesar_body()
+        axenta.state.payload = fleet.axenta_body()
+
+        stages = {}
+        started = time.perf_counter()
+        cesar_result, axenta_result = data_fetcher.fetch_data()
+        stages['fetch'] = time.perf_counter() - started
+
+        session = db_operations.SessionLocal()
+        try:
+            started = time.perf_counter()
+            db_operations.process_cesar_result(session, cesar_result)
+            stages['cesar'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            db_operations.process_axenta_result(session, axenta_result)
+            stages['axenta'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            session.commit()
+            for state in db_operations.CYCLE_STATES:
+                state.commit()
+            stages['commit'] = time.perf_counter() - started
+        finally:
+            session.close()
+
+        # История пишется внутри process_*: выделяем её время отдельно
+        stages['history'] = sum(timer.take() for timer in history_timers)
+        stages['cesar'] -= history_timers[0].seconds
+        stages['axenta'] -= history_timers[1].seconds
+        stages['total'] = sum(stages.values())
+        stages['written'] = db_operations.get_cycle_stats()
+        cycles.append(stages)
+        print(f"цикл {cycle}: " + ', '.join(f"{name} {value * 1000:.0f} мс" for name, value in stages.items()
+                                            if isinstance(value, float)))
+    return cycles
+
+
+def summarize(cycles):
+    """Медиана по установившимся циклам (первый, холодный, считается отдельно)."""
+    steady = cycles[1:] or cycles
+    names = [name for name, value in cycles[0].items() if isinstance(value, float)]
+    return {
+        'cold': {name: cycles[0][name] for name in names},
+        'steady_median': {name: statistics.median(cycle[name] for cycle in steady) for name in names},
+    }
+
+
+def compare(summary, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"сравнение с {baseline_path} ({baseline.get('revision')}):")
+    for name, value in summary['steady_median'].items():
+        before = baseline['summary']['steady_median'].get(name)
+        if before:
+            print(f"  {name:<8} {before * 1000:9.1f} → {value * 1000:9.1f} мс ({(value / before - 1) * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=10000)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['CASHING_SNAPSHOT_FILE'] = path + '.snapshot'
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    try:
+        with cesar_stub() as cesar, axenta_stub() as axenta:
+            os.environ['CESAR_HOST'] = cesar.url
+            os.environ['AXENTA_HOST'] = axenta.url
+            os.environ.setdefault('CESAR_FETCH_DEADLINE', '600')
+            os.environ.setdefault('AXENTA_FETCH_DEADLINE', '600')
+            # Фоновое обогащение меряется отдельно в bench_enrichment.py
+            os.environ.setdefault('AXENTA_ENRICH', '0')
+            cycles = run_cycles(args, fleet, cesar, axenta)
+    finally:
+        for name in (path, path + '.snapshot'):
+            if os.path.exists(name):
+                os.remove(name)
+
+    summary = summarize(cycles)
+    result = {
+        'revision': git_revision(),
+        'params': vars(args),
+        'python': sys.version.split()[0],
+        'cycles': cycles,
+        'summary': summary,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        compare(summary, args.compare)
+
+
+if __name__ == '__main__':
+    main()
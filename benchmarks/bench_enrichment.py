@@ -0,0 +1,163 @@
+"""Фоновое обогащение cash_axenta.cmd / sens через заглушку Axenta с задержкой поюнитовых запросов.
+
+Показывает, что цикл записи не ждёт обогащения, и за сколько обогащается весь парк. Проверяет:
+  - датчики и команды каждого юнита записаны в cash_axenta;
+  - одновременных поюнитовых запросов не больше concurrency;
+  - при истечении и при отзыве токена (401) потоки обогащения получают новый токен одним логином;
+  - в следующем цикле опрашиваются только юниты с новым lastMessage.t, а с max_age = 0 — все;
+  - с ограничением per_cycle парк опрашивается по частям, давно не опрошенные юниты — первыми;
+  - кеш удалённых из cash_axenta юнитов очищается;
+  - без аренды писателя (CASHING_LEASE) результаты обогащения не записываются.
+
+Запуск: python benchmarks/bench_enrichment.py [--units 2000] [--unit-delay 0.02] [--concurrency 16]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+from stub_servers import AXENTA_COMMANDS, AXENTA_SENSORS, axenta_stub
+
+
+def wait_enriched(enricher):
+    while enricher.pending() or not enricher._results.empty():
+        time.sleep(0.05)
+    enricher.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=2000)
+    parser.add_argument('--unit-delay', type=float, default=0.02)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['CASHING_SNAPSHOT_FILE'] = path + '.snapshot'
+    os.environ['HTTP_POOL_SIZE'] = str(args.concurrency)
+    fleet = FleetGenerator(args.units, churn=0.05)
+    try:
+        with axenta_stub(fleet.axenta_body()) as axenta:
+            state = axenta.state
+            state.unit_delay = args.unit_delay
+            state.check_token = True
+            os.environ['AXENTA_HOST'] = axenta.url
+            from sqlalchemy import text
+            from app import database
+            from app.models import Base
+            from app.cashing import db_operations
+            from app.api_axenta_connector import AxentaApi
+
+            Base.metadata.create_all(database.engine)
+            # Экземпляр из SOURCE_STATES: пул потоков создаётся при первом commit
+            enricher = db_operations.axenta_enricher
+            enricher.concurrency = args.concurrency
+            enricher.flush_interval = 0.5
+            # Сначала весь парк за один цикл; постепенный опрос проверяется в конце
+            enricher.per_cycle = 0
+            api = AxentaApi()
+            items = api.search_all_items()
+
+            # Токен истекает к началу обогащения: все потоки обнаружат это одновременно
+            api.token_expiry = 0
+            logins = state.logins
+            started = time.perf_counter()
+            db_operations.cash_db([], items)
+            cycle = time.perf_counter() - started
+            print(f"цикл записи {args.units} юнитов: {cycle * 1000:.0f} мс (обогащение идёт в фоне)")
+
+            wait_enriched(enricher)
+            total = time.perf_counter() - started
+            with database.engine.connect() as conn:
+                rows = conn.execute(text("SELECT cmd, sens FROM cash_axenta")).all()
+            sens = json.dumps(AXENTA_SENSORS, ensure_ascii=False)
+            cmd = json.dumps(AXENTA_COMMANDS, ensure_ascii=False)
+            filled = sum(1 for row in rows if row.cmd == cmd and row.sens == sens)
+            serial = args.units * 2 * args.unit_delay
+            print(f"обогащено {filled} юнитов за {total:.2f} с при параллельности {args.concurrency} "
+                  f"(последовательно ~{serial:.1f} с), одновременных запросов не больше "
+                  f"{state.max_unit_in_flight}, логинов после истечения токена {state.logins - logins}")
+            assert filled == len(rows) == args.units, 'датчики и команды записаны не у всех юнитов'
+            assert state.unit_requests == 2 * args.units
+            assert 1 < state.max_unit_in_flight <= args.concurrency, 'нарушено ограничение параллельности'
+            assert state.logins - logins == 1, 'истёкший токен обновлён несколькими потоками'
+
+            fleet.next_cycle()
+            state.payload = fleet.axenta_body()
+            requests_before = state.unit_requests
+            db_operations.cash_db([], api.search_all_items())
+            wait_enriched(enricher)
+            changed = int(args.units * fleet.churn)
+            print(f"следующий цикл: поюнитовых запросов {state.unit_requests - requests_before} "
+                  f"(изменилось {changed} юнитов)")
+            assert state.unit_requests - requests_before == 2 * changed, 'опрошены юниты без новых сообщений'
+
+            # Токен отозван, а max_age = 0 заставляет перечитать всех: первые запросы получат 401
+            enricher.max_age = 0
+            items = api.search_all_items()
+            state.token = 'revoked'
+            logins = state.logins
+            requests_before = state.unit_requests
+            db_operations.cash_db([], items)
+            wait_enriched(enricher)
+            refreshed = state.unit_requests - requests_before
+            print(f"max_age = 0 после отзыва токена: поюнитовых запросов {refreshed}, "
+                  f"логинов {state.logins - logins}")
+            assert refreshed >= 2 * args.units, 'с max_age = 0 опрошены не все юниты'
+            assert state.logins - logins == 1, 'отозванный токен обновлён несколькими потоками'
+
+            # Постепенный опрос: за цикл не больше per_cycle юнитов, без повторов, пока не опрошены все
+            enricher.per_cycle = args.units // 4
+            seen = set()
+            for _ in range(4):
+                requests_before = state.unit_requests
+                db_operations.cash_db([], items)
+                wait_enriched(enricher)
+                polled = {unit_id for unit_id in enricher.attempted if unit_id not in seen}
+                seen |= polled
+                assert state.unit_requests - requests_before == 2 * enricher.per_cycle, 'превышен per_cycle'
+            print(f"per_cycle = {enricher.per_cycle}: за 4 цикла опрошено {len(seen)} разных юнитов")
+            assert len(seen) == args.units, 'постепенный опрос повторяет одни и те же юниты'
+
+            # Юниты, удалённые из cash_axenta (CASHING_MISSING_UNITS=delete), уходят из кеша обогащения
+            from app.cashing import snapshot
+            snapshot.MISSING_UNITS_POLICY = 'delete'
+            removed = items[:10]
+            db_operations.cash_db([], items[10:])
+            wait_enriched(enricher)
+            snapshot.MISSING_UNITS_POLICY = 'keep'
+            assert not any(item['id'] in enricher.cache or item['id'] in enricher.attempted for item in removed), \
+                'кеш удалённых юнитов не очищен'
+
+            # Реплика без аренды писателя не пишет результаты обогащения
+            from app.cashing import lease
+            lease.CASHING_LEASE = True
+            enricher.max_age = 0
+            with database.engine.begin() as conn:
+                conn.execute(text("UPDATE cash_axenta SET cmd = '', sens = ''"))
+            enricher.consider(items[10]['id'], 0)
+            enricher.commit()
+            wait_enriched(enricher)
+            with database.engine.connect() as conn:
+                written = conn.execute(text("SELECT COUNT(*) FROM cash_axenta WHERE sens <> ''")).scalar()
+            lease.CASHING_LEASE = False
+            print(f"без аренды писателя записано датчиков: {written}")
+            assert written == 0, 'реплика без аренды записала датчики'
+            print("проверки пройдены")
+    finally:
+        for name in (path, path + '.snapshot'):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+if __name__ == '__main__':
+    main()
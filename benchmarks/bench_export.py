@@ -0,0 +1,120 @@
+"""Потоковая CSV-выгрузка из кеш-таблиц против чтения всей таблицы в память.
+
+cash_cesar заполняется синтетическими юнитами разного объёма. Для каждого объёма выгрузка
+export_csv (yield_per) сравнивается с вариантом .all() + список строк по пиковой памяти
+(tracemalloc) и времени. Затем проверяется офлайн-отчёт CesarApi.get_cars_info(toString=True,
+offline=True) на заглушке: раньше он падал на strptime от уже числового времени.
+
+Запуск: python benchmarks/bench_export.py [--sizes 50000 200000]
+"""
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator, _z_time
+from stub_servers import cesar_stub
+
+
+class NullWriter(io.TextIOBase):
+    """Файл, который считает символы и ничего не хранит: в память попадает только сама выгрузка."""
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, s):
+        self.chars += len(s)
+        return len(s)
+
+
+def fill(engine, size, now):
+    rnd = random.Random(size)
+    rows = [(100000 + i, f'А{i % 1000:03d}ВС{i % 199 + 1}', rnd.randint(1000, 9999), f'XTA{i:014d}',
+             now - rnd.randint(0, 86400 * 10) if rnd.random() < 0.95 else 0, 55.0, 37.0, now - 86400 * 400,
+             rnd.choice(('Cesar Auto', 'Cesar Tracker')), rnd.random() < 0.5) for i in range(size)]
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM cash_cesar")
+        connection.exec_driver_sql(
+            "INSERT INTO cash_cesar (unit_id, object_name, pin, vin, last_time, pos_x, pos_y, created_at, "
+            "device_type, linked) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50000, 200000])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CASHING_SNAPSHOT_FILE'] = os.path.join(workdir, 'snapshot.bin')
+    from app import database
+    from app.models import Base
+    from app.cashing.export import EXPORTS, export_csv, offline_before, write_csv
+    Base.metadata.create_all(database.engine)
+    now = int(time.time())
+    offline = offline_before(3, now)
+
+    def export_all(**filters):
+        # Прежний подход отчётов: весь набор строк в памяти до записи
+        from sqlalchemy import select, or_
+        table = EXPORTS['cesar'][0].__table__
+        query = select(*[table.c[column] for column in EXPORTS['cesar'][1]])
+        if filters.get('offline') is not None:
+            query = query.where(or_(table.c.last_time < filters['offline'], table.c.last_time.is_(None)))
+        session = database.SessionLocal()
+        try:
+            rows = [list(row) for row in session.execute(query.order_by(table.c.unit_id)).all()]
+            return write_csv(rows, EXPORTS['cesar'][2], NullWriter())
+        finally:
+            session.close()
+
+    try:
+        for size in args.sizes:
+            fill(database.engine, size, now)
+            for label, filters in (('весь парк', {}), ('офлайн > 3 дней', {'offline': offline})):
+                count, stream_seconds, stream_peak = measure(lambda: export_csv('cesar', NullWriter(), **filters))
+                all_count, all_seconds, all_peak = measure(lambda: export_all(**filters))
+                assert count == all_count
+                print(f"{size:7d} юнитов, {label}: {count:7d} строк; поток {stream_peak / 2 ** 20:6.1f} МиБ "
+                      f"{stream_seconds * 1000:5.0f} мс, .all() {all_peak / 2 ** 20:6.1f} МиБ "
+                      f"{all_seconds * 1000:5.0f} мс")
+    finally:
+        database.engine.dispose()
+        os.remove(os.path.join(workdir, 'bench.db'))
+        os.rmdir(workdir)
+
+    fleet = FleetGenerator(1000, start_time=now)
+    for device in fleet.cesar[:300]:
+        device['receive_time'] = _z_time(now - 5 * 86400)
+    fleet.cesar[300]['receive_time'] = None
+    with cesar_stub(fleet.cesar) as stub:
+        os.environ['CESAR_HOST'] = stub.url
+        from app.api_cesar_connector import CesarApi
+        api = CesarApi()
+        report = api.get_cars_info(toString=True, offline=True)
+        full = api.get_cars_info(toString=True)
+    print(f"get_cars_info(toString=True, offline=True): {len(report) - 1} офлайн из {len(full) - 1} "
+          f"(ожидаемо 301)")
+    sys.exit(0 if len(report) - 1 == 301 else 1)
+
+
+if __name__ == '__main__':
+    main()
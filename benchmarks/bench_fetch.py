@@ -0,0 +1,82 @@
+"""Задержка fetch_data при параллельном опросе источников через локальные заглушки API.
+
+Проверяет, что источники опрашиваются параллельно, у каждого свой дедлайн, ошибка одного
+источника не мешает другому, а зависший запрос не задерживает следующий цикл и не порождает новых.
+
+Запуск: python benchmarks/bench_fetch.py [--cesar-delay 1.0] [--axenta-delay 1.5]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+from stub_servers import cesar_stub, axenta_stub
+
+
+def timed_fetch(data_fetcher):
+    started = time.monotonic()
+    cesar_result, axenta_result = data_fetcher.fetch_data()
+    return time.monotonic() - started, len(cesar_result), len(axenta_result)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cesar-delay', type=float, default=1.0)
+    parser.add_argument('--axenta-delay', type=float, default=1.5)
+    parser.add_argument('--units', type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fleet = FleetGenerator(args.units)
+    with cesar_stub(fleet.cesar_body(), args.cesar_delay) as cesar, \
+            axenta_stub(fleet.axenta_body(), args.axenta_delay) as axenta:
+        os.environ['CESAR_HOST'] = cesar.url
+        os.environ['AXENTA_HOST'] = axenta.url
+        from app.cashing import data_fetcher
+        from app.cashing.source_status import source_status
+
+        elapsed, cesar_count, axenta_count = timed_fetch(data_fetcher)
+        print(f"параллельно: {elapsed:.2f} с (Cesar {cesar_count}, Axenta {axenta_count}); "
+              f"последовательно было бы ~{args.cesar_delay + args.axenta_delay:.2f} с")
+        assert cesar_count == axenta_count == args.units
+        assert elapsed < args.cesar_delay + args.axenta_delay, 'источники опрошены последовательно'
+
+        # Ошибка Axenta не влияет на данные Cesar
+        axenta.state.status = 400
+        axenta_failures = data_fetcher.axenta_breaker.failures
+        elapsed, cesar_count, axenta_count = timed_fetch(data_fetcher)
+        print(f"Axenta отвечает 400: {elapsed:.2f} с (Cesar {cesar_count}, Axenta {axenta_count})")
+        assert cesar_count == args.units and axenta_count == 0
+        assert data_fetcher.axenta_breaker.failures == axenta_failures + 1
+        assert data_fetcher.cesar_breaker.failures == 0
+        assert source_status.rows['axenta']['stale'] and not source_status.rows['cesar']['stale']
+        axenta.state.status = None
+
+        # Медленный источник не задерживает быстрый дольше своего дедлайна
+        deadline = args.cesar_delay + 0.5
+        data_fetcher.AXENTA_FETCH_DEADLINE = deadline
+        axenta.state.delay = 3 * deadline
+        elapsed, cesar_count, axenta_count = timed_fetch(data_fetcher)
+        print(f"Axenta за дедлайном {deadline:.1f} с: {elapsed:.2f} с (Cesar {cesar_count}, Axenta {axenta_count})")
+        assert cesar_count == args.units and axenta_count == 0
+        assert deadline <= elapsed < deadline + 0.5, 'дедлайн Axenta не соблюдён'
+
+        # Зависший запрос прошлого цикла ещё выполняется: новый цикл ждёт его не дольше дедлайна
+        requests = axenta.state.requests
+        elapsed, cesar_count, axenta_count = timed_fetch(data_fetcher)
+        print(f"следующий цикл при зависшем Axenta: {elapsed:.2f} с (Cesar {cesar_count}, Axenta {axenta_count}), "
+              f"новых запросов к Axenta {axenta.state.requests - requests}")
+        assert cesar_count == args.units and axenta_count == 0
+        assert elapsed < deadline + 0.5, 'зависший запрос задержал следующий цикл'
+        assert axenta.state.requests == requests, 'зависший запрос продублирован'
+        print(f"логинов за 4 цикла: Cesar {cesar.state.logins}, Axenta {axenta.state.logins}")
+        print("проверки пройдены")
+        data_fetcher._executor.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""fleet_position: инкрементальное обновление и проверка против полного пересчёта.
+
+Синтетический парк пишется через cash_db несколько циклов. После каждого цикла содержимое
+fleet_position сравнивается с эталоном, посчитанным заново по cash_cesar и cash_axenta.
+Затем имитируется перезапуск (reset: всё перечитывается из БД, ничего не должно переписаться)
+и сравнивается «где юнит X» точечным запросом к fleet_position и ручным соединением кеш-таблиц.
+
+Запуск: python benchmarks/bench_fleet_position.py [--units 20000] [--cycles 5] [--churn 0.1]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+
+def reference(session):
+    """Победители, посчитанные заново по кеш-таблицам (как это делают потребители вручную)."""
+    from sqlalchemy import text
+    from app.cashing.fleet_position import _fix, is_valid
+    best = {}
+    queries = (
+        ('cesar', "SELECT unit_id, object_name, pos_x, pos_y, last_time, last_time, NULL FROM cash_cesar"),
+        ('axenta', "SELECT id, nm, pos_x, pos_y, last_time, last_pos_time, valid_nav FROM cash_axenta"),
+    )
+    for source, sql in queries:
+        for unit_id, name, x, y, last_time, pos_time, valid_nav in session.execute(text(sql)):
+            fix = _fix(name, x, y, last_time, pos_time, valid_nav)
+            if not fix[0] or not is_valid(fix):
+                continue
+            row = (fix[0], source, unit_id, x, y, valid_nav, fix[1], fix[2])
+            current = best.get(fix[0])
+            if current is None or (row[6], row[1], row[2]) > (current[6], current[1], current[2]):
+                best[fix[0]] = row
+    return best
+
+
+def stored(session):
+    from sqlalchemy import text
+    rows = session.execute(text(
+        "SELECT name, source, unit_id, pos_x, pos_y, valid_nav, pos_time, last_time FROM fleet_position"))
+    return {row[0]: tuple(row) for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=20000)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CASHING_SNAPSHOT_FILE'] = ''
+    os.environ['AXENTA_ENRICH'] = '0'
+    from sqlalchemy import text
+    from app import database
+    from app.models import Base
+    from app.cashing import db_operations
+    from app.cashing.fleet_position import fleet_positions
+    from app.metrics import ROWS
+
+    Base.metadata.create_all(database.engine)
+    db_operations.init_db()
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    timings = []
+    mismatches = 0
+    original_commit = fleet_positions.commit
+
+    def timed_commit():
+        started = time.perf_counter()
+        original_commit()
+        timings.append(time.perf_counter() - started)
+
+    fleet_positions.commit = timed_commit
+    session = database.SessionLocal()
+    try:
+        for cycle in range(args.cycles):
+            if cycle:
+                fleet.next_cycle()
+            written_before = ROWS._values.get(('fleet_position', 'written'), 0)
+            db_operations.cash_db(fleet.cesar, fleet.axenta)
+            written = ROWS._values.get(('fleet_position', 'written'), 0) - written_before
+            session.rollback()
+            started = time.perf_counter()
+            expected = reference(session)
+            full = time.perf_counter() - started
+            actual = stored(session)
+            mismatches += sum(1 for name in expected.keys() | actual.keys() if expected.get(name) != actual.get(name))
+            print(f"цикл {cycle}: записано госномеров {written:6d}, commit {timings[-1] * 1000:5.0f} мс, "
+                  f"полный пересчёт {full * 1000:5.0f} мс, госномеров в таблице {len(actual)}")
+
+        fleet_positions.reset()
+        written_before = ROWS._values.get(('fleet_position', 'written'), 0)
+        db_operations.cash_db(fleet.cesar, fleet.axenta)
+        written = ROWS._values.get(('fleet_position', 'written'), 0) - written_before
+        print(f"перезапуск без изменений: перечитано за {timings[-1] * 1000:.0f} мс, переписано {written} госномеров")
+
+        names = random.Random(3).sample(sorted(stored(session)), min(args.lookups, args.units))
+        started = time.perf_counter()
+        for name in names:
+            session.execute(text("SELECT pos_x, pos_y, source FROM fleet_position WHERE name = :name"),
+                            {'name': name}).first()
+        point = (time.perf_counter() - started) / len(names)
+        join_names = names[:20]
+        started = time.perf_counter()
+        for name in join_names:
+            session.execute(text(
+                "SELECT c.pos_x, c.pos_y, c.last_time, a.pos_x, a.pos_y, a.last_pos_time FROM cash_cesar c "
+                "LEFT JOIN cash_axenta a ON a.nm = UPPER(TRIM(c.object_name)) "
+                "WHERE UPPER(TRIM(c.object_name)) = :name"), {'name': name}).all()
+        join = (time.perf_counter() - started) / len(join_names)
+        print(f"«где юнит X»: fleet_position {point * 1e6:.0f} мкс, соединение кеш-таблиц {join * 1e3:.1f} мс "
+              f"(x{join / point:.0f})")
+        print(f"расхождений с эталоном: {mismatches}")
+    finally:
+        session.close()
+        os.remove(os.path.join(workdir, 'bench.db'))
+        os.rmdir(workdir)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
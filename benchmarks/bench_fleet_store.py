@@ -0,0 +1,179 @@
+"""Хранилище юнитов в памяти и локальный API против опроса кеш-таблиц.
+
+Синтетический парк пишется через cash_db несколько циклов. Проверяется, что хранилище совпадает
+с cash_cesar / cash_axenta и что клиент, применяющий /fleet/changes, получает то же, что полный /fleet.
+Пространственные запросы /fleet/near и /fleet/bbox сверяются с перебором всех записей хранилища.
+Затем сравнивается время ответа: поиск по id и госномеру через API (keep-alive), условный GET
+с If-None-Match и те же запросы к БД.
+
+Запуск: python benchmarks/bench_fleet_store.py [--units 20000] [--cycles 4] [--lookups 2000]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get(connection, path, etag=None):
+    connection.request('GET', path, headers={'If-None-Match': etag} if etag else {})
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, response.getheader('ETag'), json.loads(body) if body else None
+
+
+def apply_changes(units, delta):
+    for source, records in delta['changed'].items():
+        for record in records:
+            units[source][record[STORE_KEYS[source]]] = record
+    for source, ids in delta['deleted'].items():
+        for unit_id in ids:
+            units[source].pop(unit_id, None)
+
+
+STORE_KEYS = {'cesar': 'unit_id', 'axenta': 'id'}
+
+
+def per_call(func, items):
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - started) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=20000)
+    parser.add_argument('--cycles', type=int, default=4)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CASHING_SNAPSHOT_FILE'] = ''
+    os.environ['AXENTA_ENRICH'] = '0'
+    from sqlalchemy import select, text
+    from app import database
+    from app.models import Base
+    from app.cashing import db_operations
+    from app.cashing.fleet_store import STORE_COLUMNS, _MODELS, fleet_store
+    from app.cashing.fleet_api import start_fleet_api
+
+    Base.metadata.create_all(database.engine)
+    db_operations.init_db()
+    port = free_port()
+    server = start_fleet_api(port=port)
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    session = database.SessionLocal()
+    mismatches = 0
+    try:
+        client = None
+        for cycle in range(args.cycles):
+            if cycle:
+                fleet.next_cycle()
+            started = time.perf_counter()
+            db_operations.cash_db(fleet.cesar, fleet.axenta)
+            cycle_seconds = time.perf_counter() - started
+            if client is None:
+                _, _, full = get(connection, '/fleet')
+                client = {'version': full['version'],
+                          'units': {source: {r[STORE_KEYS[source]]: r for r in records}
+                                    for source, records in full['units'].items()}}
+                print(f"цикл {cycle}: {cycle_seconds * 1000:.0f} мс, клиент взял полный снимок версии "
+                      f"{client['version']}")
+                continue
+            status, _, delta = get(connection, f"/fleet/changes?since={client['version']}")
+            apply_changes(client['units'], delta)
+            client['version'] = delta['version']
+            changed = sum(len(records) for records in delta['changed'].values())
+            deleted = sum(len(ids) for ids in delta['deleted'].values())
+            print(f"цикл {cycle}: {cycle_seconds * 1000:.0f} мс, изменений {changed}, удалений {deleted}, "
+                  f"версия {delta['version']}")
+
+        session.rollback()
+        _, _, full = get(connection, '/fleet')
+        for source, columns in STORE_COLUMNS.items():
+            table = _MODELS[source].__table__
+            rows = {row[0]: tuple(row) for row in session.execute(select(*[table.c[c] for c in columns]))}
+            stored = {unit_id: tuple(record[c] for c in columns) for unit_id, record in fleet_store.records[source].items()}
+            mismatches += sum(1 for key in rows.keys() | stored.keys() if rows.get(key) != stored.get(key))
+            served = {record[STORE_KEYS[source]]: record for record in full['units'][source]}
+            mismatches += sum(1 for key in served.keys() | client['units'][source].keys()
+                              if served.get(key) != client['units'][source].get(key))
+        status, etag, delta = get(connection, f"/fleet/changes?since={client['version']}")
+        conditional, _, _ = get(connection, f"/fleet/changes?since={client['version']}", etag)
+        stale, _, _ = get(connection, '/fleet/changes?since=1')
+        print(f"клиент по дельтам совпадает с /fleet и БД; повторный опрос изменений: {status}, "
+              f"с If-None-Match: {conditional}, версия вне журнала: {stale}")
+        assert status == 200 and not any(delta['changed'].values()) and not any(delta['deleted'].values())
+        assert conditional == 304 and stale == 410
+
+        from app.cashing.history import distance_m
+        records = [record for source in STORE_KEYS for record in fleet_store.records[source].values()
+                   if record['pos_x'] and record['pos_y']]
+        centre = random.Random(3).choice(records)
+        lat, lon = centre['pos_x'], centre['pos_y']
+        _, _, near = get(connection, f'/fleet/near?lat={lat}&lon={lon}&radius=5000')
+        expected = sorted((r['source'], r[STORE_KEYS[r['source']]]) for r in records
+                          if distance_m(lat, lon, r['pos_x'], r['pos_y']) <= 5000)
+        served = sorted((r['source'], r[STORE_KEYS[r['source']]]) for r in near['units'])
+        distances = [r['distance'] for r in near['units']]
+        box = (lat - 0.05, lon - 0.05, lat + 0.05, lon + 0.05)
+        _, _, inside = get(connection, '/fleet/bbox?min_lat={}&min_lon={}&max_lat={}&max_lon={}'.format(*box))
+        expected_box = sorted((r['source'], r[STORE_KEYS[r['source']]]) for r in records
+                              if box[0] <= r['pos_x'] <= box[2] and box[1] <= r['pos_y'] <= box[3])
+        served_box = sorted((r['source'], r[STORE_KEYS[r['source']]]) for r in inside['units'])
+        print(f"в радиусе 5 км: {len(served)} юнитов, в прямоугольнике 0.1°: {len(served_box)}")
+        assert served == expected and distances == sorted(distances), '/fleet/near расходится с перебором'
+        assert served_box == expected_box, '/fleet/bbox расходится с перебором'
+        assert get(connection, '/fleet/near?lat=x&lon=1&radius=1')[0] == 400
+
+        rnd = random.Random(5)
+        ids = rnd.sample(sorted(fleet_store.records['cesar']), min(args.lookups, args.units))
+        names = [fleet_store.records['cesar'][unit_id]['object_name'].split('|')[0].strip() for unit_id in ids]
+        api_id = per_call(lambda unit_id: get(connection, f'/fleet/cesar/{unit_id}'), ids)
+        api_name = per_call(lambda name: get(connection, f'/fleet/name/{quote(name)}'), names)
+        etags = {unit_id: get(connection, f'/fleet/cesar/{unit_id}')[1] for unit_id in ids}
+        api_304 = per_call(lambda unit_id: get(connection, f'/fleet/cesar/{unit_id}', etags[unit_id]), ids)
+        local = per_call(fleet_store.by_plate, names)
+        db_id = per_call(lambda unit_id: session.execute(
+            text("SELECT * FROM cash_cesar WHERE unit_id = :id"), {'id': unit_id}).first(), ids)
+        db_name = per_call(lambda name: session.execute(text(
+            "SELECT unit_id, pos_x, pos_y, last_time FROM cash_cesar "
+            "WHERE UPPER(TRIM(object_name)) = :n OR object_name LIKE :p UNION ALL "
+            "SELECT id, pos_x, pos_y, last_time FROM cash_axenta WHERE UPPER(TRIM(nm)) = :n OR nm LIKE :p"),
+            {'n': name, 'p': name + ' |%'}).all(), names[:100])
+        print(f"по id: API {api_id * 1e6:.0f} мкс, 304 {api_304 * 1e6:.0f} мкс, БД {db_id * 1e6:.0f} мкс")
+        print(f"по госномеру: API {api_name * 1e6:.0f} мкс, в процессе {local * 1e6:.1f} мкс, "
+              f"БД {db_name * 1e3:.1f} мс")
+        print(f"расхождений: {mismatches}")
+    finally:
+        connection.close()
+        server.shutdown()
+        session.close()
+        os.remove(os.path.join(workdir, 'bench.db'))
+        os.rmdir(workdir)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
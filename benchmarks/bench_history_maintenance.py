@@ -0,0 +1,184 @@
+"""Обслуживание истории на синтетических треках: срок хранения, прореживание и таблицы периодов SQLite.
+
+Проверяет:
+  - simplify_track оставляет концы прямого трека и отклонения больше допуска;
+  - по умолчанию (срок хранения и прореживание выключены) ничего не удаляется;
+  - после прохода не остаётся строк старше срока хранения, последние сутки не прорежены,
+    а в прореженных сутках сохранены первая и последняя точки трека и все отклонения;
+  - точки юнитов с uid = 0 (нечисловой uniqueId) не прореживаются как один трек;
+  - новый экземпляр продолжает прореживание с сохранённых суток;
+  - таблицы месяцев SQLite удаляются, только когда месяц целиком вышел за срок хранения.
+
+Запуск: python benchmarks/bench_history_maintenance.py [--units 50] [--days 30]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DAY = 24 * 60 * 60
+# Шаг точек трека и период отклонений от прямой (в точках)
+STEP = 600
+DETOUR_EVERY = 36
+
+
+def check_simplify(simplify_track):
+    line = [(55.0, 37.0 + i * 1e-4) for i in range(50)]
+    assert simplify_track(line, 25) == [0, 49], 'прямой трек не сведён к концам'
+    spike = list(line)
+    spike[20] = (55.003, spike[20][1])
+    kept = simplify_track(spike, 25)
+    assert 20 in kept and kept[0] == 0 and kept[-1] == 49, 'отклонение от прямой потеряно'
+    assert simplify_track(line[:2], 25) == [0, 1]
+
+
+def track_rows(units, days, now):
+    """Точки треков: юнит движется по широте 55 + uid / 100 с отклонением на ~220 м каждые 6 часов.
+
+    Два юнита с uid = 0 ездят по прямой в разных городах и передают точки по очереди, по полсуток.
+    """
+    start = (now - days * DAY) // DAY * DAY
+    rows = []
+    detours = set()
+    for uid in range(1, units + 1):
+        for i in range((now - start) // STEP):
+            lat = 55.0 + uid / 100
+            if i % DETOUR_EVERY == DETOUR_EVERY // 2:
+                lat += 0.002
+                detours.add(len(rows) + 1)
+            rows.append({'id': len(rows) + 1, 'uid': uid, 'nm': f'A{uid:03d}', 'pos_x': lat,
+                         'pos_y': 37.0 + (i % 144) * 1e-4, 'last_time': start + i * STEP})
+    for i in range((now - start) // STEP):
+        city = i // 72 % 2
+        rows.append({'id': len(rows) + 1, 'uid': 0, 'nm': f'B{city}', 'pos_x': 55.0 + city,
+                     'pos_y': 37.0 + city + (i % 144) * 1e-4, 'last_time': start + i * STEP})
+    return rows, detours
+
+
+def count(engine, text, query, **params):
+    with engine.connect() as conn:
+        return conn.execute(text(query), params).scalar()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=50)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--retention', type=int, default=20)
+    parser.add_argument('--full-resolution', type=int, default=7)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'history.db')}"
+    os.environ['CASHING_SNAPSHOT_FILE'] = os.path.join(workdir, 'snapshot.bin')
+    os.environ['HISTORY_MAINTENANCE_PAUSE'] = '0'
+    from sqlalchemy import text
+    from app import database
+    from app.models import CashHistoryAxenta
+    from app.cashing import history_maintenance
+    from app.cashing.history_maintenance import HistoryMaintenance, simplify_track
+
+    check_simplify(simplify_track)
+    engine = database.engine
+    try:
+        CashHistoryAxenta.__table__.create(engine)
+        now = int(time.time())
+        rows, detours = track_rows(args.units, args.days, now)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO cash_history_axenta (id, uid, nm, pos_x, pos_y, last_time) "
+                              "VALUES (:id, :uid, :nm, :pos_x, :pos_y, :last_time)"), rows)
+        total = len(rows)
+        print(f"точек истории: {total} ({args.units} юнитов и 2 юнита с uid = 0 за {args.days} сут.)")
+
+        HistoryMaintenance().run()
+        assert count(engine, text, "SELECT COUNT(*) FROM cash_history_axenta") == total, \
+            'обслуживание по умолчанию удалило историю'
+
+        cutoff = now - args.retention * DAY
+        horizon = (now - args.full_resolution * DAY) // DAY * DAY
+        maintenance = HistoryMaintenance(retention_days=args.retention, full_resolution_days=args.full_resolution)
+        started = time.perf_counter()
+        report = maintenance.run()['cash_history_axenta']
+        # Второй экземпляр (как после перезапуска) продолжает с сохранённых суток
+        resumed_from = HistoryMaintenance().load_downsampled_until('cash_history_axenta')
+        passes = 1
+        while HistoryMaintenance(retention_days=args.retention, full_resolution_days=args.full_resolution) \
+                .run()['cash_history_axenta']['downsampled']:
+            passes += 1
+        elapsed = time.perf_counter() - started
+        assert resumed_from == max(cutoff // DAY * DAY, rows[0]['last_time'] // DAY * DAY) \
+            + history_maintenance.HISTORY_DOWNSAMPLE_DAYS_PER_RUN * DAY, 'прогресс прореживания не сохранён'
+
+        with engine.connect() as conn:
+            left = {row.id for row in conn.execute(text("SELECT id FROM cash_history_axenta"))}
+        expired = sum(1 for row in rows if row['last_time'] < cutoff)
+        recent = [row for row in rows if row['last_time'] >= horizon]
+        thinned = [row for row in rows if cutoff <= row['last_time'] < horizon and row['uid']]
+        tracks = {}
+        for row in thinned:
+            tracks.setdefault((row['uid'], row['last_time'] // DAY), []).append(row)
+        print(f"проходов {passes} за {elapsed:.2f} с: удалено по сроку {report['expired']}, "
+              f"прорежено всего {total - expired - len(left)}; в прореженных сутках осталось "
+              f"{sum(1 for row in thinned if row['id'] in left)} из {len(thinned)} точек")
+
+        assert report['expired'] == expired
+        assert count(engine, text, "SELECT COUNT(*) FROM cash_history_axenta WHERE last_time < :cutoff",
+                     cutoff=cutoff) == 0, 'остались строки старше срока хранения'
+        assert all(row['id'] in left for row in recent), 'прорежены сутки младше HISTORY_FULL_RESOLUTION_DAYS'
+        assert all(row['id'] in left for row in rows if not row['uid'] and row['last_time'] >= cutoff), \
+            'точки юнитов с uid = 0 прорежены как один трек'
+        for track in tracks.values():
+            assert track[0]['id'] in left and track[-1]['id'] in left, 'потеряны концы трека'
+        assert all(row['id'] in left for row in thinned if row['id'] in detours), 'потеряно отклонение трека'
+        assert sum(1 for row in thinned if row['id'] in left) < len(thinned) / 5, 'треки почти не прорежены'
+
+        check_periods(engine, text, history_maintenance, now)
+        print("проверки пройдены")
+    finally:
+        engine.dispose()
+        os.remove(os.path.join(workdir, 'history.db'))
+        os.rmdir(workdir)
+
+
+def check_periods(engine, text, history_maintenance, now):
+    """Таблицы месяцев: сначала всё прошлое переносится по месяцам, затем включается срок хранения."""
+    history_maintenance.HISTORY_SQLITE_PERIOD_TABLES = True
+    months = 4
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM cash_history_axenta")
+        conn.exec_driver_sql("DELETE FROM cash_history_maintenance")
+        points = [{'uid': 1, 'nm': 'A001', 'pos_x': 55.0, 'pos_y': 37.0, 'last_time': t}
+                  for t in range(now - months * 31 * DAY, now, 6 * 60 * 60)]
+        conn.execute(text("INSERT INTO cash_history_axenta (uid, nm, pos_x, pos_y, last_time) "
+                          "VALUES (:uid, :nm, :pos_x, :pos_y, :last_time)"), points)
+
+    maintenance = history_maintenance.HistoryMaintenance()
+    archived = maintenance.run()['cash_history_axenta']['archived']
+    tables = maintenance.period_tables('cash_history_axenta')
+    current = history_maintenance._month_start(now)
+    assert archived == sum(1 for point in points if point['last_time'] < current)
+    assert len(tables) in (months, months + 1), 'строки не разнесены по месяцам'
+
+    retention = 45
+    cutoff = now - retention * DAY
+    history_maintenance.HistoryMaintenance(retention_days=retention).run()
+    kept = maintenance.period_tables('cash_history_axenta')
+    for table in kept:
+        period = table.rsplit('_p', 1)[1]
+        start = int(history_maintenance.datetime(int(period[:4]), int(period[4:]), 1,
+                                                 tzinfo=history_maintenance.timezone.utc).timestamp())
+        assert history_maintenance._month_start(start, 1) > cutoff, f'{table} целиком за сроком хранения'
+    expected = sum(1 for point in points if point['last_time'] >= history_maintenance._month_start(cutoff))
+    left = sum(count(engine, text, f"SELECT COUNT(*) FROM {name}") for name in ['cash_history_axenta'] + kept)
+    print(f"таблицы месяцев: перенесено {archived} точек в {len(tables)} таблиц, после срока хранения "
+          f"{retention} сут. осталось {len(kept)} таблиц и {left} точек")
+    assert left == expected, 'удалены строки месяцев, не вышедших целиком за срок хранения'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Журнал ответов API и воспроизведение: запись через заглушки, затем run.py replay.
+
+Снимает несколько циклов fetch_data с включённым журналом (Axenta в потоковом режиме),
+показывает накладные расходы и размер журнала, после чего воспроизводит его в отдельную
+SQLite через `python run.py replay` без сети.
+
+Запуск: python benchmarks/bench_journal.py [--units 10000] [--cycles 5]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from payloads import FleetGenerator
+from stub_servers import cesar_stub, axenta_stub
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=10000)
+    parser.add_argument('--cycles', type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    journal_dir = os.path.join(workdir, 'journal')
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'live.db')}"
+    os.environ['CASHING_JOURNAL_DIR'] = journal_dir
+    os.environ['CASHING_SNAPSHOT_FILE'] = ''
+    os.environ['AXENTA_STREAMING'] = '1'
+    os.environ['AXENTA_ENRICH'] = '0'
+    fleet = FleetGenerator(args.units, churn=0.1)
+    try:
+        with cesar_stub() as cesar, axenta_stub() as axenta:
+            os.environ['CESAR_HOST'] = cesar.url
+            os.environ['AXENTA_HOST'] = axenta.url
+            from app import database
+            from app.models import Base
+            from app.cashing import data_fetcher, db_operations
+            from app.cashing.journal import payload_journal, journal_files
+
+            Base.metadata.create_all(database.engine)
+            db_operations.init_db()
+            live = []
+            for cycle in range(args.cycles):
+                if cycle:
+                    fleet.next_cycle()
+                cesar.state.payload = fleet.cesar_body()
+                axenta.state.payload = fleet.axenta_body()
+                started = time.perf_counter()
+                db_operations.cash_db(*data_fetcher.fetch_data())
+                live.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            payload_journal.flush()
+            print(f"живые циклы: {sum(live) / len(live) * 1000:.0f} мс в среднем, "
+                  f"дозапись журнала после последнего цикла {(time.perf_counter() - started) * 1000:.0f} мс")
+            files = journal_files(journal_dir)
+            size = sum(os.path.getsize(path) for path in files)
+            print(f"журнал: {len(files)} файл(ов), {size / 1024:.0f} КиБ на {args.cycles} циклов")
+
+        replay_db = os.path.join(workdir, 'replay.db')
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, os.path.join(ROOT, 'run.py'), 'replay', journal_dir, '--db', f'sqlite:///{replay_db}'],
+            cwd=workdir, capture_output=True, text=True, env=dict(os.environ, CASHING_JOURNAL_DIR=''))
+        print(f"воспроизведение за {time.perf_counter() - started:.2f} с (код {output.returncode}):")
+        print('  ' + (output.stderr.strip().splitlines() or [''])[-1])
+    finally:
+        subprocess.run(['rm', '-rf', workdir])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Аренда писателя: несколько процессов-реплик на общей SQLite.
+
+Каждая реплика запускает настоящий PipelinedScheduler с арендой, но вместо опроса API и записи
+кеша пишет строку (реплика, эпоха, время) в таблицу lease_log. Сценарий:
+  1. писатель убивается (SIGKILL) — резерв должен забрать аренду не позже ttl + poll;
+  2. новый писатель замораживается (SIGSTOP) дольше ttl и затем размораживается —
+     после разморозки он не должен писать, пока роль у другой реплики.
+В конце по lease_log проверяется, что в каждой эпохе писала одна реплика и эпохи не перекрываются.
+Отдельно в одном процессе проверяется ограждение: писатель, у которого аренду забрали посреди
+транзакции, не может её зафиксировать (WriterLease.fence).
+
+Запуск: python benchmarks/bench_lease.py [--replicas 3] [--ttl 2] [--poll 0.2] [--period 0.5]
+"""
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def worker(args):
+    logging.basicConfig(level=logging.CRITICAL)
+    from sqlalchemy import text
+    from app.database import SessionLocal
+    from app.cashing.lease import WriterLease
+    from app.cashing.scheduler import PipelinedScheduler
+
+    lease = WriterLease(owner=args.worker, ttl=args.ttl, poll_interval=args.poll)
+
+    def write(cesar_result, axenta_result):
+        session = SessionLocal()
+        try:
+            session.execute(text("INSERT INTO lease_log (owner, epoch, at) VALUES (:owner, :epoch, :at)"),
+                            {'owner': lease.owner, 'epoch': lease.epoch, 'at': time.time()})
+            lease.fence(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    scheduler = PipelinedScheduler(fetch=lambda: ([], []), write=write, is_enabled=lambda: 1,
+                                   period=args.period, lease=lease, on_acquire=None)
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop_event.set())
+    scheduler.run()
+
+
+def current_writer(engine):
+    try:
+        with engine.connect() as connection:
+            return connection.exec_driver_sql(
+                "SELECT writer_id, writer_epoch FROM system_status ORDER BY id LIMIT 1").first() or (None, None)
+    except Exception:
+        # Реплики ещё не создали system_status и столбцы аренды
+        return None, None
+
+
+def wait_for_writer(engine, exclude, timeout):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        owner, epoch = current_writer(engine)
+        if owner is not None and owner not in exclude:
+            return owner, epoch, time.monotonic() - started
+        time.sleep(0.02)
+    raise RuntimeError('аренду никто не забрал')
+
+
+def check_fence(ttl):
+    """Писатель A начинает транзакцию, засыпает дольше ttl, аренду забирает B; commit A не проходит."""
+    from sqlalchemy import text
+    from app.database import SessionLocal
+    from app.cashing.lease import WriterLease, LeaseLost
+
+    first = WriterLease(owner='fence-a', ttl=ttl)
+    second = WriterLease(owner='fence-b', ttl=ttl)
+    # Роль могла остаться за остановленной репликой до истечения ttl
+    deadline = time.monotonic() + ttl * 3
+    while not first.acquire():
+        assert time.monotonic() < deadline, 'аренда не освободилась'
+        time.sleep(0.05)
+    assert not second.acquire()
+    session = SessionLocal()
+    try:
+        time.sleep(ttl * 1.5)
+        assert second.acquire(), 'резерв не забрал просроченную аренду'
+        session.execute(text("INSERT INTO lease_log (owner, epoch, at) VALUES ('fence-a', :epoch, 0)"),
+                        {'epoch': first.epoch})
+        try:
+            first.fence(session)
+            session.commit()
+            fenced = False
+        except LeaseLost:
+            session.rollback()
+            fenced = True
+    finally:
+        session.close()
+    session = SessionLocal()
+    try:
+        leaked = session.execute(text("SELECT COUNT(*) FROM lease_log WHERE owner = 'fence-a'")).scalar()
+        # Новый писатель проходит ограждение
+        second.fence(session)
+        session.rollback()
+    finally:
+        session.close()
+    new_epoch = second.epoch
+    second.release()
+    assert fenced and leaked == 0, 'транзакция прежнего писателя зафиксирована после смены эпохи'
+    print(f"ограждение: запись писателя эпохи {first.epoch} после перехода роли к эпохе {new_epoch} откатена")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--ttl', type=float, default=2.0)
+    parser.add_argument('--poll', type=float, default=0.2)
+    parser.add_argument('--period', type=float, default=0.5)
+    parser.add_argument('--worker')
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    db_url = f"sqlite:///{os.path.join(workdir, 'shared.db')}"
+    os.environ['SQLALCHEMY_DATABASE_URL'] = db_url
+    os.environ['CASHING_SNAPSHOT_FILE'] = ''
+    os.environ['METRICS_PORT'] = '0'
+    from sqlalchemy import create_engine
+    engine = create_engine(db_url)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE lease_log (owner TEXT, epoch INTEGER, at REAL)")
+
+    env = dict(os.environ)
+    replicas = {}
+    for index in range(args.replicas):
+        name = f'replica-{index}'
+        replicas[name] = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', name, '--ttl', str(args.ttl),
+             '--poll', str(args.poll), '--period', str(args.period)], env=env)
+    try:
+        leader, epoch, seconds = wait_for_writer(engine, (), 30)
+        print(f"{args.replicas} реплик; писатель {leader} (эпоха {epoch}), ttl {args.ttl} с, опрос {args.poll} с")
+        time.sleep(args.ttl)
+
+        replicas[leader].kill()
+        killed_at = time.monotonic()
+        leader, epoch, seconds = wait_for_writer(engine, (leader,), args.ttl * 5)
+        print(f"SIGKILL писателя: роль перешла к {leader} (эпоха {epoch}) через {time.monotonic() - killed_at:.2f} с")
+        time.sleep(args.ttl)
+
+        paused = leader
+        replicas[paused].send_signal(signal.SIGSTOP)
+        stopped_at = time.monotonic()
+        leader, epoch, seconds = wait_for_writer(engine, (paused,), args.ttl * 5)
+        print(f"SIGSTOP писателя: роль перешла к {leader} (эпоха {epoch}) через {time.monotonic() - stopped_at:.2f} с")
+        time.sleep(args.ttl)
+        replicas[paused].send_signal(signal.SIGCONT)
+        resumed_at = time.time()
+        time.sleep(args.ttl * 2)
+    finally:
+        for process in replicas.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGCONT)
+                process.terminate()
+        for process in replicas.values():
+            process.wait()
+
+    with engine.connect() as connection:
+        log = connection.exec_driver_sql("SELECT owner, epoch, at FROM lease_log ORDER BY at").fetchall()
+    owners = {}
+    violations = 0
+    last_epoch = 0
+    for owner, epoch, at in log:
+        if owners.setdefault(epoch, owner) != owner or epoch < last_epoch:
+            violations += 1
+        last_epoch = max(last_epoch, epoch)
+    print(f"записей писателей: {len(log)}, эпох: {len(owners)}, нарушений (две реплики в эпохе "
+          f"или запись старой эпохи после новой): {violations}")
+    paused_writes = sum(1 for owner, epoch, at in log if owner == paused and at > resumed_at)
+    print(f"после разморозки {paused} записал {paused_writes} раз (ожидаемо 0: роль у другой реплики)")
+    check_fence(args.ttl)
+    subprocess.run(['rm', '-rf', workdir])
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+    main()
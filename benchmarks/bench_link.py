@@ -0,0 +1,99 @@
+"""Связывание cash_cesar.linked и transport.x / y: хеш-соединение в памяти против SQL-соединения.
+
+Для синтетического парка заводятся строки transport на часть госномеров, затем прогоняется
+несколько циклов cash_db и проверяется, что linked совпадает с соединением по object_name.
+
+Запуск: python benchmarks/bench_link.py [--units 20000] [--cycles 5] [--churn 0.1] [--sql-join]
+
+--sql-join дополнительно меряет прежнее соединение по UPPER(TRIM(...)); на 20000 юнитов в SQLite это минуты.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+SQL_JOIN = """
+    SELECT t.id, COUNT(*)
+    FROM transport t
+    JOIN cash_cesar c ON UPPER(TRIM(c.object_name)) = UPPER(TRIM(t."uNumber"))
+    LEFT JOIN cash_axenta a ON a.nm = UPPER(TRIM(t."uNumber"))
+    GROUP BY t.id
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=20000)
+    parser.add_argument('--cycles', type=int, default=5)
+    parser.add_argument('--churn', type=float, default=0.1)
+    parser.add_argument('--sql-join', action='store_true')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['CASHING_SNAPSHOT_FILE'] = path + '.snapshot'
+    os.environ['AXENTA_ENRICH'] = '0'
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    try:
+        from sqlalchemy import text
+        from app import database
+        from app.models import Base, Storage, TransportModel, Transport
+        from app.cashing import db_operations
+        from app.cashing.linker import transport_linker
+        from app.metrics import ROWS
+
+        Base.metadata.create_all(database.engine)
+        session = db_operations.SessionLocal()
+        session.add_all([Storage(ID=1, name='Склад'), TransportModel(id=1, name='Погрузчик')])
+        # Госномера в transport записаны как попало: в нижнем регистре, с пробелами и суффиксами
+        for i, plate in enumerate(fleet.plates[:int(args.units * 0.7)]):
+            number = (plate.lower() if i % 3 == 0 else plate) + (' | инв. 12' if i % 5 == 0 else '')
+            session.add(Transport(id=i + 1, storage_id=1, model_id=1, uNumber=f' {number} '))
+        session.commit()
+        session.close()
+
+        def updates():
+            values = ROWS._values
+            return values.get(('cesar', 'linked'), 0), values.get(('transport', 'moved'), 0)
+
+        for cycle in range(args.cycles):
+            if cycle:
+                fleet.next_cycle()
+            before = updates()
+            db_operations.cash_db(fleet.cesar, fleet.axenta)
+            started = time.perf_counter()
+            transport_linker.commit()
+            # commit уже вызван в cash_db: повторный вызов меряет стоимость цикла без изменений
+            idle = time.perf_counter() - started
+            after = updates()
+            print(f"цикл {cycle}: linked изменён у {after[0] - before[0]}, координаты у {after[1] - before[1]}; "
+                  f"пустой проход {idle * 1000:.1f} мс")
+
+        with database.engine.connect() as conn:
+            linked = conn.execute(text("SELECT COUNT(*) FROM cash_cesar WHERE linked")).scalar()
+            moved = conn.execute(text("SELECT COUNT(*) FROM transport WHERE x IS NOT NULL")).scalar()
+        expected = sum(1 for device in fleet.cesar
+                       if device['object_name'].split('|')[0].strip().upper() in transport_linker.index)
+        print(f"linked: {linked} (ожидалось {expected}), transport с координатами: {moved}")
+        if args.sql_join:
+            with database.engine.connect() as conn:
+                started = time.perf_counter()
+                conn.execute(text(SQL_JOIN)).fetchall()
+            print(f"SQL-соединение, которое раньше делал UI на каждой странице: "
+                  f"{(time.perf_counter() - started) * 1000:.0f} мс")
+    finally:
+        for name in (path, path + '.snapshot'):
+            if os.path.exists(name):
+                os.remove(name)
+
+
+if __name__ == '__main__':
+    main()
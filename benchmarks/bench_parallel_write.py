@@ -0,0 +1,95 @@
+"""Запись источников в независимых транзакциях: время фазы записи и изоляция ошибок.
+
+1. Сравнивает cash_db с последовательной и параллельной записью Cesar + Axenta. Выигрыш
+   заметен на MySQL / PostgreSQL; на SQLite (одна блокировка записи) параллельная запись
+   медленнее, и по умолчанию (CASHING_PARALLEL_WRITE=auto) источники пишутся по очереди.
+   Адрес БД задаётся через --db-url (по умолчанию временная SQLite).
+2. Ломает таблицу cash_axenta (переименованием) и проверяет, что строки Cesar зафиксированы,
+   а итог по Axenta содержит причину ошибки.
+
+Запуск: python benchmarks/bench_parallel_write.py [--units 20000] [--cycles 3] [--db-url URL]
+"""
+import argparse
+import logging
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=20000)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--churn', type=float, default=0.3)
+    parser.add_argument('--db-url')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    path = None
+    workdir = tempfile.mkdtemp()
+    os.environ['CASHING_SNAPSHOT_FILE'] = os.path.join(workdir, 'snapshot.bin')
+    if args.db_url:
+        os.environ['SQLALCHEMY_DATABASE_URL'] = args.db_url
+    else:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        os.environ['SQLALCHEMY_DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['AXENTA_ENRICH'] = '0'
+    os.environ['CASHING_LINK'] = '0'
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    try:
+        from sqlalchemy import text
+        from app import database
+        from app.models import Base
+        from app.cashing import db_operations as db
+
+        Base.metadata.create_all(database.engine)
+        db.init_db()
+        db.cash_db(fleet.cesar, fleet.axenta)
+
+        sequential = []
+        parallel = []
+        for _ in range(args.cycles):
+            for mode, timings in (('0', sequential), ('1', parallel)):
+                fleet.next_cycle()
+                db.CASHING_PARALLEL_WRITE = mode
+                started = time.perf_counter()
+                db.cash_db(fleet.cesar, fleet.axenta)
+                timings.append(time.perf_counter() - started)
+        db.CASHING_PARALLEL_WRITE = 'auto'
+        dialect = database.engine.dialect.name
+        print(f"{dialect}: последовательно {min(sequential) * 1000:.0f} мс, "
+              f"параллельно {min(parallel) * 1000:.0f} мс; по умолчанию "
+              f"{'параллельно' if db.parallel_write() else 'последовательно'}")
+        assert db.parallel_write() == (dialect != 'sqlite')
+
+        fleet.next_cycle()
+        with database.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE cash_axenta RENAME TO cash_axenta_broken"))
+        try:
+            outcomes = db.cash_db(fleet.cesar, fleet.axenta)
+        finally:
+            with database.engine.begin() as conn:
+                conn.execute(text("ALTER TABLE cash_axenta_broken RENAME TO cash_axenta"))
+        for outcome in outcomes:
+            status = 'зафиксирован' if outcome['committed'] else f"откатен ({outcome['error'].splitlines()[0]})"
+            print(f"  {outcome['source']}: {status}, {outcome['seconds'] * 1000:.0f} мс")
+        with database.engine.connect() as conn:
+            newest = conn.execute(text("SELECT MAX(last_time) FROM cash_cesar")).scalar()
+        assert newest == fleet.now, 'строки Cesar должны быть записаны несмотря на ошибку Axenta'
+        assert not outcomes[1]['committed'] and outcomes[0]['committed']
+        print("ошибка Axenta не откатила Cesar")
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
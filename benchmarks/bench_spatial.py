@@ -0,0 +1,85 @@
+"""Сеточный индекс позиций против полного перебора с расчётом расстояний.
+
+Строит индекс по нормализованным строкам синтетического парка, меряет запросы «юниты
+в радиусе склада» и инкрементальное обновление с диффом входов и выходов из зон.
+
+Запуск: python benchmarks/bench_spatial.py [--units 100000] [--storages 200] [--queries 500]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+
+def brute_force(rows, lat, lon, radius, distance_m):
+    return sorted((source, unit_id) for source, unit_id, unit_lat, unit_lon in rows
+                  if unit_lat and unit_lon and distance_m(lat, lon, unit_lat, unit_lon) <= radius)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=100000)
+    parser.add_argument('--storages', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    from app.cashing.db_operations import normalize_axenta_item
+    from app.cashing.history import distance_m
+    from app.cashing.spatial import SpatialIndex
+
+    fleet = FleetGenerator(args.units // 2, churn=0.1)
+    cesar = [{'unit_id': d['unit_id'], 'pos_x': d['lat'], 'pos_y': d['lon']} for d in fleet.cesar]
+    axenta = [normalize_axenta_item(i, item) for i, item in enumerate(fleet.axenta)]
+    rnd = random.Random(2)
+    zones = {storage_id: (55.0 + rnd.uniform(-1, 1), 37.0 + rnd.uniform(-1, 1), rnd.choice((300, 1000, 3000)))
+             for storage_id in range(1, args.storages + 1)}
+
+    index = SpatialIndex(zones=zones)
+    started = time.perf_counter()
+    index.update('cesar', cesar, 'unit_id')
+    diff = index.update('axenta', axenta, 'id')
+    build = time.perf_counter() - started
+    print(f"построение индекса по {len(cesar) + len(axenta)} юнитам: {build * 1000:.0f} мс, "
+          f"в зонах складов: {len(index.membership)}")
+
+    rows = [('cesar', r['unit_id'], r['pos_x'], r['pos_y']) for r in cesar]
+    rows += [('axenta', r['id'], r['pos_x'], r['pos_y']) for r in axenta]
+    queries = [zones[rnd.randint(1, args.storages)] for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    indexed = [sorted(item[:2] for item in index.radius(*query)) for query in queries]
+    grid = time.perf_counter() - started
+    brute_queries = queries[:max(args.queries // 10, 1)]
+    started = time.perf_counter()
+    brute = [brute_force(rows, *query, distance_m) for query in brute_queries]
+    scan = (time.perf_counter() - started) / len(brute_queries) * len(queries)
+    assert brute == indexed[:len(brute)], 'результаты индекса и перебора расходятся'
+    print(f"{args.queries} запросов по радиусу: сетка {grid * 1000:.0f} мс, "
+          f"перебор ~{scan * 1000:.0f} мс (x{scan / grid:.0f})")
+
+    started = time.perf_counter()
+    found = index.bbox(54.5, 36.5, 55.5, 37.5)
+    print(f"bbox 1°x1°: {len(found)} юнитов за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    moved = rnd.sample(range(len(axenta)), len(axenta) // 10)
+    changed = []
+    for i in moved:
+        row = dict(axenta[i])
+        row['pos_x'] += rnd.uniform(-0.02, 0.02)
+        row['pos_y'] += rnd.uniform(-0.02, 0.02)
+        changed.append(row)
+    started = time.perf_counter()
+    diff = index.update('axenta', changed, 'id')
+    print(f"инкрементальное обновление {len(changed)} юнитов: {(time.perf_counter() - started) * 1000:.1f} мс, "
+          f"вошли в зоны {len(diff['entered'])}, вышли {len(diff['left'])}")
+
+
+if __name__ == '__main__':
+    main()
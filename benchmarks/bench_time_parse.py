@@ -0,0 +1,64 @@
+"""Стоимость одного вызова to_unix_time / z_to_unix_time: прежние реализации против текущих.
+
+Запуск: python benchmarks/bench_time_parse.py [--values 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cashing import utils
+
+
+def old_to_unix_time(dt_str):
+    if dt_str is None:
+        return 0
+    dt = datetime.strptime(dt_str, "%Y-%m-%dT%H:%M:%SZ")
+    return int(time.mktime(dt.timetuple()))
+
+
+def old_z_to_unix_time(timestamp_str):
+    if timestamp_str:
+        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        return int(dt.timestamp())
+    return 0
+
+
+def make_values(count, distinct):
+    rnd = random.Random(1)
+    pool = [datetime.utcfromtimestamp(1700000000 + rnd.randint(0, 10 ** 7)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            for _ in range(distinct)]
+    return [pool[i % distinct] for i in range(count)]
+
+
+def per_call(func, values, setup='pass'):
+    seconds = min(timeit.repeat(lambda: [func(v) for v in values], setup=setup, number=1, repeat=3))
+    return seconds / len(values) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--values', type=int, default=100000)
+    args = parser.parse_args()
+
+    for label, distinct in (('все значения уникальны', args.values), ('10% уникальных (повтор между циклами)', args.values // 10)):
+        values = make_values(args.values, distinct)
+        print(label)
+        for name, func in (('strptime + mktime (старый to_unix_time)', old_to_unix_time),
+                           ('fromisoformat (старый z_to_unix_time)', old_z_to_unix_time)):
+            print(f"  {name:<44} {per_call(func, values):7.0f} нс/вызов")
+        cold = per_call(utils.to_unix_time, values, setup=utils.parse_utc.cache_clear)
+        print(f"  {'to_unix_time, холодный кеш':<44} {cold:7.0f} нс/вызов")
+        print(f"  {'to_unix_time, тёплый кеш':<44} {per_call(utils.to_unix_time, values):7.0f} нс/вызов")
+        seconds = min(timeit.repeat(lambda: utils.to_unix_times(values), setup=utils.parse_utc.cache_clear,
+                                    number=1, repeat=3))
+        print(f"  {'to_unix_times (столбец)':<44} {seconds / len(values) * 1e9:7.0f} нс/значение")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Колоночный UnitBatch против списка словарей на пути normalize → diff → write.
+
+Оба пути используют один и тот же код (axenta_values, SourceSnapshot, bulk_upsert, HistoryWriter):
+в первом нормализованные строки — словари, во втором — столбцы AxentaBatch. Снимок засевается
+предыдущим циклом, так что diff отбирает только долю churn изменённых юнитов.
+Время меряется без tracemalloc, память — отдельным прогоном под tracemalloc.
+
+Запуск: python benchmarks/bench_unit_batch.py [--units 100000] [--churn 0.1]
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+
+def live_blocks():
+    snapshot = tracemalloc.take_snapshot()
+    stats = snapshot.statistics('filename')
+    return sum(stat.size for stat in stats), sum(stat.count for stat in stats)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=100000)
+    parser.add_argument('--churn', type=float, default=0.1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CASHING_SNAPSHOT_FILE'] = os.path.join(workdir, 'snapshot.bin')
+    from app import database
+    from app.models import Base
+    from app.cashing.batch import AxentaBatch
+    from app.cashing.db_operations import AXENTA_COLUMNS, AXENTA_UPDATE_COLUMNS, axenta_values, axenta_snapshot
+    from app.cashing.history import HistoryWriter, axenta_history
+    from app.cashing.snapshot import SourceSnapshot
+    from app.cashing.upsert import bulk_upsert
+
+    Base.metadata.create_all(database.engine)
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    seed = [dict(zip(AXENTA_COLUMNS, axenta_values(i, item))) for i, item in enumerate(fleet.axenta)]
+    fleet.next_cycle()
+    items = fleet.axenta
+
+    def normalize_dicts():
+        rows = []
+        for idx, item in enumerate(items):
+            values = axenta_values(idx, item)
+            if values is not None:
+                rows.append(dict(zip(AXENTA_COLUMNS, values)))
+        return rows
+
+    def normalize_batch():
+        batch = AxentaBatch()
+        for idx, item in enumerate(items):
+            values = axenta_values(idx, item)
+            if values is not None:
+                batch.append(values)
+        return batch
+
+    def fresh_states():
+        snapshot = SourceSnapshot('cash_axenta', 'id', axenta_snapshot.columns)
+        snapshot.seed(seed)
+        history = HistoryWriter('cash_history_axenta', axenta_history.table, 'id', axenta_history.columns)
+        history.last_points = {row['id']: (row['last_time'], row['pos_x'], row['pos_y']) for row in seed}
+        return snapshot, history
+
+    def write(rows, history):
+        session = database.SessionLocal()
+        try:
+            bulk_upsert(session, 'cash_axenta', AXENTA_COLUMNS, 'id', rows, AXENTA_UPDATE_COLUMNS)
+            history.append(session, rows)
+            session.rollback()
+        finally:
+            session.close()
+
+    def run(normalize, measure_memory):
+        snapshot, history = fresh_states()
+        gc.collect()
+        stages = {}
+        if measure_memory:
+            tracemalloc.start()
+            base = live_blocks()
+        started = time.perf_counter()
+        rows = normalize()
+        stages['normalize'] = time.perf_counter() - started
+        if measure_memory:
+            size, count = live_blocks()
+            stages['retained'] = (size - base[0], count - base[1])
+        started = time.perf_counter()
+        changed, _ = snapshot.diff(rows)
+        stages['diff'] = time.perf_counter() - started
+        started = time.perf_counter()
+        write(changed, history)
+        stages['write'] = time.perf_counter() - started
+        if measure_memory:
+            stages['peak'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        stages['changed'] = len(changed)
+        return stages
+
+    results = {}
+    for name, normalize in (('словари', normalize_dicts), ('UnitBatch', normalize_batch)):
+        timing = min((run(normalize, False) for _ in range(3)), key=lambda r: r['normalize'] + r['diff'] + r['write'])
+        memory = run(normalize, True)
+        results[name] = (timing, memory)
+
+    print(f"{args.units} юнитов Axenta, изменено {results['UnitBatch'][0]['changed']}:")
+    for name, (timing, memory) in results.items():
+        size, count = memory['retained']
+        total = timing['normalize'] + timing['diff'] + timing['write']
+        print(f"  {name:>9}: normalize {timing['normalize'] * 1000:4.0f} мс, diff {timing['diff'] * 1000:4.0f} мс, "
+              f"write {timing['write'] * 1000:4.0f} мс, всего {total * 1000:4.0f} мс | "
+              f"строки в памяти {size / 2 ** 20:5.1f} МиБ в {count} блоках, пик {memory['peak'] / 2 ** 20:5.1f} МиБ")
+    os.remove(os.path.join(workdir, 'bench.db'))
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
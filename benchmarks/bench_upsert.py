@@ -0,0 +1,100 @@
+"""Сравнение executemany REPLACE INTO и многострочного upsert на SQLite.
+
+Перед замером проверяется SQL для MySQL: с 8.0.19 — псевдоним строки (AS new), на старых
+серверах и MariaDB — VALUES(col).
+
+Запуск: python benchmarks/bench_upsert.py [--units 50000] [--cycles 3] [--chunk 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base
+from app.cashing.db_operations import CESAR_COLUMNS
+from app.cashing.upsert import build_upsert_sql, bulk_upsert
+
+REPLACE_QUERY = text(
+    """REPLACE INTO cash_cesar (unit_id, object_name, pin, vin, last_time, pos_x, pos_y, created_at, device_type)
+       VALUES (:unit_id, :object_name, :pin, :vin, :last_time, :pos_x, :pos_y, :created_at, :device_type)"""
+)
+
+
+def make_rows(units, seed):
+    rnd = random.Random(seed)
+    return [{
+        'unit_id': unit_id,
+        'object_name': f'A{unit_id:06d}',
+        'pin': rnd.randint(1000, 9999),
+        'vin': f'VIN{unit_id:014d}',
+        'last_time': 1700000000 + rnd.randint(0, 86400),
+        'pos_x': 55.0 + rnd.random(),
+        'pos_y': 37.0 + rnd.random(),
+        'created_at': 1600000000,
+        'device_type': 'Cesar',
+    } for unit_id in range(1, units + 1)]
+
+
+def run(label, write, units, cycles):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    timings = []
+    try:
+        for cycle in range(cycles):
+            rows = make_rows(units, cycle)
+            session = Session()
+            started = time.perf_counter()
+            write(session, rows)
+            session.commit()
+            timings.append(time.perf_counter() - started)
+            session.close()
+    finally:
+        engine.dispose()
+        os.remove(path)
+    best = min(timings)
+    print(f"{label:<28} лучший цикл {best * 1000:9.1f} мс  ({units / best:,.0f} строк/с)")
+    return best
+
+
+def check_mysql_sql():
+    """SQL upsert для MySQL зависит от версии сервера."""
+    def sql_for(version, mariadb=False):
+        dialect = mysql.dialect()
+        dialect.server_version_info = version
+        dialect.is_mariadb = mariadb
+        return build_upsert_sql(dialect, 'cash_cesar', ('unit_id', 'pin'), 'unit_id', ('pin',), 2)
+
+    assert sql_for((8, 0, 36)).endswith(') AS new ON DUPLICATE KEY UPDATE pin = new.pin')
+    assert sql_for((5, 7, 44)).endswith('ON DUPLICATE KEY UPDATE pin = VALUES(pin)')
+    assert sql_for((10, 11, 6), mariadb=True).endswith('ON DUPLICATE KEY UPDATE pin = VALUES(pin)')
+    print("SQL для MySQL: 8.0.19+ — AS new, 5.7 и MariaDB — VALUES(col)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=50000)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--chunk', type=int, default=500)
+    args = parser.parse_args()
+    check_mysql_sql()
+
+    replace = run('executemany REPLACE INTO', lambda s, rows: s.execute(REPLACE_QUERY, rows), args.units, args.cycles)
+    upsert = run(f'upsert, чанк {args.chunk}',
+                 lambda s, rows: bulk_upsert(s, 'cash_cesar', CESAR_COLUMNS, 'unit_id', rows, chunk_size=args.chunk),
+                 args.units, args.cycles)
+    print(f"ускорение: x{replace / upsert:.2f}")
+
+
+if __name__ == '__main__':
+    main()
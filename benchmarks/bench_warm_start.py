@@ -0,0 +1,79 @@
+"""Первый цикл после перезапуска: холодный старт, снимок по кеш-таблицам и снимок из файла.
+
+Перезапуск имитируется сбросом снимков в памяти; затем на том же парке (с обычной долей
+изменений) меряется первый цикл cash_db и число переписанных строк.
+
+Запуск: python benchmarks/bench_warm_start.py [--units 50000] [--churn 0.1]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payloads import FleetGenerator
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=50000)
+    parser.add_argument('--churn', type=float, default=0.1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp()
+    os.environ['SQLALCHEMY_DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'cache.db')}"
+    os.environ['CASHING_SNAPSHOT_FILE'] = os.path.join(workdir, 'snapshot.bin')
+    os.environ['AXENTA_ENRICH'] = '0'
+    os.environ['CASHING_LINK'] = '0'
+    fleet = FleetGenerator(args.units, churn=args.churn)
+    try:
+        from app import database
+        from app.models import Base
+        from app.cashing import db_operations as db
+        from app.cashing.snapshot_store import read_snapshots
+
+        Base.metadata.create_all(database.engine)
+        db.init_db()
+        db.cash_db(fleet.cesar, fleet.axenta)
+        fleet.next_cycle()
+        started = time.perf_counter()
+        db.cash_db(fleet.cesar, fleet.axenta)
+        print(f"установившийся цикл: {(time.perf_counter() - started) * 1000:.0f} мс, "
+              f"записано {sum(s['changed'] for s in db.get_cycle_stats().values())}")
+        print(f"размер файла снимка: {os.path.getsize(os.environ['CASHING_SNAPSHOT_FILE']) / 1024:.0f} КиБ")
+
+        started = time.perf_counter()
+        read_snapshots()
+        print(f"чтение файла снимка: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+        for mode in ('cold', 'table', 'file'):
+            db.cesar_snapshot.reset()
+            db.axenta_snapshot.reset()
+            started = time.perf_counter()
+            if mode == 'table':
+                os.rename(os.environ['CASHING_SNAPSHOT_FILE'], os.environ['CASHING_SNAPSHOT_FILE'] + '.off')
+                db.warm_start()
+                os.rename(os.environ['CASHING_SNAPSHOT_FILE'] + '.off', os.environ['CASHING_SNAPSHOT_FILE'])
+            elif mode == 'file':
+                db.warm_start()
+            restore = time.perf_counter() - started
+
+            fleet.next_cycle()
+            started = time.perf_counter()
+            db.cash_db(fleet.cesar, fleet.axenta)
+            cycle = time.perf_counter() - started
+            written = sum(s['changed'] for s in db.get_cycle_stats().values())
+            print(f"{mode:>5}: восстановление {restore * 1000:6.0f} мс, первый цикл {cycle * 1000:6.0f} мс, "
+                  f"записано {written}")
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
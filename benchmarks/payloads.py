@@ -0,0 +1,91 @@
+"""Генератор синтетических ответов Cesar (devices) и Axenta (objects) с изменениями между циклами."""
+import json
+import random
+from datetime import datetime, timezone
+
+LETTERS = 'АВЕКМНОРСТУХ'
+
+
+def _z_time(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _plate(rnd, unit_id):
+    return f"{rnd.choice(LETTERS)}{unit_id % 1000:03d}{rnd.choice(LETTERS)}{rnd.choice(LETTERS)}{rnd.randint(1, 199)}"
+
+
+class FleetGenerator:
+    """Парк из units юнитов; на каждом цикле у доли churn обновляются время и координаты.
+
+    Примерно половина юнитов присутствует в обоих источниках под одним госномером,
+    как в реальном парке, где машина оснащена и Cesar, и Axenta.
+    """
+
+    def __init__(self, units, churn=0.1, seed=1, start_time=1700000000):
+        self.rnd = random.Random(seed)
+        self.units = units
+        self.churn = churn
+        self.now = start_time
+        self.plates = [_plate(self.rnd, unit_id) for unit_id in range(units)]
+        self.cesar = [self._cesar_device(i) for i in range(units)]
+        self.axenta = [self._axenta_object(i) for i in range(units)]
+
+    def _cesar_device(self, i):
+        rnd = self.rnd
+        suffix = '|Склад' if rnd.random() < 0.3 else ''
+        return {
+            'unit_id': 100000 + i,
+            'object_name': self.plates[i] + suffix,
+            'pin': rnd.randint(1000, 9999),
+            'vin': f'XTA{rnd.randint(10 ** 13, 10 ** 14 - 1)}',
+            'receive_time': _z_time(self.now - rnd.randint(0, 86400)),
+            'lat': round(55.0 + rnd.uniform(-1.0, 1.0), 6),
+            'lon': round(37.0 + rnd.uniform(-1.0, 1.0), 6),
+            'created_at': _z_time(self.now - rnd.randint(86400, 86400 * 700)),
+            'device_type': rnd.choice(('Cesar Auto', 'Cesar Tracker', 'Cesar Pro')),
+        }
+
+    def _axenta_object(self, i):
+        rnd = self.rnd
+        name = self.plates[i] if i % 2 == 0 else _plate(rnd, i + self.units)
+        t = self.now - rnd.randint(0, 86400)
+        return {
+            'id': 500000 + i,
+            'name': name + (' | Аренда' if rnd.random() < 0.2 else ''),
+            'uniqueId': str(860000000000000 + i),
+            'connectedStatus': rnd.random() < 0.8,
+            'deviceType': 'Galileosky 7.0',
+            'phone': f'+79{rnd.randint(10 ** 8, 10 ** 9 - 1)}',
+            'lastMessage': {
+                't': _z_time(t),
+                'tpos': _z_time(t),
+                'pos': {
+                    'x': round(37.0 + rnd.uniform(-1.0, 1.0), 6),
+                    'y': round(55.0 + rnd.uniform(-1.0, 1.0), 6),
+                    'sc': rnd.randint(0, 18), 's': rnd.randint(0, 90), 'c': rnd.randint(0, 359), 'z': 150,
+                },
+            },
+        }
+
+    def next_cycle(self, seconds=10):
+        """Сдвигает время и обновляет долю churn юнитов в каждом источнике."""
+        self.now += seconds
+        rnd = self.rnd
+        changed = int(self.units * self.churn)
+        for i in rnd.sample(range(self.units), changed):
+            device = self.cesar[i]
+            device['receive_time'] = _z_time(self.now)
+            device['lat'] = round(device['lat'] + rnd.uniform(-0.001, 0.001), 6)
+            device['lon'] = round(device['lon'] + rnd.uniform(-0.001, 0.001), 6)
+        for i in rnd.sample(range(self.units), changed):
+            message = self.axenta[i]['lastMessage']
+            message['t'] = message['tpos'] = _z_time(self.now)
+            message['pos']['x'] = round(message['pos']['x'] + rnd.uniform(-0.001, 0.001), 6)
+            message['pos']['y'] = round(message['pos']['y'] + rnd.uniform(-0.001, 0.001), 6)
+            message['pos']['sc'] = rnd.randint(0, 18)
+
+    def cesar_body(self):
+        return json.dumps({'devices': self.cesar}).encode('utf-8')
+
+    def axenta_body(self):
+        return json.dumps(self.axenta).encode('utf-8')
@@ -0,0 +1,196 @@
+"""Локальные заглушки Cesar и Axenta API с настраиваемой задержкой ответа."""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Ответы поюнитовых запросов Axenta
+AXENTA_SENSORS = [{'name': 'Зажигание', 'value': 1}, {'name': 'Напряжение', 'value': 12.6}]
+AXENTA_COMMANDS = [{'id': 1, 'name': 'Блокировка двигателя'}]
+
+
+class StubState:
+    """Отдаваемые данные и задержка; можно менять между циклами."""
+
+    def __init__(self, payload=None, delay=0.0):
+        self.payload = payload if payload is not None else []
+        self.delay = delay
+        # Задержка поюнитовых запросов (датчики, команды)
+        self.unit_delay = 0.0
+        # За сколько секунд большое тело ответа передаётся частями после заголовков (медленный поток)
+        self.body_delay = 0.0
+        # Принудительный код ответа для запросов данных (например, 503 при имитации аварии)
+        self.status = None
+        # Сколько следующих запросов данных получат 503 (разовый сбой)
+        self.fail_next = 0
+        # Время обработки на сервере в расчёте на одно отдаваемое устройство Cesar
+        self.device_cost = 0.0
+        self.requests = 0
+        self.logins = 0
+        # Axenta: при check_token запросы с токеном, отличным от последнего выданного, получают 401
+        self.check_token = False
+        self.token = None
+        # Одновременные поюнитовые запросы (текущие и максимум)
+        self.unit_requests = 0
+        self.unit_in_flight = 0
+        self.max_unit_in_flight = 0
+        self.lock = threading.Lock()
+
+
+def _handler(routes, state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Заголовки и тело пишутся отдельно: без TCP_NODELAY ответ ждёт отложенного ACK
+        disable_nagle_algorithm = True
+
+        def _dispatch(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            path = self.path.split('?', 1)[0]
+            route = routes.get((self.command, path)) or routes.get((self.command, re.sub(r'/\d+/', '/{id}/', path)))
+            if route is None:
+                self.send_error(404)
+                return
+            state.requests += 1
+            login = path.endswith(('/token', '/auth/login/'))
+            if state.check_token and not login and self.headers.get('Authorization') != f'Token {state.token}':
+                status, payload = 401, {'detail': 'invalid token'}
+            else:
+                status, payload = route(body)
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            chunk = 64 * 1024
+            # Медленно передаются только большие ответы данных; логин и ошибки уходят сразу
+            if not state.body_delay or status != 200 or len(data) <= chunk:
+                self.wfile.write(data)
+                return
+            pause = state.body_delay / max(1, (len(data) + chunk - 1) // chunk)
+            try:
+                for offset in range(0, len(data), chunk):
+                    self.wfile.write(data[offset:offset + chunk])
+                    self.wfile.flush()
+                    time.sleep(pause)
+            except (BrokenPipeError, ConnectionResetError):
+                # Клиент закрыл соединение, не дочитав тело (например, по дедлайну)
+                self.close_connection = True
+
+        do_GET = _dispatch
+        do_POST = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def _delayed(state, build, delay_attr='delay'):
+    def route(body):
+        delay = getattr(state, delay_attr)
+        if delay:
+            time.sleep(delay)
+        if state.status:
+            return state.status, {'detail': 'stub error'}
+        if state.fail_next > 0:
+            state.fail_next -= 1
+            return 503, {'detail': 'stub error'}
+        return build(body)
+    return route
+
+
+def _tracked(state, route):
+    """Считает одновременные поюнитовые запросы."""
+    def tracked(body):
+        with state.lock:
+            state.unit_requests += 1
+            state.unit_in_flight += 1
+            state.max_unit_in_flight = max(state.max_unit_in_flight, state.unit_in_flight)
+        try:
+            return route(body)
+        finally:
+            with state.lock:
+                state.unit_in_flight -= 1
+    return tracked
+
+
+def _cesar_routes(state):
+    def token(body):
+        state.logins += 1
+        return 200, {'access_token': 'stub-token', 'expires_in': 3600}
+
+    def device_state(body):
+        if isinstance(state.payload, bytes):
+            # Заранее сериализованный ответ целиком (без фильтра по unit_ids)
+            return 200, state.payload
+        unit_ids = json.loads(body or b'{}').get('unit_ids') or []
+        devices = state.payload
+        if unit_ids:
+            wanted = set(unit_ids)
+            devices = [device for device in devices if device['unit_id'] in wanted]
+        if state.device_cost:
+            time.sleep(state.device_cost * len(devices))
+        return 200, {'devices': devices}
+
+    return {
+        ('POST', '/token'): token,
+        ('POST', '/units/device-state'): _delayed(state, device_state),
+    }
+
+
+def _axenta_routes(state):
+    def login(body):
+        with state.lock:
+            state.logins += 1
+            state.token = f'stub-token-{state.logins}'
+            return 200, {'token': state.token}
+
+    def objects(body):
+        return 200, state.payload
+
+    def sensors(body):
+        return 200, AXENTA_SENSORS
+
+    def commands(body):
+        return 200, AXENTA_COMMANDS
+
+    return {
+        ('POST', '/auth/login/'): login,
+        ('GET', '/objects'): _delayed(state, objects),
+        ('GET', '/objects/{id}/sensors'): _tracked(state, _delayed(state, sensors, 'unit_delay')),
+        ('GET', '/objects/{id}/commands'): _tracked(state, _delayed(state, commands, 'unit_delay')),
+    }
+
+
+class StubServer:
+    """HTTP-сервер в фоновом потоке на свободном порту 127.0.0.1."""
+
+    def __init__(self, routes_factory, state):
+        self.state = state
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _handler(routes_factory(state), state))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}/'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def cesar_stub(payload=None, delay=0.0):
+    return StubServer(_cesar_routes, StubState(payload, delay))
+
+
+def axenta_stub(payload=None, delay=0.0):
+    return StubServer(_axenta_routes, StubState(payload, delay))
@@ -1,7 +1,14 @@
-import time
+import sys
 import logging
-from app.cashing.data_fetcher import fetch_data
-from app.cashing.db_operations import cash_db, check_status
+import argparse
+from app.cashing.scheduler import PipelinedScheduler
+from app.cashing.history_maintenance import HISTORY_MAINTENANCE, HistoryMaintenance, MaintenanceThread
+from app.cashing.replay import REPLAY_DATABASE_URL, replay
+from app.cashing.lease import CASHING_LEASE, writer_lease
+from app.cashing.fleet_store import CASHING_FLEET_STORE
+from app.cashing.fleet_api import start_fleet_api
+from app.cashing.export import CASHING_OFFLINE_DAYS, offline_before, run_export
+from app.metrics import start_metrics_server
 
 
 logging.basicConfig(
@@ -14,29 +21,67 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def update_db():
-    """Обновляет базу данных, извлекая данные из API и очищая старые записи."""
+def run_maintenance():
+    """Однократное обслуживание таблиц истории: python run.py maintenance."""
+    report = HistoryMaintenance().run()
+    for table, stats in report.items():
+        logger.info(f"{table}: {stats}")
+
+
+def run_replay(argv):
+    """Воспроизведение журнала ответов API: python run.py replay <журнал> [--db URL] [--speed N] [--limit N]."""
+    parser = argparse.ArgumentParser(prog='run.py replay')
+    parser.add_argument('journal', help='каталог журнала, файл или glob-шаблон')
+    parser.add_argument('--db', default=REPLAY_DATABASE_URL, help='БД для воспроизведения')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='0 — максимально быстро, 1 — с записанной скоростью')
+    parser.add_argument('--limit', type=int, help='сколько циклов воспроизвести')
+    args = parser.parse_args(argv)
+    report = replay(args.journal, args.db, args.speed, args.limit)
+    if report is None:
+        sys.exit(1)
+    logger.info(f"Воспроизведение завершено: {report}")
+
+
+def run_export_csv(argv):
+    """Выгрузка кеш-таблицы в CSV: python run.py export cesar|axenta [-o файл] [--offline] [--device-type T] [--linked 0|1]."""
+    parser = argparse.ArgumentParser(prog='run.py export')
+    parser.add_argument('source', choices=('cesar', 'axenta'))
+    parser.add_argument('-o', '--output', default='-', help="CSV-файл, '-' — stdout")
+    parser.add_argument('--offline', nargs='?', type=float, const=CASHING_OFFLINE_DAYS,
+                        help='только юниты без связи дольше N дней (по умолчанию CASHING_OFFLINE_DAYS)')
+    parser.add_argument('--device-type', help='только Cesar: тип устройства')
+    parser.add_argument('--linked', type=int, choices=(0, 1), help='только Cesar: связан ли юнит с transport')
+    args = parser.parse_args(argv)
+    filters = {
+        'offline': offline_before(args.offline) if args.offline is not None else None,
+        'device_type': args.device_type,
+        'linked': bool(args.linked) if args.linked is not None else None,
+    }
     try:
-        logger.info("Запуск обновления базы данных...")
-        cesar_result, axenta_result = fetch_data()
-        cash_db(cesar_result, axenta_result)
-        logger.info("Обновление базы данных завершено.")
-    except Exception as e:
-        logger.error(f"Ошибка при обновлении базы данных: {str(e)}")
-        raise
+        run_export(args.output, args.source, **filters)
+    except ValueError as e:
+        parser.error(str(e))
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'maintenance':
+        run_maintenance()
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+        run_replay(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        run_export_csv(sys.argv[2:])
+        sys.exit(0)
+
     logger.info("Запуск планировщика задач...")
-    while True:
-        try:
-            if check_status() == 0:
-                logger.warning("Модуль отключен. Ожидание 100 секунд.")
-                time.sleep(100)
-            else:
-                update_db()
-                logger.info("Ожидание 10 секунд перед следующей итерацией.")
-                time.sleep(10)
-        except Exception as e:
-            logger.error(f"Ошибка в главном цикле: {str(e)}")
-            logger.info("Ожидание 60 секунд перед повторной попыткой.")
-            time.sleep(60)
\ No newline at end of file
+    start_metrics_server()
+    if CASHING_FLEET_STORE:
+        start_fleet_api(is_active=writer_lease.held if CASHING_LEASE else None)
+    if HISTORY_MAINTENANCE:
+        MaintenanceThread(is_active=writer_lease.held if CASHING_LEASE else None).start()
+    try:
+        PipelinedScheduler().run()
+    except KeyboardInterrupt:
+        logger.info("Планировщик остановлен.")